@@ -0,0 +1,52 @@
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("BLOB_DIR", os.path.join(tempfile.gettempdir(), "bench_codec_blobs"))
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import codec
+
+# Wire size and encode/decode cost of indexer messages: the old str(dict) + eval against
+# the versioned codec. Page sizes span small articles up to pages past the SQS body limit.
+N = int(os.environ.get("BENCH_MESSAGES", "300"))
+WORDS = ("crawler index search page link queue node master shard term score document "
+         "python distributed system fault tolerance heartbeat message").split()
+
+def sample_messages(n, seed=11):
+    rng = random.Random(seed)
+    messages = []
+    for i in range(n):
+        words = rng.choice([500, 2000, 8000, 60000])
+        messages.append({
+            "url": f"https://www.example.com/article/{i}",
+            "text": " ".join(rng.choice(WORDS) for _ in range(words)),
+            "title": f"Article {i}",
+            "description": "An example page",
+            "links": [f"https://www.example.com/article/{rng.randint(0, 10 ** 6)}" for _ in range(80)],
+            "content_hash": f"{rng.getrandbits(160):040x}",
+            "extracted": True,
+        })
+    return messages
+
+def run(name, encode, decode, messages):
+    start = time.perf_counter()
+    bodies = [encode(m) for m in messages]
+    encoded = time.perf_counter() - start
+    start = time.perf_counter()
+    for body in bodies:
+        decode(body)
+    decoded = time.perf_counter() - start
+    wire = sum(len(b.encode("utf-8")) for b in bodies)
+    over = sum(len(b.encode("utf-8")) > 256 * 1024 for b in bodies)
+    print(f"{name:8s} {wire / 1e6:8.2f} MB  encode {encoded:6.3f}s  decode {decoded:6.3f}s  over 256KB: {over}")
+    return bodies
+
+if __name__ == "__main__":
+    messages = sample_messages(N)
+    print(f"{N} messages")
+    run("str+eval", str, eval, messages)
+    for body in run("codec", codec.encode, codec.decode, messages):
+        codec.release(body)
+    print(codec.snapshot())
@@ -0,0 +1,46 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from common.parse_pool import InlineParser, ParsePool
+from synthetic_site import SyntheticSite
+
+# Parsing throughput of fetch threads parsing themselves (GIL-bound) against the process pool.
+# Run it on a multi-core box: on one core the pool can only add IPC cost.
+PAGES = int(os.environ.get("BENCH_PAGES", "400"))
+PAGE_BYTES = int(os.environ.get("BENCH_PAGE_BYTES", "40000"))
+THREADS = int(os.environ.get("BENCH_THREADS", "32"))
+PROCESSES = max(1, int(os.environ.get("PARSE_PROCESSES", str(os.cpu_count() or 1))))
+
+def bench(parser, bodies):
+    pending = list(enumerate(bodies))
+    lock = threading.Lock()
+
+    def worker():
+        while True:
+            with lock:
+                if not pending:
+                    return
+                page, body = pending.pop()
+            parser.parse(f"http://127.0.0.1/p/{page}", body, "utf-8")
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    site = SyntheticSite(pages=PAGES, page_bytes=PAGE_BYTES)
+    site.port = 80
+    bodies = [site.html(page) for page in range(PAGES)]
+    megabytes = sum(len(b) for b in bodies) / 2 ** 20
+    print(f"{PAGES} pages, {megabytes:.1f} MB, {THREADS} fetch threads, {PROCESSES} parse processes")
+    for name, parser in [("threads", InlineParser()), ("processes", ParsePool(PROCESSES, 2 * PROCESSES))]:
+        elapsed = bench(parser, bodies)
+        print(f"{name:10s} {elapsed:7.3f}s  {PAGES / elapsed:8.1f} pages/s  {megabytes / elapsed:6.1f} MB/s")
@@ -0,0 +1,394 @@
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import threading
+import time
+
+# End-to-end offline benchmark: crawl a synthetic site through the real crawler code, index the
+# pages with indexer.process_message, rebuild the keyword index with auto_index_monitor and query
+# master's /api/search. Queues run in-process; the database is a throwaway schema on a local
+# MySQL (DB_HOST / DB_USER / DB_PASSWORD, default 127.0.0.1). Stages whose dependencies are
+# missing are reported as skipped. BENCH_JSON=path writes the results for regression tracking.
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Kept in the environment, so the parse pool's fork server (which imports this script) reuses it
+if "BENCH_DIR" not in os.environ:
+    os.environ["BENCH_DIR"] = tempfile.mkdtemp(prefix="crawler-bench-")
+BENCH_DIR = os.environ["BENCH_DIR"]
+
+# Must be set before anything imports common.config
+os.environ.setdefault("QUEUE_BACKEND", "memory")
+os.environ.setdefault("DEDUP_STORE", "memory")
+os.environ.setdefault("RECRAWL_CACHE_PATH", os.path.join(BENCH_DIR, "recrawl.sqlite3"))
+os.environ.setdefault("BLOB_DIR", os.path.join(BENCH_DIR, "blobs"))
+os.environ.setdefault("SEGMENT_DIR", os.path.join(BENCH_DIR, "segments"))
+os.environ.setdefault("DB_HOST", "127.0.0.1")
+os.environ.setdefault("DB_NAME", "crawler_bench")
+# Measure the pipeline, not politeness: the synthetic hosts are all local
+os.environ.setdefault("HOST_RATE", "1000")
+os.environ.setdefault("HOST_BURST", "1000")
+os.environ.setdefault("HOST_MIN_DELAY", "0")
+
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+from common.config import CRAWLER_QUEUE_URL, DB_CONFIG, INDEXER_QUEUE_URL, INDEXER_THREADS
+from common.queues import get_queue_client
+from synthetic_site import SyntheticSite
+
+PAGES = int(os.environ.get("BENCH_PAGES", "500"))
+FANOUT = int(os.environ.get("BENCH_FANOUT", "8"))
+DEPTH = int(os.environ.get("BENCH_DEPTH", "3"))
+PAGE_BYTES = int(os.environ.get("BENCH_PAGE_BYTES", "6000"))
+HOSTS = int(os.environ.get("BENCH_HOSTS", "8"))
+LATENCY = float(os.environ.get("BENCH_LATENCY", "0.02"))   # seconds added to every response
+JITTER = float(os.environ.get("BENCH_JITTER", "0.02"))     # plus up to this much at random
+THREADS = int(os.environ.get("BENCH_THREADS", "16"))
+MONITOR_RUNS = int(os.environ.get("BENCH_MONITOR_RUNS", "3"))
+QUERIES = int(os.environ.get("BENCH_QUERIES", "50"))
+STAGE_TIMEOUT = float(os.environ.get("BENCH_TIMEOUT", "600"))
+VERBOSE = os.environ.get("BENCH_VERBOSE", "0") == "1"
+
+class SkipStage(Exception):
+    pass
+
+# === Measurement ===
+def current_rss():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # No procfs: fall back to the process-wide high-water mark
+        scale = 1 if sys.platform == "darwin" else 1024
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * scale
+
+class PeakRss:
+    """Samples RSS in the background; `peak` is the highest value seen while active."""
+
+    def __init__(self, interval=0.05):
+        self.interval = interval
+        self.peak = current_rss()
+        self.stop = threading.Event()
+
+    def _sample(self):
+        while not self.stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self):
+        threading.Thread(target=self._sample, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.stop.set()
+        self.peak = max(self.peak, current_rss())
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+def summarize(items, seconds, latencies, rss, **extra):
+    result = {
+        "items": items,
+        "seconds": round(seconds, 3),
+        "throughput_per_s": round(items / seconds, 2) if seconds else None,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2) if latencies else None,
+        "peak_rss_mb": round(rss.peak / 2 ** 20, 1),
+    }
+    result.update(extra)
+    return result
+
+def quiet():
+    # The node code prints a line per page; keep the report readable unless asked
+    return contextlib.nullcontext() if VERBOSE else contextlib.redirect_stdout(io.StringIO())
+
+def load_script(relative_path, name):
+    # Node scripts are not packages; load them the way `python3 <script>` would, minus __main__
+    spec = importlib.util.spec_from_file_location(name, os.path.join(ROOT, relative_path))
+    module = importlib.util.module_from_spec(spec)
+    try:
+        spec.loader.exec_module(module)
+    except ImportError as e:
+        raise SkipStage(f"{relative_path}: {e}")
+    return module
+
+class TimedQueueClient:
+    """Wraps the indexer's queue client to time each message from receive to delete."""
+
+    def __init__(self, client):
+        self.client = client
+        self.lock = threading.Lock()
+        self.received_at = {}
+        self.latencies = []
+
+    def receive_message(self, **kwargs):
+        response = self.client.receive_message(**kwargs)
+        now = time.perf_counter()
+        with self.lock:
+            for message in response.get('Messages', []):
+                self.received_at[message['ReceiptHandle']] = now
+        return response
+
+    def delete_message(self, QueueUrl, ReceiptHandle):
+        self.client.delete_message(QueueUrl=QueueUrl, ReceiptHandle=ReceiptHandle)
+        self._deleted([ReceiptHandle])
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        response = self.client.delete_message_batch(QueueUrl=QueueUrl, Entries=Entries)
+        failed = {entry["Id"] for entry in response.get("Failed", [])}
+        self._deleted([entry["ReceiptHandle"] for entry in Entries if entry["Id"] not in failed])
+        return response
+
+    def _deleted(self, receipt_handles):
+        now = time.perf_counter()
+        with self.lock:
+            for handle in receipt_handles:
+                started = self.received_at.pop(handle, None)
+                if started is not None:
+                    self.latencies.append(now - started)
+
+    def outstanding(self):
+        with self.lock:
+            return len(self.received_at)
+
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+# === Stages ===
+def crawl_stage(site):
+    try:
+        from common.concurrency import host_limit, init_concurrency
+        from common.crawl_core import crawl_next, feed_frontier
+        from common.frontier import HostFrontier
+        from common.http_client import init_http_client
+        from common.jobs import get_job_tracker
+        from common.parse_pool import get_parse_pool, init_parse_pool
+        from common.sqs_batch import BatchingSQS
+    except ImportError as e:
+        raise SkipStage(f"crawler: {e}")
+
+    init_http_client(THREADS)
+    init_concurrency(THREADS)
+    init_parse_pool()
+    queue = BatchingSQS(get_queue_client(), tag="BENCH")
+    frontier = HostFrontier(host_limit=host_limit)
+    stop_event = threading.Event()
+    latencies = []
+    latencies_lock = threading.Lock()
+
+    def worker():
+        while not stop_event.is_set():
+            started = time.perf_counter()
+            if crawl_next(queue, CRAWLER_QUEUE_URL, INDEXER_QUEUE_URL, frontier, lambda status: None):
+                with latencies_lock:
+                    latencies.append(time.perf_counter() - started)
+
+    job_id = "bench"
+    seed = {"url": site.url(0), "depth": 0, "max_depth": DEPTH, "restrict_domain": False,
+            "domain_prefix": None, "job_id": job_id, "priority": "normal"}
+    totals = {"fetched": 0, "failed": 0, "enqueued": 1, "dropped": 0}  # the seed is enqueued by hand
+
+    with PeakRss() as rss, quiet():
+        started = time.perf_counter()
+        get_queue_client().send_message(QueueUrl=CRAWLER_QUEUE_URL, MessageBody=json.dumps(seed))
+        threads = [threading.Thread(target=feed_frontier, args=(queue, CRAWLER_QUEUE_URL, frontier, stop_event),
+                                    daemon=True)]
+        threads += [threading.Thread(target=worker, daemon=True) for _ in range(THREADS)]
+        for t in threads:
+            t.start()
+
+        # Job counters say when every enqueued URL has been fetched, failed or dropped
+        deadline = started + STAGE_TIMEOUT
+        while time.perf_counter() < deadline:
+            for counts in get_job_tracker().drain().values():
+                for key, n in counts.items():
+                    totals[key] += n
+            if totals["fetched"] + totals["failed"] + totals["dropped"] >= totals["enqueued"]:
+                break
+            time.sleep(0.05)
+        queue.flush()  # indexer messages still buffered belong to this stage
+        elapsed = time.perf_counter() - started
+        stop_event.set()
+        for t in threads:
+            t.join(timeout=5)
+        queue.close()
+
+    timed_out = totals["fetched"] + totals["failed"] + totals["dropped"] < totals["enqueued"]
+    parse_stats = getattr(get_parse_pool(), "snapshot", dict)()
+    return summarize(totals["fetched"], elapsed, latencies, rss, failed=totals["failed"],
+                     dropped=totals["dropped"], served=site.served, timed_out=timed_out,
+                     parse_processes=parse_stats.get("processes", 0),
+                     parse_backpressure_waits=parse_stats.get("backpressure_waits", 0))
+
+def prepare_database():
+    try:
+        import mysql.connector
+    except ImportError as e:
+        raise SkipStage(f"database: {e}")
+    if DB_CONFIG["database"] == "INDEXER":
+        raise SkipStage("database: refusing to benchmark against the production INDEXER schema")
+    server = {key: value for key, value in DB_CONFIG.items() if key != "database"}
+    try:
+        db = mysql.connector.connect(**server)
+    except mysql.connector.Error as e:
+        raise SkipStage(f"database: {e}")
+    cursor = db.cursor()
+    name = DB_CONFIG["database"]
+    cursor.execute(f"DROP DATABASE IF EXISTS `{name}`")
+    cursor.execute(f"CREATE DATABASE `{name}`")
+    cursor.execute(f"USE `{name}`")
+    cursor.execute("""
+        CREATE TABLE indexed_pages (
+            id INT AUTO_INCREMENT PRIMARY KEY,
+            url TEXT,
+            title VARCHAR(512),
+            description TEXT,
+            content LONGTEXT,
+            indexed_obj_id VARCHAR(255),
+            content_hash CHAR(40),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP(3) NOT NULL DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3),
+            UNIQUE KEY url_key (url(255)),
+            KEY updated_at_key (updated_at, id)
+        )
+    """)
+    db.commit()
+    cursor.close()
+    db.close()
+
+def drop_database():
+    import mysql.connector
+    server = {key: value for key, value in DB_CONFIG.items() if key != "database"}
+    db = mysql.connector.connect(**server)
+    db.cursor().execute(f"DROP DATABASE IF EXISTS `{DB_CONFIG['database']}`")
+    db.close()
+
+def index_stage():
+    prepare_database()
+    indexer = load_script("indexer/indexer.py", "bench_indexer")
+    # Receive -> batch commit -> delete; deletes happen only once the covering batch committed
+    client = indexer.queue.client = TimedQueueClient(indexer.queue.client)
+    pending = client.depth(INDEXER_QUEUE_URL)
+    stop_event = threading.Event()
+
+    def worker():
+        while not stop_event.is_set():
+            indexer.process_message(None)
+
+    with PeakRss() as rss, quiet():
+        started = time.perf_counter()
+        threads = [threading.Thread(target=worker, daemon=True) for _ in range(INDEXER_THREADS)]
+        for t in threads:
+            t.start()
+        deadline = started + STAGE_TIMEOUT
+        while time.perf_counter() < deadline:
+            if client.depth(INDEXER_QUEUE_URL) == 0 and client.outstanding() == 0:
+                break
+            time.sleep(0.02)
+        elapsed = time.perf_counter() - started
+        stop_event.set()  # workers may sit in a long poll; they are daemons
+
+    writes = indexer.get_index_writer().snapshot()
+    return summarize(len(client.latencies), elapsed, client.latencies, rss,
+                     messages=pending, indexed=indexer.urls_indexed,
+                     batches=writes.get("batches", 0), failed_batches=writes.get("failed_batches", 0))
+
+def monitor_stage():
+    monitor = load_script("indexer/auto_index_monitor.py", "bench_monitor")
+    latencies = []
+    with PeakRss() as rss, quiet():
+        started = time.perf_counter()
+        for _ in range(MONITOR_RUNS):
+            run_started = time.perf_counter()
+            monitor.update_keyword_index()
+            latencies.append(time.perf_counter() - run_started)
+        elapsed = time.perf_counter() - started
+    monitor.db_cursor.execute("SELECT COUNT(*) FROM terms")
+    terms = monitor.db_cursor.fetchone()[0]
+    monitor.db_cursor.execute("SELECT COUNT(*) FROM postings")
+    postings = monitor.db_cursor.fetchone()[0]
+    monitor.db.close()
+    return summarize(MONITOR_RUNS, elapsed, latencies, rss, terms=terms, postings=postings)
+
+def search_stage(site):
+    with quiet():
+        master = load_script("master/master.py", "bench_master")
+        master.start_segment_sync()
+    client = master.app.test_client()
+    segments = None
+    if master.segment_sync:
+        # Catch the segment index up with the monitor's postings so queries are served from it
+        master.segment_sync.sync_once()
+        segments = len(master.segment_index.segments)
+    # Mix frequent and rare words from the site's vocabulary
+    queries = [site.words[(i * 7919) % len(site.words)] for i in range(QUERIES)]
+    latencies, hits, errors = [], 0, 0
+    with PeakRss() as rss:
+        started = time.perf_counter()
+        for query in queries:
+            query_started = time.perf_counter()
+            response = client.get("/api/search", query_string={"keyword": query})
+            latencies.append(time.perf_counter() - query_started)
+            if response.status_code != 200:
+                errors += 1
+            else:
+                hits += len(response.get_json().get("urls", []))
+        elapsed = time.perf_counter() - started
+    return summarize(len(queries), elapsed, latencies, rss, errors=errors, avg_hits=round(hits / len(queries), 2),
+                     segments=segments)
+
+# === Report ===
+def run():
+    site = SyntheticSite(pages=PAGES, fanout=FANOUT, page_bytes=PAGE_BYTES, hosts=HOSTS,
+                         latency=LATENCY, jitter=JITTER).start()
+    stages = {}
+    database_ready = False
+    try:
+        for name, stage in [("crawl", lambda: crawl_stage(site)), ("index", index_stage),
+                            ("monitor", monitor_stage), ("search", lambda: search_stage(site))]:
+            if name in ("monitor", "search") and not database_ready:
+                stages[name] = {"skipped": "needs the index stage"}
+                continue
+            try:
+                stages[name] = stage()
+                database_ready = database_ready or name == "index"
+            except SkipStage as e:
+                stages[name] = {"skipped": str(e)}
+    finally:
+        site.stop()
+        if database_ready and os.environ.get("BENCH_KEEP_DB", "0") != "1":
+            drop_database()
+
+    return {
+        "benchmark": "pipeline",
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "python": platform.python_version(),
+        "params": {"pages": PAGES, "fanout": FANOUT, "depth": DEPTH, "page_bytes": PAGE_BYTES, "hosts": HOSTS,
+                   "latency": LATENCY, "jitter": JITTER, "crawl_threads": THREADS,
+                   "indexer_threads": INDEXER_THREADS, "queue_backend": os.environ["QUEUE_BACKEND"]},
+        "stages": stages,
+    }
+
+if __name__ == "__main__":
+    report = run()
+    params = report["params"]
+    print(f"{params['pages']} pages (fan-out {params['fanout']}, depth {params['depth']}, "
+          f"{params['page_bytes']} B, {params['hosts']} hosts, {params['latency'] * 1000:.0f}"
+          f"+{params['jitter'] * 1000:.0f} ms), {params['crawl_threads']} crawl threads")
+    for name, stats in report["stages"].items():
+        if "skipped" in stats:
+            print(f"{name:8s} skipped: {stats['skipped']}")
+            continue
+        print(f"{name:8s} {stats['items']:6d} in {stats['seconds']:8.3f}s  {stats['throughput_per_s'] or 0:9.2f}/s  "
+              f"p50 {stats['p50_ms'] or 0:8.2f} ms  p99 {stats['p99_ms'] or 0:8.2f} ms  "
+              f"peak RSS {stats['peak_rss_mb']:7.1f} MB")
+    if os.environ.get("BENCH_JSON"):
+        with open(os.environ["BENCH_JSON"], "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {os.environ['BENCH_JSON']}")
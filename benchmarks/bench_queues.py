@@ -0,0 +1,58 @@
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.queues import InMemorySQS, SQLiteSQS
+from common.sqs_batch import BatchingSQS
+
+# Queue overhead per message for the local backends: every message is sent, received and
+# deleted once through BatchingSQS, the same path the crawler takes.
+QUEUE = "tasks"
+MESSAGES = int(os.environ.get("BENCH_MESSAGES", "5000"))
+THREADS = int(os.environ.get("BENCH_THREADS", "4"))
+BODY = "x" * int(os.environ.get("BENCH_BODY_BYTES", "300"))
+
+def bench(client):
+    queue = BatchingSQS(client, tag="BENCH")
+    start = time.perf_counter()
+    for i in range(MESSAGES):
+        queue.send(QUEUE, BODY)
+    queue.flush()
+    sent = time.perf_counter() - start
+
+    done = [0]
+    done_lock = threading.Lock()
+
+    def worker():
+        while True:
+            messages = queue.receive(QUEUE, wait=0)
+            if not messages:
+                return
+            for message in messages:
+                queue.delete(QUEUE, message['ReceiptHandle'])
+            with done_lock:
+                done[0] += len(messages)
+
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    queue.close()
+    total = time.perf_counter() - start
+    return sent, total, done[0], sum(client.calls.values())
+
+if __name__ == "__main__":
+    print(f"{MESSAGES} messages of {len(BODY)} bytes, {THREADS} consumer threads")
+    with tempfile.TemporaryDirectory() as tmp:
+        backends = [
+            ("memory", InMemorySQS()),
+            ("sqlite", SQLiteSQS(os.path.join(tmp, "queues.sqlite3"))),
+        ]
+        for name, client in backends:
+            sent, total, received, calls = bench(client)
+            print(f"{name:7s} send {sent:6.3f}s  round-trip {total:6.3f}s  {received:6d} received  "
+                  f"{calls:5d} calls  {total / MESSAGES * 1e6:7.1f} us/message")
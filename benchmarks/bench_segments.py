@@ -0,0 +1,106 @@
+import os
+import random
+import shutil
+import string
+import sys
+import tempfile
+import time
+from itertools import accumulate
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.segment_index import SegmentIndex
+
+# Micro-benchmarks of the segment index on a synthetic Zipf corpus: build (flush + merge), term
+# dictionary lookups, postings decoding and query latency per query shape. No MySQL needed.
+DOCS = int(os.environ.get("BENCH_DOCS", "100000"))
+DOC_TERMS = int(os.environ.get("BENCH_DOC_TERMS", "120"))
+VOCAB = int(os.environ.get("BENCH_VOCAB", "50000"))
+FLUSH_DOCS = int(os.environ.get("SEGMENT_FLUSH_DOCS", "5000"))
+MERGE_FACTOR = int(os.environ.get("SEGMENT_MERGE_FACTOR", "10"))
+QUERIES = int(os.environ.get("BENCH_QUERIES", "200"))
+SEED = int(os.environ.get("BENCH_SEED", "1"))
+
+def word(rank):
+    # Letters only, at least three of them, like the tokenizer's terms
+    letters = ""
+    while True:
+        rank, digit = divmod(rank, 26)
+        letters += string.ascii_lowercase[digit]
+        if not rank:
+            return "zq" + letters
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))] if values else 0.0
+
+def timed(fn, args_list):
+    latencies = []
+    for args in args_list:
+        started = time.perf_counter()
+        fn(*args)
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+def report(name, latencies, unit=1000, label="ms"):
+    print(f"{name:28s} p50 {percentile(latencies, 0.5) * unit:9.3f} {label}  "
+          f"p99 {percentile(latencies, 0.99) * unit:9.3f} {label}  ({len(latencies)} runs)")
+
+def build(index, rng, vocab, cum_weights):
+    flush_seconds = merge_seconds = 0.0
+    postings = 0
+    for start in range(0, DOCS, FLUSH_DOCS):
+        docs = {}
+        for doc_id in range(start + 1, min(DOCS, start + FLUSH_DOCS) + 1):
+            positions = {}
+            terms = rng.choices(vocab, cum_weights=cum_weights, k=rng.randint(DOC_TERMS // 2, DOC_TERMS * 3 // 2))
+            for position, term in enumerate(terms):
+                positions.setdefault(term, []).append(position)
+            postings += len(positions)
+            docs[doc_id] = (f"http://bench.local/page/{doc_id}", len(terms), doc_id, positions)
+        started = time.perf_counter()
+        index.flush(docs)
+        flush_seconds += time.perf_counter() - started
+        started = time.perf_counter()
+        index.merge_pending()
+        merge_seconds += time.perf_counter() - started
+    return flush_seconds, merge_seconds, postings
+
+if __name__ == "__main__":
+    rng = random.Random(SEED)
+    vocab = [word(rank) for rank in range(VOCAB)]
+    cum_weights = list(accumulate(1 / (rank + 1) ** 1.07 for rank in range(VOCAB)))
+    directory = tempfile.mkdtemp(prefix="segments-bench-")
+    try:
+        index = SegmentIndex(directory, merge_factor=MERGE_FACTOR, min_merge_docs=FLUSH_DOCS)
+        print(f"{DOCS} docs, ~{DOC_TERMS} terms each, vocabulary {VOCAB}, flush {FLUSH_DOCS}, merge factor {MERGE_FACTOR}")
+        flush_seconds, merge_seconds, postings = build(index, rng, vocab, cum_weights)
+        size = sum(segment.bytes for segment in index.segments)
+        print(f"{'flush':28s} {DOCS / flush_seconds:9.0f} docs/s  {postings / flush_seconds:10.0f} postings/s")
+        print(f"{'merge':28s} {merge_seconds:9.2f} s total ({index.stats['merges']} merges)")
+        print(f"{'segments':28s} {len(index.segments):9d}  {size / 2 ** 20:8.1f} MB  "
+              f"{size / postings:5.1f} bytes/posting (with positions)")
+
+        segments = index.segments
+        probes = [(segment, rng.choice(vocab)) for _ in range(QUERIES) for segment in segments[:1]]
+        report("term lookup (binary search)", timed(lambda segment, term: segment.find(term), probes), 10 ** 6, "us")
+
+        largest = max(segments, key=lambda segment: segment.doc_count)
+        common = largest.find(vocab[0])
+        started = time.perf_counter()
+        decoded = sum(len(ordinals) for ordinals, _ in largest.posting_list(common).blocks())
+        elapsed = time.perf_counter() - started
+        print(f"{'postings decode':28s} {decoded / elapsed:9.0f} postings/s ({decoded} postings of '{vocab[0]}')")
+
+        ranks = {"rare term": range(VOCAB // 2, VOCAB), "medium term": range(100, 1000),
+                 "common term": range(0, 10)}
+        for name, span in ranks.items():
+            queries = [(vocab[rng.choice(span)],) for _ in range(QUERIES)]
+            report(name, timed(index.search, queries))
+        pairs = [(f"{vocab[rng.randrange(VOCAB // 2, VOCAB)]} {vocab[rng.randrange(0, 10)]}",) for _ in range(QUERIES)]
+        report("rare AND common", timed(index.search, pairs))
+        pairs = [(f"{vocab[rng.randrange(100, 1000)]} {vocab[rng.randrange(100, 1000)]}",) for _ in range(QUERIES)]
+        report("medium AND medium", timed(index.search, pairs))
+        phrases = [(f'"{vocab[rng.randrange(0, 100)]} {vocab[rng.randrange(0, 100)]}"',) for _ in range(QUERIES)]
+        report("phrase (two frequent terms)", timed(index.search, phrases))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,77 @@
+import os
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.queues import InMemorySQS
+from common.sqs_batch import BatchingSQS
+
+# Offline comparison of the old one-call-per-message fan-out against BatchingSQS.
+# Every API call on the stand-in costs LATENCY seconds, roughly an in-region SQS round-trip.
+TASKS = "tasks"
+RESULTS = "results"
+PAGES = int(os.environ.get("BENCH_PAGES", "60"))
+LINKS_PER_PAGE = int(os.environ.get("BENCH_LINKS", "50"))
+THREADS = 3
+LATENCY = float(os.environ.get("BENCH_SQS_LATENCY", "0.005"))
+
+def seed(client):
+    for i in range(PAGES):
+        client.send_message(QueueUrl=TASKS, MessageBody=f"page-{i}")
+    client.calls.clear()
+
+def run_threads(worker):
+    threads = [threading.Thread(target=worker) for _ in range(THREADS)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return time.perf_counter() - start
+
+def bench_unbatched():
+    client = InMemorySQS(latency=LATENCY)
+    seed(client)
+
+    def worker():
+        while True:
+            response = client.receive_message(QueueUrl=TASKS, MaxNumberOfMessages=1, WaitTimeSeconds=0)
+            if 'Messages' not in response:
+                return
+            message = response['Messages'][0]
+            client.send_message(QueueUrl=RESULTS, MessageBody=message['Body'])
+            for j in range(LINKS_PER_PAGE):
+                client.send_message(QueueUrl=RESULTS, MessageBody=f"{message['Body']}/link-{j}")
+            client.delete_message(QueueUrl=TASKS, ReceiptHandle=message['ReceiptHandle'])
+
+    elapsed = run_threads(worker)
+    return elapsed, sum(client.calls.values())
+
+def bench_batched():
+    client = InMemorySQS(latency=LATENCY)
+    seed(client)
+    queue = BatchingSQS(client, tag="BENCH")
+
+    def worker():
+        while True:
+            messages = queue.receive(TASKS, wait=0)
+            if not messages:
+                return
+            for message in messages:
+                queue.send(RESULTS, message['Body'])
+                for j in range(LINKS_PER_PAGE):
+                    queue.send(RESULTS, f"{message['Body']}/link-{j}")
+                queue.delete(TASKS, message['ReceiptHandle'])
+
+    elapsed = run_threads(worker)
+    start = time.perf_counter()
+    queue.close()  # drain what is still buffered so both runs ship the same messages
+    elapsed += time.perf_counter() - start
+    return elapsed, sum(client.calls.values())
+
+if __name__ == "__main__":
+    print(f"{PAGES} pages x {LINKS_PER_PAGE} links, {THREADS} threads, {LATENCY * 1000:.1f} ms per API call")
+    for name, bench in [("unbatched", bench_unbatched), ("batched", bench_batched)]:
+        elapsed, calls = bench()
+        print(f"{name:10s} {elapsed:7.3f}s  {calls:6d} API calls  {PAGES / elapsed:8.1f} pages/s")
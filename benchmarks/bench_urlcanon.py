@@ -0,0 +1,38 @@
+import os
+import random
+import sys
+import time
+from urllib.parse import urljoin
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.urlcanon import canonicalize
+
+# Per-link cost of canonicalization against the plain urljoin the crawler used before.
+# The href mix mimics a typical page: relative paths, absolute links, tracking params, anchors.
+N = int(os.environ.get("BENCH_URLS", "200000"))
+BASE = "https://www.example.com/blog/2024/05/post.html"
+
+def sample_hrefs(n, seed=7):
+    rng = random.Random(seed)
+    templates = [
+        "/about", "../archive/{i}", "./{i}.html", "post-{i}?page={i}&sort=asc",
+        "https://www.Example.com:443/tag/{i}/", "//cdn.example.com/img/{i}.png",
+        "https://other{i}.org/a/b/../c?utm_source=x&utm_medium=y&id={i}",
+        "#comments", "javascript:void(0)", "mailto:hi@example.com",
+        "https://news.example.net/%7euser/{i}?b=2&a=1#frag",
+    ]
+    return [rng.choice(templates).format(i=rng.randint(0, 10 ** 6)) for _ in range(n)]
+
+def timed(fn, hrefs):
+    start = time.perf_counter()
+    for href in hrefs:
+        fn(href)
+    return time.perf_counter() - start
+
+if __name__ == "__main__":
+    hrefs = sample_hrefs(N)
+    baseline = timed(lambda h: urljoin(BASE, h), hrefs)
+    canonical = timed(lambda h: canonicalize(h, BASE), hrefs)
+    print(f"{N} hrefs")
+    print(f"urljoin only   {baseline:6.3f}s  {baseline / N * 1e6:6.2f} us/link")
+    print(f"canonicalize   {canonical:6.3f}s  {canonical / N * 1e6:6.2f} us/link")
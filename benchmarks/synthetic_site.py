@@ -0,0 +1,131 @@
+import os
+import random
+import threading
+import time
+from itertools import accumulate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Deterministic fake web for offline crawls. Page i links to pages i*fanout+1 .. i*fanout+fanout
+# (so a crawl from page 0 to depth d reaches fanout^0 + ... + fanout^d pages) plus a few
+# random cross-links that exercise URL dedup. Pages are spread over `hosts` loopback addresses
+# (127.0.0.1, 127.0.0.2, ...) so per-host politeness behaves like a real multi-site crawl.
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "zen", "dor", "pa", "quil", "bre", "sto", "ly", "mar"]
+
+def vocabulary(size=3000, seed=7):
+    rng = random.Random(seed)
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(words)
+
+class SyntheticSite:
+    def __init__(self, pages=500, fanout=8, page_bytes=6000, hosts=8, latency=0.0, jitter=0.0,
+                 cross_links=2, seed=1):
+        self.pages = pages
+        self.fanout = fanout
+        self.page_bytes = page_bytes
+        self.hosts = hosts
+        self.latency = latency
+        self.jitter = jitter
+        self.cross_links = cross_links
+        self.seed = seed
+        self.words = vocabulary()
+        # Zipf-ish: a few words are everywhere, most are rare, like real text
+        self.cum_weights = list(accumulate(1.0 / (rank + 1) for rank in range(len(self.words))))
+        self.port = None
+        self.server = None
+        self.lock = threading.Lock()
+        self.served = 0
+
+    # === Content ===
+    def url(self, page):
+        return f"http://127.0.0.{page % self.hosts + 1}:{self.port}/p/{page}"
+
+    def links(self, page):
+        children = [c for c in range(page * self.fanout + 1, page * self.fanout + self.fanout + 1) if c < self.pages]
+        rng = random.Random(self.seed * 1000003 + page)
+        cross = [rng.randrange(self.pages) for _ in range(self.cross_links)]
+        return children + cross
+
+    def text(self, page):
+        rng = random.Random(self.seed * 7919 + page)
+        words, size = [], 0
+        while size < self.page_bytes:
+            chunk = rng.choices(self.words, cum_weights=self.cum_weights, k=64)
+            words.extend(chunk)
+            size += sum(len(w) + 1 for w in chunk)
+        return " ".join(words)
+
+    def html(self, page):
+        anchors = "".join(f'<li><a href="{self.url(link)}">page {link}</a></li>' for link in self.links(page))
+        return (
+            "<!doctype html><html><head><meta charset=\"utf-8\">"
+            f"<title>Synthetic page {page}</title>"
+            f"<meta name=\"description\" content=\"Page {page} of the synthetic benchmark site\">"
+            f"</head><body><h1>Page {page}</h1><p>{self.text(page)}</p><ul>{anchors}</ul></body></html>"
+        ).encode("utf-8")
+
+    # === Server ===
+    def _handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, like real servers
+
+            def do_GET(self):
+                if site.latency or site.jitter:
+                    time.sleep(site.latency + random.random() * site.jitter)
+                if self.path == "/robots.txt":
+                    self._reply(200, b"User-agent: *\nAllow: /\n", "text/plain")
+                    return
+                try:
+                    page = int(self.path.rsplit("/", 1)[1])
+                except ValueError:
+                    page = -1
+                if not self.path.startswith("/p/") or not 0 <= page < site.pages:
+                    self._reply(404, b"not found", "text/plain")
+                    return
+                with site.lock:
+                    site.served += 1
+                self._reply(200, site.html(page), "text/html; charset=utf-8")
+
+            def _reply(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self, port=0):
+        # 0.0.0.0 answers on every 127.0.0.x address
+        self.server = ThreadingHTTPServer(("0.0.0.0", port), self._handler())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+        threading.Thread(target=self.server.serve_forever, name="synthetic-site", daemon=True).start()
+        return self
+
+    def stop(self):
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+if __name__ == "__main__":
+    site = SyntheticSite(
+        pages=int(os.environ.get("BENCH_PAGES", "500")),
+        fanout=int(os.environ.get("BENCH_FANOUT", "8")),
+        page_bytes=int(os.environ.get("BENCH_PAGE_BYTES", "6000")),
+        hosts=int(os.environ.get("BENCH_HOSTS", "8")),
+        latency=float(os.environ.get("BENCH_LATENCY", "0")),
+        jitter=float(os.environ.get("BENCH_JITTER", "0")),
+    ).start(int(os.environ.get("BENCH_PORT", "8800")))
+    print(f"Serving {site.pages} pages; seed URL {site.url(0)}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        site.stop()
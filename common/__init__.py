@@ -0,0 +1 @@
+# Shared building blocks used by the master, crawler and indexer nodes.
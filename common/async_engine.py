@@ -0,0 +1,183 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+import aiohttp
+
+from common.config import (
+    CRAWL_CONCURRENCY, FETCH_TIMEOUT, FETCH_MAX_SECONDS, FETCH_CHUNK_BYTES, HOST_MAX_INFLIGHT, PARSE_QUEUE_SIZE
+)
+from common.concurrency import get_concurrency
+from common.dns_cache import get_dns_cache
+from common.download import BodyReader
+from common.frontier import host_of
+from common.http_client import get_http_client
+from common.jobs import get_job_tracker
+from common.sqs_batch import MAX_BATCH as RECEIVE_BATCH
+from common.crawl_core import (
+    HEADERS, FetchResult, admit_messages, build_page, extend_buffered, publish_page, receive_tasks, should_crawl
+)
+from common.recrawl_cache import get_recrawl_cache, conditional_headers
+
+class AsyncCrawler:
+    """Event-loop crawl mode: many in-flight fetches per node, blocking SQS/DB calls off-loop in a thread pool."""
+
+    def __init__(self, queue, frontier, crawler_queue_url, indexer_queue_url, status_map, lock, on_crawled,
+                 stop_event, concurrency=CRAWL_CONCURRENCY, should_run=None, tag="CRAWLER"):
+        self.queue = queue
+        self.frontier = frontier
+        self.crawler_queue_url = crawler_queue_url
+        self.indexer_queue_url = indexer_queue_url
+        self.status_map = status_map
+        self.lock = lock
+        self.on_crawled = on_crawled
+        self.stop_event = stop_event
+        self.concurrency = max(1, concurrency)
+        self.should_run = should_run
+        self.tag = tag
+
+        self.num_receivers = max(1, self.concurrency // RECEIVE_BATCH)
+        self.io_pool = ThreadPoolExecutor(max_workers=self.num_receivers + 16, thread_name_prefix="io")
+        # Threads that hand pages to the parse tier and wait; its queue bound is the real limit
+        self.parse_pool = ThreadPoolExecutor(max_workers=max(4, PARSE_QUEUE_SIZE), thread_name_prefix="parse")
+
+    def _set_status(self, slot, status):
+        with self.lock:
+            self.status_map[slot] = status
+
+    async def _call(self, pool, fn, *args, **kwargs):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(pool, partial(fn, *args, **kwargs))
+
+    # === Receiving ===
+    async def _receive_loop(self):
+        while not self.stop_event.is_set():
+            if self.should_run is not None and not await self._call(self.io_pool, self.should_run):
+                await asyncio.sleep(1)
+                continue
+            if not self.frontier.has_room():
+                await asyncio.sleep(0.2)
+                continue
+            try:
+                queue_url, messages = await self._call(self.io_pool, receive_tasks, self.queue, self.crawler_queue_url)
+                await self._call(self.io_pool, admit_messages, self.queue, queue_url,
+                                 self.frontier, messages)
+            except Exception as e:
+                print(f"[{self.tag}][ASYNC][SQS ERROR] {e}")
+                await asyncio.sleep(1)
+
+    async def _keep_buffered_invisible(self):
+        while not self.stop_event.is_set():
+            try:
+                await self._call(self.io_pool, extend_buffered, self.queue, self.crawler_queue_url, self.frontier)
+            except Exception as e:
+                print(f"[{self.tag}][ASYNC][SQS ERROR] {e}")
+            await asyncio.sleep(5)
+
+    async def _dispatch(self, inbox):
+        # Moves polite-to-fetch items from the host frontier to the fetch slots, holding one
+        # adaptive-limit slot per item until its worker finishes
+        limiter = get_concurrency()
+        while not self.stop_event.is_set():
+            # The slot is taken only once there is an item, so an idle node shows no load
+            if not limiter.wait_available(timeout=0):
+                await asyncio.sleep(0.02)
+                continue
+            item, wait = self.frontier.poll()
+            if item is None:
+                await asyncio.sleep(min(wait or 0.05, 0.05))
+                continue
+            if not limiter.try_acquire():
+                self.frontier.requeue(item)
+                await asyncio.sleep(0.02)
+                continue
+            await inbox.put(item)
+
+    # === Workers ===
+    async def _crawl(self, slot, session, task):
+        url = task["url"]
+        self._set_status(slot, f"Crawling {url} (depth {task['depth']})")
+
+        validators = await self._call(self.io_pool, get_recrawl_cache().lookup, url)
+        started = time.monotonic()
+        try:
+            result = await self._fetch(session, url, validators, started)
+        except Exception as e:
+            get_concurrency().record(host_of(url), time.monotonic() - started, error=e)
+            raise
+        get_concurrency().record(host_of(url), time.monotonic() - started, status=result.status)
+        get_job_tracker().record(task["job_id"], "fetched")
+
+        page, links, changed = await self._call(self.parse_pool, build_page, task, result, validators)
+        await self._call(self.io_pool, publish_page, self.queue, self.crawler_queue_url,
+                         self.indexer_queue_url, task, page, links, result, changed)
+        self.on_crawled()
+
+    async def _fetch(self, session, url, validators, started):
+        async with session.get(url, headers=conditional_headers(validators)) as r:
+            if r.status == 304:
+                result = FetchResult(304, b"", None, r.headers.get("ETag"), r.headers.get("Last-Modified"), None)
+            else:
+                reader = BodyReader(r.headers.get("Content-Type"), started=started)
+                if reader.wants_body():
+                    async for chunk in r.content.iter_chunked(FETCH_CHUNK_BYTES):
+                        if not reader.feed(chunk):
+                            break
+                body, encoding, digest = reader.finish()
+                result = FetchResult(r.status, body, encoding, r.headers.get("ETag"), r.headers.get("Last-Modified"),
+                                     digest)
+        return result
+
+    async def _worker(self, slot, session, inbox):
+        idle = "Waiting for master signal..." if self.should_run else "Waiting for task..."
+        self._set_status(slot, idle)
+        while not self.stop_event.is_set():
+            try:
+                item = await asyncio.wait_for(inbox.get(), timeout=1)
+            except asyncio.TimeoutError:
+                continue
+
+            try:
+                if await self._call(self.io_pool, should_crawl, self.frontier, item):
+                    await self._crawl(slot, session, item["task"])
+            except Exception as e:
+                print(f"[{self.tag}][ASYNC] Failed to crawl {item['task']['url']}: {e}")
+                get_job_tracker().record(item["task"]["job_id"], "failed")
+            finally:
+                self.frontier.done(item["host"])
+                self.queue.delete(item["queue_url"], item["message"]['ReceiptHandle'])
+                get_concurrency().release()
+            self._set_status(slot, "Idle")
+
+    async def run(self):
+        inbox = asyncio.Queue(maxsize=RECEIVE_BATCH)
+        # Keep-alive pools per host; politeness never needs more than HOST_MAX_INFLIGHT per host
+        # and hostnames resolve through the node's DNS cache (aiohttp's own one only without it)
+        resolver = get_dns_cache().aiohttp_resolver()
+        connector = aiohttp.TCPConnector(limit=self.concurrency, limit_per_host=HOST_MAX_INFLIGHT + 1,
+                                         keepalive_timeout=30, resolver=resolver,
+                                         use_dns_cache=resolver is None)
+        # Per-read timeouts; BodyReader ends the body at FETCH_MAX_SECONDS, `total` is only a backstop
+        timeout = aiohttp.ClientTimeout(total=FETCH_MAX_SECONDS + FETCH_TIMEOUT, sock_connect=FETCH_TIMEOUT,
+                                        sock_read=FETCH_TIMEOUT)
+        trace = get_http_client().aiohttp_trace()
+
+        print(f"[{self.tag}] Async engine: {self.concurrency} fetch slots, {self.num_receivers} receivers")
+        async with aiohttp.ClientSession(connector=connector, headers=HEADERS, timeout=timeout,
+                                         trace_configs=[trace]) as session:
+            tasks = [asyncio.create_task(self._receive_loop()) for _ in range(self.num_receivers)]
+            tasks.append(asyncio.create_task(self._keep_buffered_invisible()))
+            tasks.append(asyncio.create_task(self._dispatch(inbox)))
+            tasks += [
+                asyncio.create_task(self._worker(f"Task-{i+1}", session, inbox))
+                for i in range(self.concurrency)
+            ]
+            await asyncio.gather(*tasks)
+
+        self.queue.flush()
+        self.io_pool.shutdown(wait=False)
+        self.parse_pool.shutdown(wait=False)
+
+def run_async_crawler(**kwargs):
+    asyncio.run(AsyncCrawler(**kwargs).run())
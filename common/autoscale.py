@@ -0,0 +1,182 @@
+import math
+import threading
+import time
+from collections import deque
+
+from common import metrics
+from common.config import (
+    AUTOSCALE_ENABLED, AUTOSCALE_INTERVAL, AUTOSCALE_DRAIN_SECONDS, AUTOSCALE_HYSTERESIS, AUTOSCALE_DOWN_SAMPLES
+)
+
+class WorkerPool:
+    """Elastic pool of worker threads, each calling `step()` in a loop.
+
+    `step()` handles one unit of work (a task, a receive) and returns how many items it
+    processed: a count, True for one, or a falsy value when it found nothing to do.
+    Every `interval` seconds the pool samples the backlog (`depth_fn()`, e.g. approximate
+    queue depth) and the work done since the last sample, and sizes itself to drain the
+    backlog within `drain_seconds` at the measured per-worker rate. With no backlog it
+    keeps as many workers as were actually busy. It grows at once (at most doubling per
+    sample) but shrinks only after `down_samples` samples in a row below the hysteresis
+    band, and by a quarter at most; retired workers finish their current step first.
+    `cap_fn()` may lower the ceiling at run time (the crawler's adaptive fetch limit).
+    """
+
+    def __init__(self, name, step, depth_fn, min_workers, max_workers, stop_event,
+                 status_map=None, lock=None, cap_fn=None, adaptive=AUTOSCALE_ENABLED,
+                 interval=AUTOSCALE_INTERVAL, drain_seconds=AUTOSCALE_DRAIN_SECONDS,
+                 hysteresis=AUTOSCALE_HYSTERESIS, down_samples=AUTOSCALE_DOWN_SAMPLES):
+        self.name = name
+        self.step = step
+        self.depth_fn = depth_fn
+        self.max_workers = max(1, max_workers)
+        self.min_workers = max(1, min(min_workers, self.max_workers))
+        self.stop_event = stop_event
+        self.status_map = status_map
+        self.status_lock = lock
+        self.cap_fn = cap_fn
+        self.adaptive = adaptive
+        self.interval = interval
+        self.drain_seconds = drain_seconds
+        self.hysteresis = hysteresis
+        self.down_samples = down_samples
+
+        self.lock = threading.Lock()
+        self.threads = []
+        self.retiring = 0
+        self.next_id = 0
+        self.target = self.min_workers if adaptive else self.max_workers
+        self.below = 0  # consecutive samples asking for fewer workers
+        self.done = 0
+        self.busy = 0.0
+        self.last = {"depth": None, "rate": 0.0, "utilization": 0.0, "reason": "starting"}
+        self.decisions = deque(maxlen=20)
+
+    # === Workers ===
+    def start(self):
+        with self.lock:
+            self._spawn(self.target)
+        if self.adaptive:
+            threading.Thread(target=self._scale_loop, name=f"{self.name}-autoscale", daemon=True).start()
+        metrics.register("workers", self.snapshot)
+        return self
+
+    def _spawn(self, count):
+        for _ in range(count):
+            self.next_id += 1
+            t = threading.Thread(target=self._run, name=f"Thread-{self.next_id}")
+            self.threads.append(t)
+            t.start()
+
+    def _run(self):
+        while not self.stop_event.is_set():
+            with self.lock:
+                if self.retiring:
+                    self.retiring -= 1
+                    break
+            started = time.monotonic()
+            try:
+                worked = self.step()
+            except Exception as e:
+                print(f"[{self.name}][WORKER] {e}")
+                worked = False
+            if worked:
+                with self.lock:
+                    self.done += int(worked)
+                    self.busy += time.monotonic() - started
+        with self.lock:
+            self.threads.remove(threading.current_thread())
+        if self.status_map is not None:
+            with self.status_lock:
+                self.status_map.pop(threading.current_thread().name, None)
+
+    def join(self):
+        # Returns once stop_event is set and every worker has finished its step
+        while True:
+            with self.lock:
+                threads = list(self.threads)
+            if not threads:
+                return
+            for t in threads:
+                t.join()
+
+    # === Sizing ===
+    def _scale_loop(self):
+        last = time.monotonic()
+        while not self.stop_event.wait(self.interval):
+            now = time.monotonic()
+            try:
+                depth = self.depth_fn()
+            except Exception as e:
+                print(f"[{self.name}][AUTOSCALE] Depth unavailable: {e}")
+                depth = None
+            self.resize(depth, now - last)
+            last = now
+
+    def resize(self, depth, elapsed):
+        with self.lock:
+            current = len(self.threads) - self.retiring
+            done, busy = self.done, self.busy
+            self.done, self.busy = 0, 0.0
+            rate = done / elapsed if elapsed > 0 else 0.0
+            utilization = min(1.0, busy / (max(1, current) * elapsed)) if elapsed > 0 else 0.0
+            desired, reason = self._desired(current, depth, done, rate, utilization)
+
+            ceiling = self.max_workers
+            if self.cap_fn is not None:
+                ceiling = max(self.min_workers, min(ceiling, int(self.cap_fn())))
+            desired = max(self.min_workers, min(ceiling, desired))
+
+            if desired > current * (1 + self.hysteresis):
+                target = min(desired, 2 * max(1, current))
+                self.below = 0
+            elif desired < current * (1 - self.hysteresis) or current > ceiling:
+                self.below += 1
+                if self.below < self.down_samples and current <= ceiling:
+                    target = current
+                    reason += f"; shrink held ({self.below}/{self.down_samples})"
+                else:
+                    target = max(desired, current - max(1, current // 4))
+                    self.below = 0
+            else:
+                target = current
+                self.below = 0
+
+            self.last = {"depth": depth, "rate": round(rate, 2), "utilization": round(utilization, 2),
+                         "reason": reason}
+            if target != current:
+                self.decisions.append({"at": round(time.time(), 1), "from": current, "to": target,
+                                       "reason": reason})
+                print(f"[{self.name}][AUTOSCALE] {current} -> {target} workers: {reason}")
+                if target > current:
+                    self._spawn(target - current)
+                else:
+                    self.retiring += current - target
+            self.target = target
+            return target
+
+    def _desired(self, current, depth, done, rate, utilization):
+        if depth is None:
+            return current, "queue depth unavailable, keeping size"
+        if depth == 0:
+            needed = math.ceil(current * utilization)
+            return needed, f"no backlog, {utilization:.0%} busy"
+        if done == 0:
+            # Backlog but nothing finished yet (cold start): no rate to size from, so grow
+            return 2 * max(1, current), f"backlog {depth}, no completions yet"
+        per_worker = rate / max(1, current)
+        needed = math.ceil(depth / (per_worker * self.drain_seconds))
+        return needed, (f"backlog {depth} at {per_worker:.2f}/s per worker "
+                        f"needs {needed} to drain in {self.drain_seconds:.0f}s")
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "adaptive": self.adaptive,
+                "workers": len(self.threads) - self.retiring,
+                "target": self.target,
+                "min": self.min_workers,
+                "max": self.max_workers,
+                **self.last,
+                "decisions": list(self.decisions)[-10:],
+            }
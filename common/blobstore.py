@@ -0,0 +1,71 @@
+import os
+import re
+import threading
+import uuid
+
+from common.config import BLOB_STORE, BLOB_DIR, BLOB_BUCKET, BLOB_PREFIX, BLOB_REGION
+
+# Keys arrive inside queue messages; only the ones put() generates are accepted, so a crafted
+# message cannot point reads or deletes outside the store
+KEY_RE = re.compile(r"[0-9a-f]{32}")
+
+def _checked(key):
+    if not isinstance(key, str) or not KEY_RE.fullmatch(key):
+        raise ValueError(f"invalid blob key {key!r}")
+    return key
+
+class LocalBlobStore:
+    """Blobs as files under one directory; only shared across nodes on a common mount."""
+
+    def __init__(self, root=BLOB_DIR):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.root, _checked(key))
+
+    def put(self, data):
+        key = uuid.uuid4().hex
+        tmp = self._path(key) + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, self._path(key))
+        return key
+
+    def get(self, key):
+        with open(self._path(key), "rb") as f:
+            return f.read()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+class S3BlobStore:
+    def __init__(self, bucket=BLOB_BUCKET, prefix=BLOB_PREFIX):
+        import boto3
+        self.s3 = boto3.client('s3', region_name=BLOB_REGION)
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def put(self, data):
+        key = uuid.uuid4().hex
+        self.s3.put_object(Bucket=self.bucket, Key=self.prefix + key, Body=data)
+        return key
+
+    def get(self, key):
+        return self.s3.get_object(Bucket=self.bucket, Key=self.prefix + _checked(key))['Body'].read()
+
+    def delete(self, key):
+        self.s3.delete_object(Bucket=self.bucket, Key=self.prefix + _checked(key))
+
+_store = None
+_store_lock = threading.Lock()
+
+def get_blob_store():
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = S3BlobStore() if BLOB_STORE == "s3" else LocalBlobStore()
+        return _store
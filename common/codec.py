@@ -0,0 +1,142 @@
+import ast
+import base64
+import json
+import threading
+import zlib
+from collections import Counter
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+from common import metrics
+from common.blobstore import get_blob_store
+from common.config import (
+    MESSAGE_SERIALIZER, MESSAGE_COMPRESSION, MESSAGE_COMPRESS_MIN, MESSAGE_MAX_BYTES
+)
+
+# Wire format (version 1): "~1" + urlsafe base64 of one frame.
+#   frame = flags byte + payload
+#   flags bits 0-1: serializer  (0 json, 1 msgpack)
+#   flags bits 2-3: compression (0 none, 1 zlib, 2 zstd)
+#   flags bit 4:    payload is a blob-store key holding the real frame
+# Bodies without the prefix are legacy str(dict) / JSON messages.
+PREFIX = "~1"
+
+SER_JSON, SER_MSGPACK = 0, 1
+COMP_NONE, COMP_ZLIB, COMP_ZSTD = 0, 1, 2
+FLAG_BLOB = 1 << 4
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+def _record(**counts):
+    with _stats_lock:
+        _stats.update(counts)
+
+def snapshot():
+    with _stats_lock:
+        stats = dict(_stats)
+    raw = stats.get("raw_bytes", 0)
+    stats["ratio"] = round(stats.get("wire_bytes", 0) / raw, 3) if raw else 0.0
+    return stats
+
+metrics.register("codec", snapshot)
+
+def _serializer():
+    if MESSAGE_SERIALIZER == "json" or msgpack is None:
+        return SER_JSON
+    return SER_MSGPACK
+
+def _compression():
+    if MESSAGE_COMPRESSION == "none":
+        return COMP_NONE
+    if MESSAGE_COMPRESSION == "zlib" or zstandard is None:
+        return COMP_ZLIB
+    return COMP_ZSTD
+
+# === Frames ===
+def _serialize(obj, ser):
+    if ser == SER_MSGPACK:
+        return msgpack.packb(obj, use_bin_type=True)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+def _deserialize(data, ser):
+    if ser == SER_MSGPACK:
+        if msgpack is None:
+            raise ValueError("message is msgpack-encoded but msgpack is not installed")
+        return msgpack.unpackb(data, raw=False)
+    return json.loads(data)
+
+def _compress(data, comp):
+    if comp == COMP_ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if comp == COMP_ZLIB:
+        return zlib.compress(data, 3)
+    return data
+
+def _decompress(data, comp):
+    if comp == COMP_ZSTD:
+        if zstandard is None:
+            raise ValueError("message is zstd-compressed but zstandard is not installed")
+        return zstandard.ZstdDecompressor().decompress(data)
+    if comp == COMP_ZLIB:
+        return zlib.decompress(data)
+    return data
+
+def _frame(obj):
+    ser = _serializer()
+    payload = _serialize(obj, ser)
+    raw_size = len(payload)
+    comp = _compression() if raw_size >= MESSAGE_COMPRESS_MIN else COMP_NONE
+    if comp != COMP_NONE:
+        payload = _compress(payload, comp)
+    return bytes([ser | (comp << 2)]) + payload, raw_size
+
+def _unframe(frame):
+    flags = frame[0]
+    payload = frame[1:]
+    if flags & FLAG_BLOB:
+        return _unframe(get_blob_store().get(payload.decode("ascii")))
+    return _deserialize(_decompress(payload, (flags >> 2) & 3), flags & 3)
+
+def _to_body(frame):
+    return PREFIX + base64.urlsafe_b64encode(frame).decode("ascii")
+
+def _from_body(body):
+    return base64.urlsafe_b64decode(body[len(PREFIX):].encode("ascii"))
+
+# === Public API ===
+def encode(obj):
+    """Message body for `obj`; oversized frames are offloaded and sent as a blob pointer."""
+    frame, raw_size = _frame(obj)
+    body = _to_body(frame)
+    if len(body) > MESSAGE_MAX_BYTES:
+        key = get_blob_store().put(frame)
+        body = _to_body(bytes([FLAG_BLOB]) + key.encode("ascii"))
+        _record(offloaded=1, offloaded_bytes=len(frame))
+    _record(encoded=1, raw_bytes=raw_size, wire_bytes=len(body))
+    return body
+
+def decode(body):
+    if body.startswith(PREFIX):
+        return _unframe(_from_body(body))
+    # Legacy messages: JSON, or the old str(dict) parsed as a literal (never eval'd)
+    try:
+        return json.loads(body)
+    except ValueError:
+        return ast.literal_eval(body)
+
+def release(body):
+    """Drop the blob behind an offloaded message once it has been fully processed."""
+    if not body.startswith(PREFIX):
+        return
+    frame = _from_body(body)
+    if frame[0] & FLAG_BLOB:
+        get_blob_store().delete(frame[1:].decode("ascii"))
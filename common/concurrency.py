@@ -0,0 +1,197 @@
+import statistics
+import threading
+import time
+from collections import OrderedDict, deque
+
+from common import metrics
+from common.config import (
+    ADAPTIVE_CONCURRENCY, CRAWL_THREADS, CONCURRENCY_INITIAL, CONCURRENCY_MIN, CONCURRENCY_STEP,
+    CONCURRENCY_BACKOFF, CONCURRENCY_WINDOW, CONCURRENCY_TARGET_LATENCY, CONCURRENCY_MAX_ERROR_RATE,
+    HOST_MAX_INFLIGHT, HOST_AIMD_MIN, HOST_AIMD_STEP, HOST_AIMD_COOLDOWN
+)
+
+MAX_TRACKED_HOSTS = 10000
+MIN_WINDOW_SAMPLES = 5  # a window keeps collecting until it has this many fetches
+
+def classify(status=None, error=None):
+    """"ok", "throttled" (429), "server_error" (5xx), "timeout" or "failed" (other errors)."""
+    if error is not None:
+        if isinstance(error, TimeoutError) or "Timeout" in type(error).__name__:
+            return "timeout"
+        return "failed"
+    if status == 429:
+        return "throttled"
+    if status is not None and status >= 500:
+        return "server_error"
+    return "ok"
+
+# Signals that mean "slow down"; "failed" (DNS errors, refused connections) says nothing about load
+OVERLOAD = ("throttled", "server_error", "timeout")
+
+class ConcurrencyController:
+    """AIMD limits for one node: a node-wide cap on in-flight fetches plus a limit per host.
+
+    The node-wide limit is re-decided once per window from the error rate and median fetch
+    latency; per-host limits react to every response. A host limit under 1 is applied by the
+    frontier as a longer delay between that host's fetches.
+    """
+
+    def __init__(self, maximum, initial=CONCURRENCY_INITIAL, minimum=CONCURRENCY_MIN, adaptive=ADAPTIVE_CONCURRENCY):
+        self.maximum = maximum
+        self.minimum = min(minimum, maximum)
+        self.adaptive = adaptive
+        self.limit = float(min(max(initial, self.minimum), maximum) if adaptive else maximum)
+        self.slow_start = True
+
+        self.cond = threading.Condition()
+        self.in_flight = 0
+        self.hosts = OrderedDict()  # host -> [limit, last_decrease]
+        self.decisions = deque(maxlen=20)
+        self.totals = {"ok": 0, "throttled": 0, "server_error": 0, "timeout": 0, "failed": 0}
+        self._reset_window(time.monotonic())
+
+    def _reset_window(self, now):
+        self.window_started = now
+        self.window_latencies = []
+        self.window_overloads = 0
+        self.window_peak = self.in_flight
+
+    def _decide(self, scope, old, new, reason):
+        self.decisions.append({"at": round(time.time(), 1), "scope": scope,
+                               "from": round(old, 2), "to": round(new, 2), "reason": reason})
+
+    # === Node-wide slots ===
+    def _wait_for_slot(self, deadline):
+        # Caller holds the lock
+        while self.in_flight >= int(self.limit):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            self.cond.wait(timeout=remaining)
+        return True
+
+    def wait_available(self, timeout=1.0):
+        """True once a slot is free, without taking it: workers idle here while the node is
+        at its limit, and only fetches count as in flight."""
+        with self.cond:
+            return self._wait_for_slot(time.monotonic() + timeout)
+
+    def acquire(self, timeout=1.0):
+        with self.cond:
+            if not self._wait_for_slot(time.monotonic() + timeout):
+                return False
+            self._take_slot()
+            return True
+
+    def try_acquire(self):
+        with self.cond:
+            if self.in_flight >= int(self.limit):
+                return False
+            self._take_slot()
+            return True
+
+    def _take_slot(self):
+        self.in_flight += 1
+        self.window_peak = max(self.window_peak, self.in_flight)
+
+    def release(self):
+        with self.cond:
+            self.in_flight -= 1
+            self.cond.notify()
+
+    # === Feedback ===
+    def record(self, host, latency, status=None, error=None):
+        outcome = classify(status, error)
+        now = time.monotonic()
+        with self.cond:
+            self.totals[outcome] += 1
+            if not self.adaptive:
+                return outcome
+            self._record_host(host, outcome, now)
+            if outcome != "failed":
+                self.window_latencies.append(latency)
+                self.window_overloads += outcome in OVERLOAD
+            if now - self.window_started >= CONCURRENCY_WINDOW and len(self.window_latencies) >= MIN_WINDOW_SAMPLES:
+                self._evaluate_window(now)
+        return outcome
+
+    def _record_host(self, host, outcome, now):
+        state = self.hosts.get(host)
+        if state is None:
+            if outcome not in OVERLOAD:
+                return  # hosts at full limit are not tracked
+            state = self.hosts[host] = [float(HOST_MAX_INFLIGHT), 0.0]
+            while len(self.hosts) > MAX_TRACKED_HOSTS:
+                self.hosts.popitem(last=False)
+        self.hosts.move_to_end(host)
+
+        old = state[0]
+        if outcome in OVERLOAD:
+            if now - state[1] < HOST_AIMD_COOLDOWN:
+                return  # one backoff per burst of failures
+            state[0] = max(HOST_AIMD_MIN, old * CONCURRENCY_BACKOFF)
+            state[1] = now
+            self._decide(host, old, state[0], outcome)
+        elif outcome == "ok":
+            state[0] = min(float(HOST_MAX_INFLIGHT), old + HOST_AIMD_STEP)
+            if state[0] >= HOST_MAX_INFLIGHT:
+                del self.hosts[host]
+                self._decide(host, old, state[0], "recovered")
+
+    def _evaluate_window(self, now):
+        samples = len(self.window_latencies)
+        old = self.limit
+        if samples:
+            error_rate = self.window_overloads / samples
+            latency = statistics.median(self.window_latencies)
+            if error_rate > CONCURRENCY_MAX_ERROR_RATE or latency > CONCURRENCY_TARGET_LATENCY:
+                self.limit = max(float(self.minimum), self.limit * CONCURRENCY_BACKOFF)
+                self.slow_start = False
+                reason = f"error_rate={error_rate:.2f} p50={latency:.2f}s"
+                self._decide("global", old, self.limit, reason)
+            elif self.window_peak >= int(self.limit):
+                # Only grow a limit the workers actually hit
+                grown = self.limit * 2 if self.slow_start else self.limit + CONCURRENCY_STEP
+                self.limit = min(float(self.maximum), grown)
+                if self.limit != old:
+                    self._decide("global", old, self.limit, f"healthy p50={latency:.2f}s")
+                    self.cond.notify_all()
+        self._reset_window(now)
+
+    def host_limit(self, host):
+        with self.cond:
+            state = self.hosts.get(host)
+            return state[0] if state is not None else float(HOST_MAX_INFLIGHT)
+
+    def snapshot(self):
+        with self.cond:
+            throttled = sorted(self.hosts.items(), key=lambda kv: kv[1][0])[:10]
+            return {
+                "adaptive": self.adaptive,
+                "limit": int(self.limit),
+                "max": self.maximum,
+                "in_flight": self.in_flight,
+                "slow_start": self.slow_start,
+                "outcomes": dict(self.totals),
+                "throttled_hosts": {host: round(state[0], 2) for host, state in throttled},
+                "decisions": list(self.decisions)[-10:],
+            }
+
+_controller = None
+_controller_lock = threading.Lock()
+
+def init_concurrency(maximum):
+    """Size the node's controller for its worker count; call once at start-up."""
+    global _controller
+    with _controller_lock:
+        if _controller is None:
+            _controller = ConcurrencyController(maximum)
+            metrics.register("concurrency", _controller.snapshot)
+        return _controller
+
+def get_concurrency():
+    return _controller or init_concurrency(maximum=CRAWL_THREADS)
+
+def host_limit(host):
+    # HostFrontier(host_limit=...) hook; resolves the controller lazily so start-up can size it first
+    return get_concurrency().host_limit(host)
@@ -0,0 +1,203 @@
+import os
+
+# === Crawl Engine ===
+# "threads" keeps the classic blocking workers, "async" runs the asyncio engine
+CRAWL_MODE = os.environ.get("CRAWL_MODE", "threads").lower()
+CRAWL_CONCURRENCY = int(os.environ.get("CRAWL_CONCURRENCY", "200"))  # async mode: max fetch slots
+CRAWL_THREADS = int(os.environ.get("CRAWL_THREADS", "32"))            # threads mode: max worker threads
+INDEXER_THREADS = int(os.environ.get("INDEXER_THREADS", "8"))          # max indexer worker threads
+FETCH_TIMEOUT = float(os.environ.get("FETCH_TIMEOUT", "5"))
+
+# === Elastic Worker Pools ===
+# Every AUTOSCALE_INTERVAL seconds, crawler (threads mode) and indexer pools are resized from the
+# queue backlog and the measured per-worker rate: enough workers to drain the backlog within
+# AUTOSCALE_DRAIN_SECONDS, between *_MIN_THREADS and CRAWL_THREADS / INDEXER_THREADS. Growing
+# happens at once; shrinking needs AUTOSCALE_DOWN_SAMPLES samples in a row more than
+# AUTOSCALE_HYSTERESIS below the current size. AUTOSCALE_ENABLED=0 runs the maximum, fixed.
+AUTOSCALE_ENABLED = os.environ.get("AUTOSCALE_ENABLED", "1") == "1"
+AUTOSCALE_INTERVAL = float(os.environ.get("AUTOSCALE_INTERVAL", "5"))
+AUTOSCALE_DRAIN_SECONDS = float(os.environ.get("AUTOSCALE_DRAIN_SECONDS", "60"))
+AUTOSCALE_HYSTERESIS = float(os.environ.get("AUTOSCALE_HYSTERESIS", "0.2"))
+AUTOSCALE_DOWN_SAMPLES = int(os.environ.get("AUTOSCALE_DOWN_SAMPLES", "3"))
+CRAWL_MIN_THREADS = int(os.environ.get("CRAWL_MIN_THREADS", "2"))
+INDEXER_MIN_THREADS = int(os.environ.get("INDEXER_MIN_THREADS", "1"))
+
+# === Downloads ===
+# Bodies are streamed: non-HTML is dropped after the headers / first bytes, HTML is cut at
+# FETCH_MAX_BYTES (decoded size) or once the fetch has run FETCH_MAX_SECONDS in total
+FETCH_MAX_BYTES = int(os.environ.get("FETCH_MAX_BYTES", str(2 * 1024 * 1024)))
+FETCH_MAX_SECONDS = float(os.environ.get("FETCH_MAX_SECONDS", "20"))
+FETCH_CHUNK_BYTES = int(os.environ.get("FETCH_CHUNK_BYTES", str(64 * 1024)))
+FETCH_CONTENT_TYPES = tuple(
+    t.strip() for t in os.environ.get("FETCH_CONTENT_TYPES", "text/html,application/xhtml+xml").split(",") if t.strip()
+)
+
+# === Queues ===
+# "sqs" (default), "sqlite" (durable single-box queue file shared by all local processes) or
+# "memory" (in-process only: tests and benchmarks that run every role in one process)
+QUEUE_BACKEND = os.environ.get("QUEUE_BACKEND", "sqs").lower()
+QUEUE_SQLITE_PATH = os.environ.get("QUEUE_SQLITE_PATH", "queues.sqlite3")
+QUEUE_VISIBILITY_TIMEOUT = int(os.environ.get("QUEUE_VISIBILITY_TIMEOUT", "30"))  # local backends
+SQS_REGION = os.environ.get("SQS_REGION", "eu-north-1")
+CRAWLER_QUEUE_URL = os.environ.get(
+    "CRAWLER_QUEUE_URL", "https://sqs.eu-north-1.amazonaws.com/441832714601/TaskQueueStandard"
+)
+INDEXER_QUEUE_URL = os.environ.get(
+    "INDEXER_QUEUE_URL", "https://sqs.eu-north-1.amazonaws.com/441832714601/IndexerQueueStandard"
+)
+
+# === Parsing ===
+# Pages are decoded and parsed in PARSE_PROCESSES worker processes (default: one per core) so
+# parsing is not bound by the GIL; 0 parses in the fetch workers (the default on one core, where
+# a pool only adds IPC). Once PARSE_QUEUE_SIZE pages are waiting for or inside the pool, fetch
+# workers block until one finishes (backpressure).
+_CORES = os.cpu_count() or 1
+PARSE_PROCESSES = int(os.environ.get("PARSE_PROCESSES", str(_CORES if _CORES > 1 else 0)))
+PARSE_QUEUE_SIZE = int(os.environ.get("PARSE_QUEUE_SIZE", str(2 * max(1, PARSE_PROCESSES))))
+
+# === Failover Leases ===
+# Primaries renew a lease (LEASE_NAME, default: hostname) with every heartbeat; a standby
+# long-polls the master and takes over while fewer than <ROLE>_PRIMARIES primaries of its role
+# hold a live lease. A lease not renewed for LEASE_TTL seconds has expired.
+LEASE_NAME = os.environ.get("LEASE_NAME", "")
+LEASE_TTL = float(os.environ.get("LEASE_TTL", "6"))
+LEASE_WAIT_TIMEOUT = float(os.environ.get("LEASE_WAIT_TIMEOUT", "25"))
+CRAWLER_PRIMARIES = int(os.environ.get("CRAWLER_PRIMARIES", "2"))
+INDEXER_PRIMARIES = int(os.environ.get("INDEXER_PRIMARIES", "1"))
+
+# === SQS Batching ===
+# Max seconds a buffered send/delete waits for its batch to fill before it is flushed
+SQS_FLUSH_INTERVAL = float(os.environ.get("SQS_FLUSH_INTERVAL", "0.2"))
+# A batch call that fails is retried with exponential backoff (base doubling up to the max, in
+# seconds); an entry still failing after SQS_MAX_ATTEMPTS calls is dropped and counted
+SQS_MAX_ATTEMPTS = int(os.environ.get("SQS_MAX_ATTEMPTS", "5"))
+SQS_RETRY_BASE = float(os.environ.get("SQS_RETRY_BASE", "0.5"))
+SQS_RETRY_MAX = float(os.environ.get("SQS_RETRY_MAX", "30"))
+
+# === Message Codec ===
+# Serializer / compression for crawler -> indexer messages ("auto" picks msgpack / zstd when installed)
+MESSAGE_SERIALIZER = os.environ.get("MESSAGE_SERIALIZER", "auto").lower()
+MESSAGE_COMPRESSION = os.environ.get("MESSAGE_COMPRESSION", "auto").lower()
+MESSAGE_COMPRESS_MIN = int(os.environ.get("MESSAGE_COMPRESS_MIN", "512"))
+# Encoded bodies above this go to the blob store and travel as a pointer (SQS caps a body at 256 KB)
+MESSAGE_MAX_BYTES = int(os.environ.get("MESSAGE_MAX_BYTES", str(240 * 1024)))
+# "local" writes blobs under BLOB_DIR (nodes must share it), "s3" uses BLOB_BUCKET
+BLOB_STORE = os.environ.get("BLOB_STORE", "local").lower()
+BLOB_DIR = os.environ.get("BLOB_DIR", "message_blobs")
+BLOB_BUCKET = os.environ.get("BLOB_BUCKET", "")
+BLOB_PREFIX = os.environ.get("BLOB_PREFIX", "indexer-messages/")
+BLOB_REGION = os.environ.get("BLOB_REGION", SQS_REGION)
+
+# === MySQL (StorageDB) ===
+DB_CONFIG = {
+    "host": os.environ.get("DB_HOST", "172.31.28.123"),
+    "user": os.environ.get("DB_USER", "Admin"),
+    "password": os.environ.get("DB_PASSWORD", "1234"),
+    "database": os.environ.get("DB_NAME", "INDEXER"),
+}
+
+# === Index Writes (indexer) ===
+# Indexed pages are buffered and written as multi-row upserts, one transaction per batch, by
+# INDEX_WRITERS flush threads on pooled connections (pages are sharded among them by URL). A
+# batch is flushed at INDEX_BATCH_ROWS pages, INDEX_BATCH_BYTES of text (keep it under the
+# server's max_allowed_packet) or INDEX_FLUSH_INTERVAL seconds after its first page. Queue
+# messages are deleted only after their batch commits.
+INDEX_BATCH_ROWS = int(os.environ.get("INDEX_BATCH_ROWS", "500"))
+INDEX_BATCH_BYTES = int(os.environ.get("INDEX_BATCH_BYTES", str(4 * 1024 * 1024)))
+INDEX_FLUSH_INTERVAL = float(os.environ.get("INDEX_FLUSH_INTERVAL", "0.5"))
+INDEX_WRITERS = int(os.environ.get("INDEX_WRITERS", "2"))
+
+# === Keyword Index (auto_index_monitor) ===
+# Each pass applies only what changed since the last one: pages whose indexed_pages.updated_at is
+# past the high-water mark, KEYWORD_BATCH_DOCS per transaction. It starts KEYWORD_OVERLAP_SECONDS
+# before the mark so rows committed late by a long transaction are not skipped, and checks for
+# deleted pages (near-duplicate collapses) every KEYWORD_SWEEP_INTERVAL seconds.
+KEYWORD_BATCH_DOCS = int(os.environ.get("KEYWORD_BATCH_DOCS", "500"))
+KEYWORD_OVERLAP_SECONDS = float(os.environ.get("KEYWORD_OVERLAP_SECONDS", "10"))
+KEYWORD_SWEEP_INTERVAL = float(os.environ.get("KEYWORD_SWEEP_INTERVAL", "60"))
+
+# === Segment Index (master search) ===
+# The master copies the postings into immutable segment files under SEGMENT_DIR (local disk) and
+# answers /api/search from them through mmap. Every SEGMENT_SYNC_INTERVAL seconds it reads the
+# index_docs rows changed since its own high-water mark (minus SEGMENT_SYNC_OVERLAP seconds) and
+# writes up to SEGMENT_FLUSH_DOCS of them per new segment. A background thread merges
+# SEGMENT_MERGE_FACTOR adjacent segments of the same size tier; tiers grow by that factor from
+# SEGMENT_MIN_MERGE_DOCS docs. SEGMENT_INDEX_ENABLED=0 searches the MySQL postings instead.
+SEGMENT_INDEX_ENABLED = os.environ.get("SEGMENT_INDEX_ENABLED", "1") == "1"
+SEGMENT_DIR = os.environ.get("SEGMENT_DIR", "index_segments")
+SEGMENT_SYNC_INTERVAL = float(os.environ.get("SEGMENT_SYNC_INTERVAL", "3"))
+SEGMENT_SYNC_OVERLAP = float(os.environ.get("SEGMENT_SYNC_OVERLAP", "30"))
+SEGMENT_FLUSH_DOCS = int(os.environ.get("SEGMENT_FLUSH_DOCS", "5000"))
+SEGMENT_MERGE_FACTOR = int(os.environ.get("SEGMENT_MERGE_FACTOR", "10"))
+SEGMENT_MIN_MERGE_DOCS = int(os.environ.get("SEGMENT_MIN_MERGE_DOCS", "1000"))
+
+# === URL Dedup ===
+# "mysql" shares the seen-set across nodes, "memory" keeps it inside this process
+DEDUP_STORE = os.environ.get("DEDUP_STORE", "mysql").lower()
+DEDUP_ERROR_RATE = float(os.environ.get("DEDUP_ERROR_RATE", "0.001"))
+DEDUP_INITIAL_CAPACITY = int(os.environ.get("DEDUP_INITIAL_CAPACITY", "100000"))
+DEDUP_MEMORY_MB = int(os.environ.get("DEDUP_MEMORY_MB", "64"))
+
+# === Host Politeness (per node) ===
+HOST_RATE = float(os.environ.get("HOST_RATE", "2"))              # sustained fetches/sec per host
+HOST_BURST = float(os.environ.get("HOST_BURST", "4"))            # token bucket size
+HOST_MIN_DELAY = float(os.environ.get("HOST_MIN_DELAY", "0.5"))  # seconds between fetch starts
+HOST_MAX_INFLIGHT = int(os.environ.get("HOST_MAX_INFLIGHT", "2"))
+FRONTIER_MAX_BUFFERED = int(os.environ.get("FRONTIER_MAX_BUFFERED", "1000"))
+FRONTIER_MAX_PER_HOST = int(os.environ.get("FRONTIER_MAX_PER_HOST", "100"))
+# Messages for a host whose local queue is full go back to SQS for this long
+HOST_DEFER_SECONDS = int(os.environ.get("HOST_DEFER_SECONDS", "15"))
+# Buffered messages get their SQS visibility pushed out before it lapses
+VISIBILITY_EXTEND_AFTER = int(os.environ.get("VISIBILITY_EXTEND_AFTER", "20"))
+VISIBILITY_EXTENSION = int(os.environ.get("VISIBILITY_EXTENSION", "60"))
+
+# === Crawl Priority ===
+# Tasks fall into PRIORITY_LANES lanes by depth (shifted by the job's priority); lanes are served
+# by weighted stride scheduling (lane i gets weight 2^(lanes-1-i)) so low lanes slow down but
+# never starve. Inside a lane, tasks with more OPIC cash (importance from in-links) go first.
+PRIORITY_LANES = int(os.environ.get("PRIORITY_LANES", "4"))
+# Optional SQS queue URL per lane (lane 0 first, comma-separated) so ordering holds across the
+# cluster; empty keeps one queue and orders only what each node has buffered
+PRIORITY_LANE_QUEUES = [u.strip() for u in os.environ.get("PRIORITY_LANE_QUEUES", "").split(",") if u.strip()]
+OPIC_LEDGER_SIZE = int(os.environ.get("OPIC_LEDGER_SIZE", "200000"))
+
+# === robots.txt ===
+ROBOTS_ENABLED = os.environ.get("ROBOTS_ENABLED", "1") == "1"
+ROBOTS_AGENT = os.environ.get("ROBOTS_AGENT", "DistributedCrawler")  # product token matched in robots.txt
+ROBOTS_TTL = int(os.environ.get("ROBOTS_TTL", "86400"))
+ROBOTS_NEGATIVE_TTL = int(os.environ.get("ROBOTS_NEGATIVE_TTL", "600"))
+ROBOTS_CACHE_SIZE = int(os.environ.get("ROBOTS_CACHE_SIZE", "10000"))
+ROBOTS_CACHE_PATH = os.environ.get("ROBOTS_CACHE_PATH", "")  # e.g. /var/lib/crawler/robots.json
+ROBOTS_MAX_CRAWL_DELAY = float(os.environ.get("ROBOTS_MAX_CRAWL_DELAY", "30"))
+
+# === Recrawl (conditional GET) Cache ===
+RECRAWL_ENABLED = os.environ.get("RECRAWL_ENABLED", "1") == "1"
+RECRAWL_CACHE_PATH = os.environ.get("RECRAWL_CACHE_PATH", "recrawl_cache.sqlite3")
+
+# === DNS Cache (per node) ===
+DNS_CACHE_ENABLED = os.environ.get("DNS_CACHE_ENABLED", "1") == "1"
+DNS_TTL = int(os.environ.get("DNS_TTL", "300"))                  # getaddrinfo exposes no record TTL
+DNS_NEGATIVE_TTL = int(os.environ.get("DNS_NEGATIVE_TTL", "60"))
+DNS_CACHE_SIZE = int(os.environ.get("DNS_CACHE_SIZE", "50000"))
+
+# === Near-duplicate Detection (indexer) ===
+NEARDUP_ENABLED = os.environ.get("NEARDUP_ENABLED", "1") == "1"
+SIMHASH_MAX_DISTANCE = int(os.environ.get("SIMHASH_MAX_DISTANCE", "3"))  # differing bits of 64
+SIMHASH_MIN_TOKENS = int(os.environ.get("SIMHASH_MIN_TOKENS", "30"))     # shorter pages are too noisy to fingerprint
+
+# === Adaptive Concurrency (AIMD) ===
+# The node-wide fetch limit starts at CONCURRENCY_INITIAL and doubles per healthy window until
+# the first backoff, then grows by CONCURRENCY_STEP; an unhealthy window multiplies it by
+# CONCURRENCY_BACKOFF. Per host, 429 / 5xx / timeouts halve the host's limit (below 1 it
+# stretches the host's delay instead) and each success adds HOST_AIMD_STEP back.
+ADAPTIVE_CONCURRENCY = os.environ.get("ADAPTIVE_CONCURRENCY", "1") == "1"
+CONCURRENCY_INITIAL = int(os.environ.get("CONCURRENCY_INITIAL", "8"))
+CONCURRENCY_MIN = int(os.environ.get("CONCURRENCY_MIN", "2"))
+CONCURRENCY_STEP = int(os.environ.get("CONCURRENCY_STEP", "2"))
+CONCURRENCY_BACKOFF = float(os.environ.get("CONCURRENCY_BACKOFF", "0.5"))
+CONCURRENCY_WINDOW = float(os.environ.get("CONCURRENCY_WINDOW", "5"))                  # seconds per decision
+CONCURRENCY_TARGET_LATENCY = float(os.environ.get("CONCURRENCY_TARGET_LATENCY", "3"))  # median fetch seconds
+CONCURRENCY_MAX_ERROR_RATE = float(os.environ.get("CONCURRENCY_MAX_ERROR_RATE", "0.1"))
+HOST_AIMD_MIN = float(os.environ.get("HOST_AIMD_MIN", "0.125"))
+HOST_AIMD_STEP = float(os.environ.get("HOST_AIMD_STEP", "0.1"))
+HOST_AIMD_COOLDOWN = float(os.environ.get("HOST_AIMD_COOLDOWN", "2"))
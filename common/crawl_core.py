@@ -0,0 +1,297 @@
+import json
+import time
+from collections import namedtuple
+
+from common import codec
+from common.config import (
+    FETCH_TIMEOUT, FETCH_CHUNK_BYTES, ROBOTS_ENABLED, HOST_DEFER_SECONDS, VISIBILITY_EXTEND_AFTER, VISIBILITY_EXTENSION
+)
+from common.concurrency import get_concurrency
+from common.dedup import get_deduper
+from common.download import BodyReader
+from common.frontier import host_of
+from common.http_client import get_http_client
+from common.jobs import get_job_tracker
+from common.parse_pool import get_parse_pool
+from common.priority import SEED_CASH, get_opic, get_receive_lanes, lane_queue_urls, queue_for_task, task_lane
+from common.queues import approximate_depth
+from common.recrawl_cache import get_recrawl_cache, conditional_headers
+from common.robots import get_robots_cache
+from common.urlcanon import canonicalize
+
+HEADERS = {'User-Agent': 'Mozilla/5.0'}
+
+# What the page processing needs from an HTTP response, whichever client fetched it;
+# body holds the raw bytes (None when skipped as not HTML) and encoding the sniffed charset
+FetchResult = namedtuple("FetchResult", ["status", "body", "encoding", "etag", "last_modified", "content_hash"])
+
+# === Task Decoding ===
+def parse_task(raw_body):
+    """Decode a crawler queue message; returns None when the task should be dropped."""
+    body = json.loads(raw_body)
+    url = canonicalize(body.get('url') or '')
+    if url is None:
+        return None
+
+    task = {
+        "url": url,
+        "depth": body.get('depth', 0),
+        "max_depth": body.get('max_depth', 0),
+        "restrict_domain": body.get('restrict_domain', False),
+        "domain_prefix": body.get('domain_prefix', ''),
+        "job_id": body.get('job_id') or "default",
+        "priority": body.get('priority') or "normal",
+        "score": body.get('score', SEED_CASH),  # OPIC cash inherited from the parent page
+    }
+    if task["depth"] > task["max_depth"]:
+        return None
+    return task
+
+def job_of(raw_body):
+    # Job of a task message parse_task rejected; None if the body is not a task at all
+    try:
+        body = json.loads(raw_body)
+    except ValueError:
+        return None
+    return (body.get('job_id') or "default") if isinstance(body, dict) else None
+
+# === Page Processing ===
+def filter_links(task, links):
+    if task["restrict_domain"]:
+        return [link for link in links if link.startswith(task["domain_prefix"])]
+    return links
+
+def child_messages(task, links, shares=None):
+    if task["depth"] + 1 > task["max_depth"]:
+        return []
+    shares = shares or {}
+    return [
+        json.dumps({
+            "url": link,
+            "depth": task["depth"] + 1,
+            "max_depth": task["max_depth"],
+            "restrict_domain": task["restrict_domain"],
+            "domain_prefix": task["domain_prefix"],
+            "job_id": task["job_id"],
+            "priority": task["priority"],
+            "score": shares.get(link, 0.0),
+        })
+        for link in links
+    ]
+
+def build_page(task, result, validators):
+    """(page, links, changed) for a fetch. A 304 or an identical body skips parsing and
+    reuses the links stored with the validators."""
+    if validators is not None:
+        if result.status == 304:
+            get_recrawl_cache().record("not_modified")
+            return None, validators["links"], False
+        if result.content_hash == validators["content_hash"]:
+            get_recrawl_cache().record("unchanged_body")
+            return None, validators["links"], False
+    if result.body is None:
+        return None, [], False
+
+    # Decoding and parsing happen in the parse tier (a process pool unless PARSE_PROCESSES=0)
+    page, links = get_parse_pool().parse(task["url"], result.body, result.encoding)
+    get_recrawl_cache().record("changed")
+    return page, filter_links(task, links), True
+
+def indexer_message(url, page, links, digest=None):
+    if not page["text"]:
+        return None
+    # "extracted" tells the indexer the text is already clean and must not be parsed again
+    return codec.encode({
+        'url': url,
+        'text': page["text"],
+        'title': page["title"],
+        'description': page["description"],
+        'links': links,
+        'content_hash': digest,
+        'extracted': True,
+    })
+
+def publish_page(queue, crawler_queue_url, indexer_queue_url, task, page, links, result=None, changed=True):
+    # queue is a BatchingSQS: these calls only buffer, the flusher ships them in batches of 10
+    if changed:
+        digest = result.content_hash if result else None
+        body = indexer_message(task["url"], page, links, digest)
+        if body is not None:
+            queue.send(indexer_queue_url, body)
+        if result is not None:
+            get_recrawl_cache().store(task["url"], result.etag, result.last_modified, digest, links)
+    elif result is not None:
+        get_recrawl_cache().touch(task["url"])
+
+    # Only links nobody in this job has queued before are fanned out; every link still gets
+    # its OPIC share so already-queued pages gain importance from the extra in-link
+    if task["depth"] + 1 <= task["max_depth"]:
+        opic = get_opic()
+        shares = opic.distribute(opic.settle(task["url"], task["score"]), links)
+        deduper = get_deduper()
+        if task["depth"] == 0:
+            deduper.mark_seen(task["job_id"], [task["url"]])
+        child_queue_url = queue_for_task(crawler_queue_url, dict(task, depth=task["depth"] + 1))
+        children = child_messages(task, deduper.filter_new(task["job_id"], links), shares)
+        for child in children:
+            queue.send(child_queue_url, child)
+        get_job_tracker().record(task["job_id"], "enqueued", len(children))
+
+# === Frontier Feeding ===
+def admit_messages(queue, crawler_queue_url, frontier, messages):
+    # Decode received messages (all from the queue at crawler_queue_url) into the frontier
+    deferred = []
+    for message in messages:
+        try:
+            task = parse_task(message['Body'])
+        except Exception as e:
+            print(f"[CRAWLER] Bad task message: {e}")
+            task = None
+        if task is None or get_job_tracker().is_cancelled(task["job_id"]):
+            # Counted against its job either way, so the job's progress still adds up
+            job_id = task["job_id"] if task is not None else job_of(message['Body'])
+            if job_id is not None:
+                get_job_tracker().record(job_id, "dropped")
+            queue.delete(crawler_queue_url, message['ReceiptHandle'])
+            continue
+        item = {
+            "host": host_of(task["url"]), "task": task, "message": message, "queue_url": crawler_queue_url,
+            "lane": task_lane(task), "score": get_opic().score(task["url"], task["score"]),
+        }
+        if not frontier.put(item):
+            deferred.append(message['ReceiptHandle'])
+
+    # That host already has a full local queue; let SQS offer the message again later
+    if deferred:
+        queue.change_visibility(crawler_queue_url, deferred, HOST_DEFER_SECONDS)
+
+def extend_buffered(queue, crawler_queue_url, frontier):
+    stale = frontier.waiting_since(VISIBILITY_EXTEND_AFTER)
+    by_queue = {}
+    for item in stale:
+        by_queue.setdefault(item["queue_url"], []).append(item["message"]['ReceiptHandle'])
+    for queue_url, handles in by_queue.items():
+        queue.change_visibility(queue_url, handles, VISIBILITY_EXTENSION)
+    now = time.time()
+    for item in stale:
+        item["extended_at"] = now
+
+def receive_tasks(queue, crawler_queue_url, wait=3):
+    """(queue_url, messages) from the next lane queue due, or the single crawler queue."""
+    urls = lane_queue_urls(crawler_queue_url)
+    if len(urls) == 1:
+        return urls[0], queue.receive(urls[0], wait=wait)
+    lanes = get_receive_lanes()
+    order = lanes.order()
+    for lane in order:
+        messages = queue.receive(urls[lane], wait=0)
+        if messages:
+            lanes.charge(lane)
+            return urls[lane], messages
+    # Everything looked empty: long-poll the most-due lane instead of spinning
+    messages = queue.receive(urls[order[0]], wait=wait)
+    if messages:
+        lanes.charge(order[0])
+    return urls[order[0]], messages
+
+def crawl_backlog(queue, crawler_queue_url, frontier):
+    """Tasks waiting for this node: the crawler queue(s) plus what the frontier has buffered."""
+    return sum(approximate_depth(queue.client, url) for url in lane_queue_urls(crawler_queue_url)) + frontier.size
+
+def feed_frontier(queue, crawler_queue_url, frontier, stop_event, should_run=None):
+    while not stop_event.is_set():
+        try:
+            extend_buffered(queue, crawler_queue_url, frontier)
+            if should_run is not None and not should_run():
+                time.sleep(1)
+                continue
+            if not frontier.has_room():
+                time.sleep(0.2)
+                continue
+            queue_url, messages = receive_tasks(queue, crawler_queue_url)
+            admit_messages(queue, queue_url, frontier, messages)
+        except Exception as e:
+            print(f"[CRAWLER][FEEDER] {e}")
+            time.sleep(1)
+
+# === Politeness / Cancellation ===
+def should_crawl(frontier, item):
+    # Tasks of a job cancelled since they were admitted, and robots-disallowed ones, are
+    # dropped unfetched (and counted so job progress still adds up)
+    job_id = item["task"]["job_id"]
+    if get_job_tracker().is_cancelled(job_id) or not robots_allows(frontier, item):
+        get_job_tracker().record(job_id, "dropped")
+        return False
+    return True
+
+def robots_allows(frontier, item):
+    if not ROBOTS_ENABLED:
+        return True
+    allowed, crawl_delay = get_robots_cache().check(item["task"]["url"])
+    if crawl_delay:
+        frontier.set_min_delay(item["host"], crawl_delay)
+    if not allowed:
+        print(f"[CRAWLER] Disallowed by robots.txt: {item['task']['url']}")
+    return allowed
+
+# === Blocking Crawl Step (thread mode) ===
+def fetch_page(url, validators=None):
+    headers = dict(HEADERS, **conditional_headers(validators))
+    started = time.monotonic()
+    r = get_http_client().get(url, headers=headers, timeout=FETCH_TIMEOUT, stream=True)
+    with r:
+        if r.status_code == 304:
+            return FetchResult(304, b"", None, r.headers.get("ETag"), r.headers.get("Last-Modified"), None)
+        reader = BodyReader(r.headers.get("Content-Type"), started=started)
+        if reader.wants_body():
+            for chunk in r.iter_content(FETCH_CHUNK_BYTES):
+                if not reader.feed(chunk):
+                    break
+        body, encoding, digest = reader.finish()
+    return FetchResult(r.status_code, body, encoding, r.headers.get("ETag"), r.headers.get("Last-Modified"), digest)
+
+def crawl_task(queue, crawler_queue_url, indexer_queue_url, task, set_status):
+    url = task["url"]
+    set_status(f"Crawling {url} (depth {task['depth']})")
+    print(f"Crawling {url} (depth {task['depth']})")
+
+    validators = get_recrawl_cache().lookup(url)
+    started = time.monotonic()
+    try:
+        result = fetch_page(url, validators)
+    except Exception as e:
+        get_concurrency().record(host_of(url), time.monotonic() - started, error=e)
+        raise
+    get_concurrency().record(host_of(url), time.monotonic() - started, status=result.status)
+    get_job_tracker().record(task["job_id"], "fetched")
+    page, links, changed = build_page(task, result, validators)
+    publish_page(queue, crawler_queue_url, indexer_queue_url, task, page, links, result, changed)
+
+def crawl_next(queue, crawler_queue_url, indexer_queue_url, frontier, set_status, timeout=1.0):
+    """Take the next polite-to-fetch task from the frontier and crawl it.
+    Returns True when a page was fetched, None when nothing was ready."""
+    # Workers beyond the adaptive node-wide limit idle here, without holding a slot: only
+    # fetches count as in flight, so the controller sees real load rather than idle workers
+    limiter = get_concurrency()
+    if not limiter.wait_available(timeout=timeout):
+        return None
+    item = frontier.get(timeout=timeout)
+    if item is None:
+        return None
+    if not limiter.acquire(timeout=timeout):
+        frontier.requeue(item)  # other workers took the free slots meanwhile
+        return None
+
+    crawled = False
+    try:
+        if should_crawl(frontier, item):
+            crawl_task(queue, crawler_queue_url, indexer_queue_url, item["task"], set_status)
+            crawled = True
+    except Exception as e:
+        print(f"[CRAWLER] Failed to crawl {item['task']['url']}: {e}")
+        get_job_tracker().record(item["task"]["job_id"], "failed")
+    finally:
+        frontier.done(item["host"])
+        queue.delete(item["queue_url"], item["message"]['ReceiptHandle'])
+        limiter.release()
+    return crawled
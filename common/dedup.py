@@ -0,0 +1,237 @@
+import hashlib
+import math
+import threading
+import uuid
+from collections import OrderedDict
+
+from common import metrics
+from common.config import (
+    DB_CONFIG, DEDUP_STORE, DEDUP_ERROR_RATE, DEDUP_INITIAL_CAPACITY, DEDUP_MEMORY_MB
+)
+
+# === Bloom Filters ===
+def url_hash(url):
+    return hashlib.blake2b(url.encode('utf-8'), digest_size=16).digest()
+
+class BloomFilter:
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, int(round(self.num_bits / capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, digest):
+        # Kirsch-Mitzenmacher double hashing over one 128-bit digest
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        return [(h1 + i * h2) % self.num_bits for i in range(self.num_hashes)]
+
+    def contains(self, digest):
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(digest))
+
+    def add(self, digest):
+        for p in self._positions(digest):
+            self.bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    @property
+    def nbytes(self):
+        return len(self.bits)
+
+class ScalableBloomFilter:
+    """Chain of Bloom filters that grows as URLs arrive while keeping the overall
+    false-positive rate under `error_rate` (each new stage doubles capacity and
+    halves its own error budget)."""
+
+    GROWTH = 2
+    TIGHTENING = 0.5
+
+    def __init__(self, initial_capacity=DEDUP_INITIAL_CAPACITY, error_rate=DEDUP_ERROR_RATE):
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.filters = []
+
+    def _grow(self):
+        stage = len(self.filters)
+        capacity = self.initial_capacity * (self.GROWTH ** stage)
+        error = self.error_rate * (1 - self.TIGHTENING) * (self.TIGHTENING ** stage)
+        self.filters.append(BloomFilter(capacity, error))
+
+    def contains(self, digest):
+        return any(f.contains(digest) for f in reversed(self.filters))
+
+    def add(self, digest):
+        if not self.filters or self.filters[-1].count >= self.filters[-1].capacity:
+            self._grow()
+        self.filters[-1].add(digest)
+
+    @property
+    def nbytes(self):
+        return sum(f.nbytes for f in self.filters)
+
+# === Authoritative Stores ===
+class MemorySeenStore:
+    """Process-local stand-in for the shared seen-set (tests, benchmarks, single node)."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.seen = set()
+
+    def add_new(self, job_id, digests):
+        fresh = []
+        with self.lock:
+            for digest in digests:
+                key = (job_id, digest)
+                if key not in self.seen:
+                    self.seen.add(key)
+                    fresh.append(digest)
+        return fresh
+
+class MySQLSeenStore:
+    """Cluster-wide seen-set in the INDEXER database, keyed by (job_id, url hash).
+
+    A batch is claimed in one INSERT IGNORE that stamps new rows with a per-call token;
+    the digests whose rows carry the token are the ones this call added.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.db = None
+
+    def _conn(self):
+        import mysql.connector
+        if self.db is None:
+            self.db = mysql.connector.connect(**DB_CONFIG)
+            cursor = self.db.cursor()
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS seen_urls (
+                    job_id VARCHAR(64) NOT NULL,
+                    url_hash BINARY(16) NOT NULL,
+                    claim BINARY(16) NULL,
+                    PRIMARY KEY (job_id, url_hash)
+                )
+            """)
+            cursor.execute("SHOW COLUMNS FROM seen_urls LIKE 'claim'")
+            if not cursor.fetchall():
+                cursor.execute("ALTER TABLE seen_urls ADD COLUMN claim BINARY(16) NULL")  # tables from before claims
+            cursor.close()
+        self.db.ping(reconnect=True, attempts=2, delay=0)
+        return self.db
+
+    def add_new(self, job_id, digests):
+        digests = list(dict.fromkeys(digests))
+        if not digests:
+            return []
+        claim = uuid.uuid4().bytes
+        placeholders = ", ".join(["%s"] * len(digests))
+        with self.lock:
+            db = self._conn()
+            cursor = db.cursor()
+            try:
+                # Rows that already exist keep their old token, so two nodes racing on the
+                # same link cannot both read it back as theirs
+                cursor.execute(
+                    f"INSERT IGNORE INTO seen_urls (job_id, url_hash, claim) VALUES "
+                    f"{', '.join(['(%s, %s, %s)'] * len(digests))}",
+                    [value for d in digests for value in (job_id, d, claim)]
+                )
+                cursor.execute(
+                    f"SELECT url_hash FROM seen_urls WHERE job_id = %s AND url_hash IN ({placeholders}) AND claim = %s",
+                    (job_id, *digests, claim)
+                )
+                claimed = {bytes(row[0]) for row in cursor.fetchall()}
+                db.commit()
+                return [d for d in digests if d in claimed]
+            finally:
+                cursor.close()
+
+# === Node-local Deduper ===
+class UrlDeduper:
+    """Bloom filter per crawl job in front of the shared seen-set.
+
+    A Bloom hit drops the link without a round-trip (lost at most at `error_rate`);
+    a Bloom miss is confirmed against the authoritative store in one batched call.
+    Job filters are evicted LRU-first once the node exceeds its memory budget.
+    """
+
+    def __init__(self, store, memory_budget=DEDUP_MEMORY_MB * 1024 * 1024,
+                 initial_capacity=DEDUP_INITIAL_CAPACITY, error_rate=DEDUP_ERROR_RATE):
+        self.store = store
+        self.memory_budget = memory_budget
+        self.initial_capacity = initial_capacity
+        self.error_rate = error_rate
+        self.lock = threading.Lock()
+        self.filters = OrderedDict()  # job_id -> ScalableBloomFilter
+        self.stats = {"bloom_hits": 0, "store_hits": 0, "new": 0, "store_errors": 0}
+
+    def _filter(self, job_id):
+        sbf = self.filters.get(job_id)
+        if sbf is None:
+            sbf = self.filters[job_id] = ScalableBloomFilter(self.initial_capacity, self.error_rate)
+        self.filters.move_to_end(job_id)
+        return sbf
+
+    def _enforce_budget(self):
+        while len(self.filters) > 1 and sum(f.nbytes for f in self.filters.values()) > self.memory_budget:
+            job_id, _ = self.filters.popitem(last=False)
+            print(f"[DEDUP] Evicted Bloom filter for job {job_id} (memory budget)")
+
+    def filter_new(self, job_id, urls):
+        # Keep first occurrence order; duplicates inside one page collapse too
+        candidates = OrderedDict()
+        with self.lock:
+            sbf = self._filter(job_id)
+            for url in urls:
+                digest = url_hash(url)
+                if digest in candidates:
+                    continue
+                if sbf.contains(digest):
+                    self.stats["bloom_hits"] += 1
+                    continue
+                candidates[digest] = url
+
+        if not candidates:
+            return []
+
+        try:
+            fresh = set(self.store.add_new(job_id, list(candidates)))
+        except Exception as e:
+            # Without the shared set we still dedup locally rather than stall the crawl
+            print(f"[DEDUP][STORE ERROR] {e}")
+            fresh = set(candidates)
+            with self.lock:
+                self.stats["store_errors"] += 1
+
+        with self.lock:
+            sbf = self._filter(job_id)
+            for digest in candidates:
+                sbf.add(digest)
+            self.stats["store_hits"] += len(candidates) - len(fresh)
+            self.stats["new"] += len(fresh)
+            self._enforce_budget()
+
+        return [url for digest, url in candidates.items() if digest in fresh]
+
+    def mark_seen(self, job_id, urls):
+        self.filter_new(job_id, urls)
+
+    def snapshot(self):
+        with self.lock:
+            stats = dict(self.stats)
+            stats["jobs"] = len(self.filters)
+            stats["bloom_bytes"] = sum(f.nbytes for f in self.filters.values())
+        return stats
+
+_deduper = None
+_deduper_lock = threading.Lock()
+
+def get_deduper():
+    global _deduper
+    with _deduper_lock:
+        if _deduper is None:
+            store = MySQLSeenStore() if DEDUP_STORE == "mysql" else MemorySeenStore()
+            _deduper = UrlDeduper(store)
+            metrics.register("dedup", _deduper.snapshot)
+        return _deduper
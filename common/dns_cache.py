@@ -0,0 +1,147 @@
+import asyncio
+import ipaddress
+import socket
+import threading
+import time
+from collections import OrderedDict
+
+from common import metrics
+from common.config import DNS_CACHE_ENABLED, DNS_TTL, DNS_NEGATIVE_TTL, DNS_CACHE_SIZE, FETCH_TIMEOUT
+
+def system_resolver(host):
+    infos = socket.getaddrinfo(host, None, type=socket.SOCK_STREAM)
+    return [(family, sockaddr[0]) for family, _, _, _, sockaddr in infos]
+
+class DnsCache:
+    """Hostname -> [(family, address)] shared by every fetch of a node.
+
+    One lookup per hostname is in flight at a time (concurrent callers wait for it),
+    answers live `ttl` seconds, failures `negative_ttl`, LRU-bounded to `max_entries`.
+    `resolver(host)` is swappable so the cache can run against a stub.
+    """
+
+    def __init__(self, resolver=None, ttl=DNS_TTL, negative_ttl=DNS_NEGATIVE_TTL, max_entries=DNS_CACHE_SIZE):
+        self.resolver = resolver or system_resolver
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # host -> (expires_at, addresses or None, error message)
+        self.pending = {}             # host -> threading.Event while a lookup is in flight
+        self.stats = {"hits": 0, "misses": 0, "negative_hits": 0, "errors": 0, "coalesced": 0}
+
+    def _cached(self, host):
+        # Caller holds the lock
+        entry = self.entries.get(host)
+        if entry is None or entry[0] <= time.time():
+            return None
+        self.entries.move_to_end(host)
+        if entry[1] is None:
+            self.stats["negative_hits"] += 1
+            raise socket.gaierror(socket.EAI_NONAME, entry[2])
+        self.stats["hits"] += 1
+        return entry[1]
+
+    def peek(self, host):
+        """Cached addresses without blocking; None if a lookup is needed."""
+        with self.lock:
+            return self._cached(host)
+
+    def lookup(self, host):
+        """[(family, address), ...] for `host`; raises socket.gaierror for failed names."""
+        host = host.rstrip(".").lower()
+        try:
+            ip = ipaddress.ip_address(host.strip("[]"))
+            return [(socket.AF_INET6 if ip.version == 6 else socket.AF_INET, str(ip))]
+        except ValueError:
+            pass
+
+        while True:
+            with self.lock:
+                addresses = self._cached(host)
+                if addresses is not None:
+                    return addresses
+                waiter = self.pending.get(host)
+                if waiter is None:
+                    waiter = self.pending[host] = threading.Event()
+                    self.stats["misses"] += 1
+                    break
+                self.stats["coalesced"] += 1
+            waiter.wait(timeout=FETCH_TIMEOUT * 2)
+
+        try:
+            try:
+                addresses = self.resolver(host) or None
+                error = None if addresses else f"no addresses for {host}"
+            except OSError as e:
+                addresses, error = None, str(e)
+            with self.lock:
+                ttl = self.ttl if addresses else self.negative_ttl
+                self.entries[host] = (time.time() + ttl, addresses, error)
+                self.entries.move_to_end(host)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+                if addresses is None:
+                    self.stats["errors"] += 1
+            if addresses is None:
+                raise socket.gaierror(socket.EAI_NONAME, error)
+            return addresses
+        finally:
+            with self.lock:
+                self.pending.pop(host).set()
+
+    def address(self, host):
+        return self.lookup(host)[0][1]
+
+    def snapshot(self):
+        with self.lock:
+            stats = dict(self.stats, hosts=len(self.entries))
+        answered = stats["hits"] + stats["negative_hits"] + stats["misses"]
+        stats["hit_ratio"] = round((stats["hits"] + stats["negative_hits"]) / answered, 3) if answered else 0.0
+        return stats
+
+    def aiohttp_resolver(self):
+        # Same cache for the asyncio engine; misses resolve in the default executor
+        import aiohttp
+        cache = self
+
+        class CachedResolver(aiohttp.abc.AbstractResolver):
+            async def resolve(self, host, port=0, family=socket.AF_INET):
+                try:
+                    addresses = cache.peek(host.rstrip(".").lower())
+                    if addresses is None:
+                        addresses = await asyncio.get_running_loop().run_in_executor(None, cache.lookup, host)
+                except socket.gaierror as e:
+                    raise OSError(f"DNS lookup failed for {host}: {e}") from e
+                return [
+                    {"hostname": host, "host": address, "port": port, "family": fam,
+                     "proto": 0, "flags": socket.AI_NUMERICHOST}
+                    for fam, address in addresses if not family or fam == family
+                ]
+
+            async def close(self):
+                pass
+
+        return CachedResolver()
+
+class NullDnsCache:
+    def address(self, host):
+        return host
+
+    def aiohttp_resolver(self):
+        return None
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_dns_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            if DNS_CACHE_ENABLED:
+                _cache = DnsCache()
+                metrics.register("dns", _cache.snapshot)
+            else:
+                _cache = NullDnsCache()
+        return _cache
@@ -0,0 +1,143 @@
+import codecs
+import re
+import threading
+import time
+from collections import Counter
+
+from common import metrics
+from common.config import FETCH_MAX_BYTES, FETCH_MAX_SECONDS, FETCH_CONTENT_TYPES
+from common.recrawl_cache import content_hasher
+
+# Leading bytes of formats that are never worth parsing as HTML
+BINARY_MAGIC = (
+    b"%PDF", b"PK\x03\x04", b"\x89PNG", b"GIF87a", b"GIF89a", b"\xff\xd8\xff", b"\x1f\x8b",
+    b"BZh", b"\xfd7zXZ", b"7z\xbc\xaf", b"Rar!", b"ID3", b"OggS", b"fLaC", b"RIFF", b"\x1aE\xdf\xa3",
+    b"%!PS", b"\xd0\xcf\x11\xe0", b"MZ", b"\x7fELF", b"wOFF", b"wOF2",
+)
+BOMS = ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"))
+META_CHARSET_RE = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?\s*([\w.:-]+)""", re.IGNORECASE)
+SNIFF_BYTES = 1024
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+def _record(**counts):
+    with _stats_lock:
+        _stats.update(counts)
+
+def snapshot():
+    with _stats_lock:
+        return dict(_stats)
+
+metrics.register("download", snapshot)
+
+def _parse_content_type(header):
+    if not header:
+        return "", None
+    parts = [p.strip() for p in header.split(";")]
+    charset = None
+    for param in parts[1:]:
+        key, _, value = param.partition("=")
+        if key.strip().lower() == "charset" and value:
+            charset = value.strip().strip("\"'")
+    return parts[0].lower(), charset
+
+def _valid_charset(name):
+    try:
+        return codecs.lookup(name).name
+    except (LookupError, TypeError):
+        return None
+
+def _looks_binary(head):
+    if head.startswith(BINARY_MAGIC) or head[4:8] == b"ftyp":  # ftyp: MP4 / MOV / HEIF
+        return True
+    if any(head.startswith(bom) for bom, _ in BOMS):
+        return False
+    return b"\x00" in head[:SNIFF_BYTES]
+
+class BodyReader:
+    """Consumes a streamed response body chunk by chunk for either HTTP client.
+
+    The declared Content-Type can reject the body before any byte is read; the first
+    bytes are sniffed for binary formats and the charset; the size is capped at
+    `max_bytes` and the fetch at `max_seconds`. Bytes are hashed on the way but not
+    decoded: that happens with the parsing, off the fetch threads.
+    """
+
+    def __init__(self, content_type_header, max_bytes=FETCH_MAX_BYTES, max_seconds=FETCH_MAX_SECONDS,
+                 started=None):
+        self.content_type, self.charset = _parse_content_type(content_type_header)
+        self.max_bytes = max_bytes
+        self.deadline = (started or time.monotonic()) + max_seconds
+        self.hasher = content_hasher()
+        self.encoding = None
+        self.head = b""
+        self.parts = []
+        self.size = 0
+        self.outcome = None
+        if self.content_type and self.content_type not in FETCH_CONTENT_TYPES:
+            self.outcome = "skipped_content_type"
+
+    def wants_body(self):
+        return self.outcome is None
+
+    def _start(self, head):
+        if _looks_binary(head):
+            self.outcome = "skipped_binary"
+            return False
+        charset = _valid_charset(self.charset)
+        if charset is None:
+            for bom, name in BOMS:
+                if head.startswith(bom):
+                    charset = name
+                    break
+        if charset is None:
+            match = META_CHARSET_RE.search(head[:SNIFF_BYTES])
+            charset = _valid_charset(match.group(1).decode("ascii", "ignore")) if match else None
+        self.encoding = charset or "utf-8"
+        self._consume(head)
+        return True
+
+    def _consume(self, chunk):
+        self.hasher.update(chunk)
+        self.parts.append(chunk)
+
+    def feed(self, chunk):
+        """Take the next chunk; False means stop reading (body rejected or capped)."""
+        if self.outcome is not None:
+            return False
+        room = self.max_bytes - self.size
+        if len(chunk) > room:
+            chunk = chunk[:room]
+            self.outcome = "truncated"
+        self.size += len(chunk)
+
+        if self.encoding is None:
+            # Hold back the first bytes until there is enough to sniff
+            self.head += chunk
+            if len(self.head) < SNIFF_BYTES and self.outcome is None:
+                return True
+            head, self.head = self.head, b""
+            if not self._start(head):
+                return False
+        else:
+            self._consume(chunk)
+
+        if self.outcome is None and time.monotonic() > self.deadline:
+            self.outcome = "timed_out"
+        return self.outcome is None
+
+    def finish(self):
+        """(body, encoding, content_hash); body is None when it was skipped."""
+        if self.encoding is None and self.outcome is None:
+            # Short bodies never filled the sniff buffer
+            self._start(self.head)
+        if self.outcome is not None and self.outcome.startswith("skipped"):
+            _record(**{self.outcome: 1})
+            return None, None, None
+        _record(fetched=1, bytes=self.size, **({self.outcome: 1} if self.outcome else {}))
+        return b"".join(self.parts), self.encoding, self.hasher.hexdigest()
+
+def decode_body(body, encoding):
+    # A body cut at FETCH_MAX_BYTES may end mid-character; "replace" covers that too
+    return body.decode(encoding or "utf-8", errors="replace")
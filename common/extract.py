@@ -0,0 +1,97 @@
+from html.parser import HTMLParser
+
+from common.urlcanon import canonicalize_links
+
+try:
+    import lxml.etree
+    import lxml.html
+except ImportError:  # the stdlib tokenizer below covers nodes without lxml
+    lxml = None
+
+SKIP_TAGS = ("script", "style", "noscript", "template")
+
+# One pass over the HTML produces everything the crawler and indexer need:
+#   {"text": clean visible text, "title": ..., "description": ..., "hrefs": [raw href, ...]}
+
+def _join(chunks):
+    return " ".join(" ".join(chunks).split())
+
+def _extract_lxml(html):
+    try:
+        doc = lxml.html.document_fromstring(html)
+    except (lxml.etree.ParserError, ValueError):
+        # e.g. str input that still carries an XML encoding declaration
+        return _extract_stdlib(html)
+
+    title = ""
+    description = ""
+    hrefs = []
+    for el in doc.iter("title", "meta", "a"):
+        if el.tag == "title" and not title:
+            title = _join(el.itertext())
+        elif el.tag == "meta" and not description and (el.get("name") or "").lower() == "description":
+            description = _join([el.get("content") or ""])
+        elif el.tag == "a" and el.get("href") is not None:
+            hrefs.append(el.get("href"))
+
+    lxml.etree.strip_elements(doc, *SKIP_TAGS, lxml.etree.Comment, with_tail=False)
+    body = doc.find("body")
+    text = _join((body if body is not None else doc).itertext())
+    return {"text": text, "title": title, "description": description, "hrefs": hrefs}
+
+class _StreamingExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.chunks = []
+        self.title_chunks = []
+        self.description = ""
+        self.hrefs = []
+        self.skip_depth = 0
+        self.in_title = False
+
+    def handle_starttag(self, tag, attrs):
+        if tag in SKIP_TAGS:
+            self.skip_depth += 1
+        elif tag == "title":
+            self.in_title = True
+        elif tag == "a":
+            href = dict(attrs).get("href")
+            if href is not None:
+                self.hrefs.append(href)
+        elif tag == "meta" and not self.description:
+            attrs = dict(attrs)
+            if (attrs.get("name") or "").lower() == "description":
+                self.description = _join([attrs.get("content") or ""])
+
+    def handle_endtag(self, tag):
+        if tag in SKIP_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+        elif tag == "title":
+            self.in_title = False
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        if self.in_title:
+            self.title_chunks.append(data)
+        else:
+            self.chunks.append(data)
+
+def _extract_stdlib(html):
+    parser = _StreamingExtractor()
+    parser.feed(html)
+    parser.close()
+    return {"text": _join(parser.chunks), "title": _join(parser.title_chunks),
+            "description": parser.description, "hrefs": parser.hrefs}
+
+def extract(html):
+    if not html or not html.strip():
+        return {"text": "", "title": "", "description": "", "hrefs": []}
+    if lxml is not None:
+        return _extract_lxml(html)
+    return _extract_stdlib(html)
+
+def extract_page(url, html):
+    # Single parse: clean text, title, description and canonical links
+    page = extract(html)
+    return page, canonicalize_links(url, page.pop("hrefs"))
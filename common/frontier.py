@@ -0,0 +1,225 @@
+import heapq
+import itertools
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+from common.config import (
+    HOST_RATE, HOST_BURST, HOST_MIN_DELAY, HOST_MAX_INFLIGHT, FRONTIER_MAX_BUFFERED, FRONTIER_MAX_PER_HOST,
+    PRIORITY_LANES
+)
+from common.priority import LaneScheduler
+
+
+def host_of(url):
+    return urlsplit(url).netloc
+
+
+class TokenBucket:
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, now):
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def take(self, now):
+        self._refill(now)
+        self.tokens -= 1
+
+
+class HostState:
+    def __init__(self, rate, burst, min_delay):
+        self.queue = []    # heap of (lane, -score, seq, item)
+        self.lane = None   # lane ring this host sits in (its head item's lane)
+        self.bucket = TokenBucket(rate, burst)
+        self.min_delay = min_delay
+        self.next_allowed = 0.0
+        self.in_flight = 0
+        self.fetched = 0
+
+    def wait_time(self, now, max_in_flight):
+        if not self.queue or self.in_flight >= max_in_flight:
+            return None
+        return max(self.next_allowed - now, self.bucket.wait_time(now), 0.0)
+
+
+class HostFrontier:
+    """Node-local frontier partitioned by host.
+
+    Each host has its own priority queue (lane, then score), a token bucket, a minimum
+    delay between fetch starts and an in-flight cap. Hosts sit in the ring of the lane of
+    their best item; `get()` tries lanes in stride-scheduled order and, inside a lane, walks
+    hosts round-robin, handing out the first one allowed to fetch now. One deep host cannot
+    monopolize the workers and no lane starves.
+
+    `host_limit(host)` may override the in-flight cap per host (the adaptive controller);
+    a limit below 1 stretches that host's delay by 1 / limit instead.
+    """
+
+    def __init__(self, rate=HOST_RATE, burst=HOST_BURST, min_delay=HOST_MIN_DELAY,
+                 max_in_flight=HOST_MAX_INFLIGHT, max_buffered=FRONTIER_MAX_BUFFERED,
+                 max_per_host=FRONTIER_MAX_PER_HOST, host_limit=None, lanes=PRIORITY_LANES):
+        self.rate = rate
+        self.burst = burst
+        self.min_delay = min_delay
+        self.max_in_flight = max_in_flight
+        self.max_buffered = max_buffered
+        self.max_per_host = max_per_host
+        self.host_limit = host_limit or (lambda host: max_in_flight)
+
+        self.cond = threading.Condition()
+        self.hosts = {}                                # host -> HostState
+        self.rings = [deque() for _ in range(lanes)]   # per lane: hosts with queued work, round-robin
+        self.scheduler = LaneScheduler(lanes)
+        self.seq = itertools.count()
+        self.size = 0
+
+    def _host(self, host):
+        state = self.hosts.get(host)
+        if state is None:
+            state = self.hosts[host] = HostState(self.rate, self.burst, self.min_delay)
+        return state
+
+    # === Producer side ===
+    def has_room(self):
+        with self.cond:
+            return self.size < self.max_buffered
+
+    def put(self, item):
+        """Queue an item (a dict with at least "host", optionally "lane" and "score");
+        False if that host's queue is full."""
+        with self.cond:
+            state = self._host(item["host"])
+            if len(state.queue) >= self.max_per_host:
+                return False
+            item.setdefault("queued_at", time.time())
+            if len(self.hosts) > 4 * self.max_buffered:
+                self._forget_idle_hosts()
+                state = self._host(item["host"])
+            self._push(item["host"], state, item)
+            return True
+
+    def _push(self, host, state, item):
+        lane = min(item.get("lane", 0), len(self.rings) - 1)
+        heapq.heappush(state.queue, (lane, -item.get("score", 0.0), next(self.seq), item))
+        self._place(host, state)
+        self.size += 1
+        self.cond.notify()
+
+    def _place(self, host, state):
+        # Keep the host in the ring of its head item's lane
+        lane = state.queue[0][0] if state.queue else None
+        if lane == state.lane:
+            return
+        if state.lane is not None:
+            self.rings[state.lane].remove(host)
+        if lane is not None:
+            self.rings[lane].append(host)
+        state.lane = lane
+
+    def set_min_delay(self, host, seconds):
+        # Crawl-delay style overrides; never go below the node-wide default
+        with self.cond:
+            self._host(host).min_delay = max(self.min_delay, seconds)
+
+    # === Consumer side ===
+    def poll(self):
+        """Non-blocking: (item, 0) or (None, seconds until something may be ready)."""
+        with self.cond:
+            return self._poll_locked()
+
+    def _poll_locked(self):
+        now = time.monotonic()
+        soonest = None
+        for lane in self.scheduler.order():
+            ring = self.rings[lane]
+            for _ in range(len(ring)):
+                host = ring[0]
+                ring.rotate(-1)
+                state = self.hosts[host]
+                limit = self.host_limit(host)
+                wait = state.wait_time(now, max(1, int(limit)))
+                if wait is None:
+                    continue
+                if wait <= 0:
+                    self.scheduler.charge(lane)
+                    return self._take(host, state, now, limit), 0.0
+                soonest = wait if soonest is None else min(soonest, wait)
+        return None, soonest
+
+    def _take(self, host, state, now, limit):
+        item = heapq.heappop(state.queue)[-1]
+        self._place(host, state)
+        state.bucket.take(now)
+        state.next_allowed = now + state.min_delay / min(1.0, limit)
+        state.in_flight += 1
+        self.size -= 1
+        return item
+
+    def get(self, timeout=1.0):
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while True:
+                item, wait = self._poll_locked()
+                if item is not None:
+                    return item
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return None
+                self.cond.wait(timeout=min(remaining, wait) if wait is not None else remaining)
+
+    def requeue(self, item):
+        """Give back an item from get()/poll() that was not fetched; it keeps its priority
+        (the host's politeness delay already charged for it stays)."""
+        with self.cond:
+            state = self._host(item["host"])
+            state.in_flight = max(0, state.in_flight - 1)
+            self._push(item["host"], state, item)
+
+    def done(self, host):
+        with self.cond:
+            state = self.hosts.get(host)
+            if state is None:
+                return
+            state.in_flight -= 1
+            state.fetched += 1
+            self.cond.notify()
+
+    def _forget_idle_hosts(self):
+        # Keep the map from growing with every host ever seen; only drop hosts whose
+        # politeness delay has already elapsed so forgetting them changes nothing
+        now = time.monotonic()
+        for host in [h for h, st in self.hosts.items()
+                     if not st.queue and st.in_flight == 0 and st.next_allowed <= now]:
+            del self.hosts[host]
+
+    # === Maintenance / reporting ===
+    def waiting_since(self, age):
+        # Items buffered longer than `age` seconds (their SQS visibility needs extending)
+        cutoff = time.time() - age
+        with self.cond:
+            return [entry[-1] for state in self.hosts.values() for entry in state.queue
+                    if entry[-1].get("extended_at", entry[-1]["queued_at"]) < cutoff]
+
+    def depths(self):
+        with self.cond:
+            return {host: len(state.queue) for host, state in self.hosts.items() if state.queue}
+
+    def threads_info(self, limit=20):
+        with self.cond:
+            busiest = sorted(self.hosts.items(), key=lambda kv: len(kv[1].queue), reverse=True)[:limit]
+            return [
+                {"id": f"host:{host}",
+                 "status": f"Waiting: {len(state.queue)} queued, {state.in_flight} in flight",
+                 "queued": len(state.queue)}
+                for host, state in busiest if state.queue or state.in_flight
+            ]
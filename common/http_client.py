@@ -0,0 +1,139 @@
+import threading
+from collections import Counter
+from http.cookiejar import DefaultCookiePolicy
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import NewConnectionError
+
+from common import metrics
+from common.config import HOST_MAX_INFLIGHT
+from common.dns_cache import get_dns_cache
+
+class HttpStats:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counts = Counter()
+
+    def incr(self, key, n=1):
+        with self.lock:
+            self.counts[key] += n
+
+    def snapshot(self):
+        with self.lock:
+            counts = dict(self.counts)
+        requests_sent = counts.get("requests", 0)
+        connections = counts.get("connections", 0)
+        counts["reused"] = max(0, requests_sent - connections)
+        counts["reuse_ratio"] = round(counts["reused"] / requests_sent, 3) if requests_sent else 0.0
+        return counts
+
+def _dial_cached(conn, new_conn):
+    # Dial the cached address. urllib3 derives conn.host (Host header, SNI, certificate
+    # checks) from _dns_host, so the address replaces it only for the socket connect.
+    hostname = conn._dns_host
+    try:
+        address = get_dns_cache().address(hostname)
+    except OSError as e:
+        raise NewConnectionError(conn, f"Failed to resolve '{conn.host}' ({e})")
+    conn._dns_host = address
+    try:
+        return new_conn()
+    finally:
+        conn._dns_host = hostname
+
+def _counting_adapter(stats, **kwargs):
+    # Connection classes that count every TCP connect / TLS handshake made by the pools
+    class CountingHTTPConnection(HTTPConnection):
+        def connect(self):
+            stats.incr("connections")
+            return super().connect()
+
+        def _new_conn(self):
+            return _dial_cached(self, super()._new_conn)
+
+    class CountingHTTPSConnection(HTTPSConnection):
+        def connect(self):
+            stats.incr("connections")
+            stats.incr("tls_handshakes")
+            return super().connect()
+
+        def _new_conn(self):
+            return _dial_cached(self, super()._new_conn)
+
+    class CountingHTTPPool(HTTPConnectionPool):
+        ConnectionCls = CountingHTTPConnection
+
+    class CountingHTTPSPool(HTTPSConnectionPool):
+        ConnectionCls = CountingHTTPSConnection
+
+    class CountingAdapter(HTTPAdapter):
+        def init_poolmanager(self, *args, **pool_kwargs):
+            super().init_poolmanager(*args, **pool_kwargs)
+            self.poolmanager.pool_classes_by_scheme = {"http": CountingHTTPPool, "https": CountingHTTPSPool}
+
+        def send(self, request, **send_kwargs):
+            stats.incr("requests")
+            return super().send(request, **send_kwargs)
+
+    return CountingAdapter(**kwargs)
+
+class HttpClient:
+    """One keep-alive requests.Session shared by every thread of a node.
+
+    urllib3 keeps a connection pool per host (`pool_connections` hosts, up to
+    `pool_maxsize` idle connections each); cookies are disabled so the session
+    carries no per-site state across workers.
+    """
+
+    def __init__(self, concurrency, per_host=HOST_MAX_INFLIGHT + 1):
+        self.stats = HttpStats()
+        self.session = requests.Session()
+        self.session.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        adapter = _counting_adapter(
+            self.stats,
+            pool_connections=max(10, concurrency * 2),
+            pool_maxsize=max(1, per_host),
+            max_retries=0
+        )
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+
+    def get(self, url, **kwargs):
+        return self.session.get(url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.session.post(url, **kwargs)
+
+    def aiohttp_trace(self):
+        # Same counters for the asyncio engine, whose pooling lives in aiohttp's connector
+        import aiohttp
+        stats = self.stats
+
+        async def on_request_start(session, ctx, params):
+            stats.incr("requests")
+
+        async def on_connection_create_end(session, ctx, params):
+            stats.incr("connections")
+
+        trace = aiohttp.TraceConfig()
+        trace.on_request_start.append(on_request_start)
+        trace.on_connection_create_end.append(on_connection_create_end)
+        return trace
+
+_client = None
+_client_lock = threading.Lock()
+
+def init_http_client(concurrency):
+    """Size the node's shared client for its worker count; call once at start-up."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = HttpClient(concurrency)
+            metrics.register("http", _client.stats.snapshot)
+        return _client
+
+def get_http_client():
+    return _client or init_http_client(concurrency=10)
@@ -0,0 +1,232 @@
+import threading
+import time
+from collections import Counter
+
+from common import metrics
+from common.config import DB_CONFIG, INDEX_BATCH_BYTES, INDEX_BATCH_ROWS, INDEX_FLUSH_INTERVAL, INDEX_WRITERS
+from common.dedup import url_hash
+from common.neardup import get_neardup_index
+
+DEADLOCK = 1213  # ER_LOCK_DEADLOCK: InnoDB rolled the batch back, retrying is safe
+WRITE_ATTEMPTS = 3
+
+UPSERT_HEAD = "INSERT INTO indexed_pages (url, title, description, content, indexed_obj_id, content_hash) VALUES "
+UPSERT_TAIL = """
+    ON DUPLICATE KEY UPDATE
+        title = VALUES(title),
+        description = VALUES(description),
+        content = VALUES(content),
+        indexed_obj_id = VALUES(indexed_obj_id),
+        content_hash = VALUES(content_hash)
+"""
+
+class _Shard:
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.pending = {}  # url -> entry, in arrival order; a re-sent URL keeps its place, newest page wins
+        self.bytes = 0
+        self.first_at = None
+
+class IndexWriter:
+    """Write-behind buffer between the indexer workers and MySQL.
+
+    Workers `add()` a page with an `ack` callback and go back to the queue. Each flush
+    thread owns the pages whose URL hashes to it, so two transactions never write the same
+    row, and writes a batch as one transaction: unchanged pages are dropped with a single
+    hash lookup, near-duplicates are resolved for the whole batch, and the rest goes out as
+    one multi-row upsert. Acks run only after that commit; a batch that fails is rolled
+    back and its messages come back once their visibility timeout expires. `add()` blocks
+    while a shard already holds two batches, so a slow database slows the workers down
+    instead of growing the buffer.
+    """
+
+    def __init__(self, tag="INDEXER", writers=INDEX_WRITERS, batch_rows=INDEX_BATCH_ROWS,
+                 batch_bytes=INDEX_BATCH_BYTES, flush_interval=INDEX_FLUSH_INTERVAL):
+        self.tag = tag
+        self.writers = max(1, writers)
+        self.batch_rows = max(1, batch_rows)
+        self.batch_bytes = batch_bytes
+        self.flush_interval = flush_interval
+        self.pool = None
+        self.lock = threading.Lock()
+        self.stats = Counter()
+        self.closed = False
+        self.shards = [_Shard() for _ in range(self.writers)]
+        self.threads = [
+            threading.Thread(target=self._flush_loop, args=(shard,), name=f"{tag}-writer-{i + 1}", daemon=True)
+            for i, shard in enumerate(self.shards)
+        ]
+        for t in self.threads:
+            t.start()
+
+    def _record(self, **counts):
+        with self.lock:
+            self.stats.update(counts)
+
+    # === Producer side ===
+    def add(self, url, page, content_hash, ack):
+        shard = self.shards[url_hash(url)[0] % len(self.shards)]
+        size = len(page["text"])
+        with shard.cond:
+            if len(shard.pending) >= 2 * self.batch_rows or shard.bytes >= 2 * self.batch_bytes:
+                waited = time.monotonic()
+                while len(shard.pending) >= 2 * self.batch_rows or shard.bytes >= 2 * self.batch_bytes:
+                    shard.cond.wait()
+                self._record(backpressure_waits=1, backpressure_ms=int((time.monotonic() - waited) * 1000))
+            entry = shard.pending.get(url)
+            if entry is None:
+                shard.pending[url] = {"url": url, "page": page, "content_hash": content_hash,
+                                      "size": size, "acks": [ack]}
+            else:
+                shard.bytes -= entry["size"]
+                entry.update(page=page, content_hash=content_hash, size=size)
+                entry["acks"].append(ack)
+            shard.bytes += size
+            if shard.first_at is None:
+                shard.first_at = time.monotonic()
+            if len(shard.pending) >= self.batch_rows or shard.bytes >= self.batch_bytes:
+                shard.cond.notify_all()
+
+    def close(self):
+        # Flush what is buffered and stop the flush threads
+        self.closed = True
+        for shard in self.shards:
+            with shard.cond:
+                shard.cond.notify_all()
+        for t in self.threads:
+            t.join()
+
+    # === Flushing ===
+    def _connection(self):
+        # Created on first use, so the indexer starts (and its batches wait for redelivery) while MySQL is down
+        with self.lock:
+            if self.pool is None:
+                import mysql.connector.pooling
+                self.pool = mysql.connector.pooling.MySQLConnectionPool(
+                    pool_name=f"{self.tag.lower()}-writes", pool_size=self.writers, **DB_CONFIG
+                )
+        return self.pool.get_connection()
+
+    def _due(self, shard):
+        if not shard.pending:
+            return False
+        return (self.closed or len(shard.pending) >= self.batch_rows or shard.bytes >= self.batch_bytes
+                or time.monotonic() - shard.first_at >= self.flush_interval)
+
+    def _take(self, shard):
+        batch, size = [], 0
+        for url, entry in shard.pending.items():
+            if batch and (len(batch) >= self.batch_rows or size + entry["size"] > self.batch_bytes):
+                break
+            batch.append(entry)
+            size += entry["size"]
+        for entry in batch:
+            del shard.pending[entry["url"]]
+        shard.bytes -= size
+        shard.first_at = time.monotonic() if shard.pending else None
+        shard.cond.notify_all()  # producers blocked on a full shard
+        return batch
+
+    def _flush_loop(self, shard):
+        while True:
+            with shard.cond:
+                while not self._due(shard):
+                    if self.closed and not shard.pending:
+                        return
+                    timeout = self.flush_interval
+                    if shard.first_at is not None:
+                        timeout = max(0.005, shard.first_at + self.flush_interval - time.monotonic())
+                    shard.cond.wait(timeout=timeout)
+                batch = self._take(shard)
+            self._write(batch)
+
+    def _write(self, batch):
+        started = time.monotonic()
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            db = cursor = None
+            try:
+                db = self._connection()
+                db.ping(reconnect=True)  # pooled connections outlive the server's idle timeout
+                cursor = db.cursor()
+                written = self._write_batch(cursor, batch)
+                db.commit()
+                break
+            except Exception as e:
+                if db is not None:
+                    try:
+                        db.rollback()
+                    except Exception:
+                        pass
+                if getattr(e, "errno", None) == DEADLOCK and attempt < WRITE_ATTEMPTS:
+                    self._record(deadlock_retries=1)
+                    continue
+                self._record(failed_batches=1, failed_pages=len(batch))
+                print(f"[{self.tag}][DB ERROR] Batch of {len(batch)} pages not written, left for redelivery: {e}")
+                return
+            finally:
+                if cursor is not None:
+                    cursor.close()
+                if db is not None:
+                    db.close()  # back to the pool
+
+        self._record(batches=1, pages=len(batch), written=written,
+                     flush_ms=int((time.monotonic() - started) * 1000))
+        for entry in batch:
+            for ack in entry["acks"]:
+                try:
+                    ack()
+                except Exception as e:
+                    print(f"[{self.tag}][ACK ERROR] {entry['url']}: {e}")
+
+    def _write_batch(self, cursor, batch):
+        placeholders = ", ".join(["%s"] * len(batch))
+        cursor.execute(f"SELECT url, content_hash FROM indexed_pages WHERE url IN ({placeholders})",
+                       [entry["url"] for entry in batch])
+        stored = dict(cursor.fetchall())
+        # Recrawls of unchanged pages: nothing to fingerprint or rewrite
+        changed = [entry for entry in batch
+                   if not entry["content_hash"] or stored.get(entry["url"]) != entry["content_hash"]]
+        self._record(unchanged=len(batch) - len(changed))
+
+        neardup = get_neardup_index()
+        if neardup and changed:
+            fingerprints = [(entry["url"], neardup.fingerprint(entry["page"]["text"])) for entry in changed]
+            fingerprints = [(url, fingerprint) for url, fingerprint in fingerprints if fingerprint is not None]
+            duplicates = neardup.find_many(cursor, fingerprints)
+            for url, (canonical_url, distance) in duplicates.items():
+                # Mirror / print view / session variant of an indexed page: keep only the canonical one
+                neardup.collapse(cursor, url, canonical_url, distance)
+                print(f"[{self.tag}] Near-duplicate of {canonical_url}, not indexed: {url}")
+            neardup.add_many(cursor, [(url, fingerprint) for url, fingerprint in fingerprints if url not in duplicates])
+            changed = [entry for entry in changed if entry["url"] not in duplicates]
+
+        if changed:
+            rows = []
+            for entry in changed:
+                page = entry["page"]
+                rows.extend((entry["url"], (page.get("title") or "")[:512], page.get("description") or "",
+                             page["text"], "dummy-id", entry["content_hash"]))
+            cursor.execute(UPSERT_HEAD + ", ".join(["(%s, %s, %s, %s, %s, %s)"] * len(changed)) + UPSERT_TAIL, rows)
+        return len(changed)
+
+    def snapshot(self):
+        with self.lock:
+            stats = dict(self.stats)
+        stats["buffered"] = sum(len(shard.pending) for shard in self.shards)
+        stats["writers"] = self.writers
+        return stats
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def init_index_writer(tag="INDEXER", writers=INDEX_WRITERS):
+    """Start the node's write-behind buffer; call once at start-up."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = IndexWriter(tag, writers)
+            metrics.register("index_writes", _writer.snapshot)
+        return _writer
+
+def get_index_writer():
+    return _writer or init_index_writer()
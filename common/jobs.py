@@ -0,0 +1,76 @@
+import threading
+import uuid
+from collections import Counter, defaultdict
+
+COUNTERS = ("fetched", "failed", "enqueued", "dropped")
+
+class JobTracker:
+    """Per-job counters a node ships to the master with each heartbeat, plus the set of
+    cancelled job IDs the master sends back.
+
+    Counts are deltas, so the master can simply add them up. Each batch of deltas carries
+    (session, seq) and is resent unchanged until a reply acknowledges it; the master applies
+    a seq once per session, so a heartbeat whose reply was lost is not counted twice.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending = defaultdict(Counter)  # job_id -> counter deltas not yet in a batch
+        self.cancelled = frozenset()
+        self.session = uuid.uuid4().hex      # new per process, so a restarted node starts over at seq 1
+        self.seq = 0
+        self.unacked = None                  # (seq, deltas) sent but not yet acknowledged
+
+    def record(self, job_id, counter, n=1):
+        if n:
+            with self.lock:
+                self.pending[job_id][counter] += n
+
+    def drain(self):
+        with self.lock:
+            deltas = {job_id: dict(counts) for job_id, counts in self.pending.items()}
+            self.pending.clear()
+        return deltas
+
+    def heartbeat_fields(self):
+        """Payload fields for the next heartbeat: the unacknowledged batch again, else the
+        deltas recorded since the last one (which keep accumulating while a batch is unacked)."""
+        with self.lock:
+            if self.unacked is None and self.pending:
+                self.seq += 1
+                self.unacked = (self.seq, {job_id: dict(counts) for job_id, counts in self.pending.items()})
+                self.pending.clear()
+            if self.unacked is None:
+                return {"jobs": {}}
+            seq, deltas = self.unacked
+        return {"jobs": deltas, "jobs_batch": {"session": self.session, "seq": seq}}
+
+    def set_cancelled(self, job_ids):
+        with self.lock:
+            self.cancelled = frozenset(job_ids)
+
+    def is_cancelled(self, job_id):
+        return job_id in self.cancelled
+
+    def apply_reply(self, reply):
+        # The master answers every heartbeat with the currently cancelled job IDs, and
+        # acknowledges the batch of deltas once it is committed (or was already)
+        if not isinstance(reply, dict):
+            return
+        if "cancelled_jobs" in reply:
+            self.set_cancelled(reply["cancelled_jobs"])
+        ack = reply.get("jobs_ack")
+        if isinstance(ack, dict) and ack.get("session") == self.session:
+            with self.lock:
+                if self.unacked is not None and self.unacked[0] <= ack.get("seq", 0):
+                    self.unacked = None
+
+_tracker = None
+_tracker_lock = threading.Lock()
+
+def get_job_tracker():
+    global _tracker
+    with _tracker_lock:
+        if _tracker is None:
+            _tracker = JobTracker()
+        return _tracker
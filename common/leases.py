@@ -0,0 +1,197 @@
+import threading
+import time
+from collections import deque
+
+from common.config import LEASE_TTL, LEASE_WAIT_TIMEOUT
+
+# === Master side ===
+class LeaseTable:
+    """Time-bounded leases kept by the master.
+
+    Primaries renew their named lease with every heartbeat. A standby blocks in `wait()`
+    until fewer than `min_active` primaries of its role hold a live lease, then gets a
+    standby lease of its own. It keeps that lease through its heartbeats only while it is
+    still needed, so it steps down once the primaries are back.
+    """
+
+    def __init__(self, ttl=LEASE_TTL):
+        self.ttl = ttl
+        self.cond = threading.Condition()
+        self.leases = {}  # name -> {"holder", "role", "kind", "expires", "granted", "min_active"}
+        self.failovers = deque(maxlen=50)
+        # Leases live in memory: after a restart, give primaries one TTL to renew before any
+        # standby is let in
+        self.grace_until = time.monotonic() + ttl
+
+    def _live(self, role, kind, now, exclude=None):
+        return [
+            (name, lease) for name, lease in self.leases.items()
+            if lease["role"] == role and lease["kind"] == kind and lease["expires"] > now and name != exclude
+        ]
+
+    def _needed(self, role, min_active, now):
+        return min_active - len(self._live(role, "primary", now))
+
+    def renew(self, node_id, role, name, standby=False):
+        """Heartbeat renewal; False tells a standby its lease is gone."""
+        now = time.monotonic()
+        with self.cond:
+            lease = self.leases.get(name)
+            if standby:
+                if lease is None or lease["holder"] != node_id or lease["expires"] <= now:
+                    return False
+                # Standbys beyond the current gap step down, the longest-serving ones stay
+                standbys = sorted(self._live(role, "standby", now), key=lambda item: item[1]["granted"])
+                rank = [n for n, _ in standbys].index(name)
+                if rank >= self._needed(role, lease["min_active"], now):
+                    del self.leases[name]
+                    self.cond.notify_all()
+                    return False
+                lease["expires"] = now + self.ttl
+                return True
+
+            if lease is None or lease["holder"] != node_id or lease["expires"] <= now:
+                lease = {"holder": node_id, "role": role, "kind": "primary", "granted": now, "min_active": None}
+                self.leases[name] = lease
+            lease["expires"] = now + self.ttl
+            return True
+
+    def _grant(self, role, node_id, min_active, now):
+        name = f"standby:{role}:{node_id}"
+        own = self.leases.get(name)
+        if own is not None and own["expires"] > now:
+            return name, own
+        if now < self.grace_until:
+            return None
+        if self._needed(role, min_active, now) <= len(self._live(role, "standby", now, exclude=name)):
+            return None
+
+        lease = {"holder": node_id, "role": role, "kind": "standby", "granted": now,
+                 "expires": now + self.ttl, "min_active": min_active}
+        self.leases[name] = lease
+        # Failover latency: from the replaced primary's last renewal to this grant
+        expired = [item for item in self.leases.values()
+                   if item["role"] == role and item["kind"] == "primary" and item["expires"] <= now]
+        replaced = max(expired, key=lambda item: item["expires"], default=None)
+        self.failovers.append({
+            "at": round(time.time(), 1),
+            "role": role,
+            "standby": node_id,
+            "replaces": replaced["holder"] if replaced else None,
+            "since_last_renewal": round(now - (replaced["expires"] - self.ttl), 2) if replaced else None,
+            "since_expiry": round(now - replaced["expires"], 2) if replaced else None,
+        })
+        return name, lease
+
+    def wait(self, role, node_id, min_active, timeout):
+        """Block until this standby holds a lease (returned as a reply dict) or `timeout` passes."""
+        deadline = time.monotonic() + timeout
+        with self.cond:
+            while True:
+                now = time.monotonic()
+                granted = self._grant(role, node_id, min_active, now)
+                if granted is not None:
+                    name, lease = granted
+                    failover = self.failovers[-1] if self.failovers and self.failovers[-1]["standby"] == node_id else {}
+                    return {"granted": True, "lease": name, "ttl": self.ttl,
+                            "replaces": failover.get("replaces"),
+                            "since_last_renewal": failover.get("since_last_renewal")}
+                if now >= deadline:
+                    return {"granted": False}
+                # Nothing changes until a live lease of this role lapses or one is dropped (notify)
+                live = self._live(role, "primary", now) + self._live(role, "standby", now)
+                wake = min([lease["expires"] for _, lease in live] + [deadline])
+                if now < self.grace_until:
+                    wake = min(wake, self.grace_until)
+                self.cond.wait(timeout=max(0.01, wake - now + 0.01))
+
+    def snapshot(self):
+        now = time.monotonic()
+        with self.cond:
+            leases = [
+                {"name": name, "holder": lease["holder"], "role": lease["role"], "kind": lease["kind"],
+                 "expires_in": round(lease["expires"] - now, 2), "live": lease["expires"] > now}
+                for name, lease in sorted(self.leases.items())
+            ]
+            return {"ttl": self.ttl, "leases": leases, "failovers": list(self.failovers)}
+
+# === Node side ===
+class StandbyLease:
+    """Standby node's view of its lease.
+
+    A single background thread long-polls the master while the node is on standby, so
+    an idle standby costs one open request rather than a polling loop. The heartbeat
+    renews the lease once granted. The node stops on its own if renewals stop getting
+    through for a TTL, or if the master revokes the lease.
+    """
+
+    def __init__(self, master_api, node_id, role, min_active, tag, ttl=LEASE_TTL, wait_timeout=LEASE_WAIT_TIMEOUT):
+        self.master_api = master_api
+        self.node_id = node_id
+        self.role = role
+        self.min_active = min_active
+        self.tag = tag
+        self.ttl = ttl
+        self.wait_timeout = wait_timeout
+        self.cond = threading.Condition()
+        self.name = None
+        self.renewed_at = 0.0
+
+    def start(self):
+        threading.Thread(target=self._watch, name=f"{self.tag}-lease", daemon=True).start()
+        return self
+
+    def _held(self):
+        if self.name is not None and time.monotonic() - self.renewed_at >= self.ttl:
+            print(f"[{self.tag}][LEASE] Lease {self.name} lapsed (master unreachable); back to standby")
+            self.name = None
+        return self.name is not None
+
+    def _watch(self):
+        from common.http_client import get_http_client
+        while True:
+            with self.cond:
+                while self._held():
+                    self.cond.wait(timeout=max(0.01, self.renewed_at + self.ttl - time.monotonic()))
+            try:
+                reply = get_http_client().get(
+                    f"{self.master_api}/api/leases/wait",
+                    params={"role": self.role, "node_id": self.node_id, "min_active": self.min_active,
+                            "timeout": self.wait_timeout},
+                    timeout=self.wait_timeout + 5
+                ).json()
+            except Exception as e:
+                print(f"[{self.tag}][LEASE] Wait failed: {e}")
+                time.sleep(2)
+                continue
+            if reply.get("granted"):
+                with self.cond:
+                    self.name = reply["lease"]
+                    self.renewed_at = time.monotonic()
+                    self.cond.notify_all()
+                print(f"[{self.tag}][LEASE] Active: taking over for {reply.get('replaces') or 'a missing primary'} "
+                      f"({reply.get('since_last_renewal')}s after its last heartbeat)")
+
+    def is_active(self):
+        with self.cond:
+            return self._held()
+
+    def wait_active(self, timeout):
+        with self.cond:
+            return self.cond.wait_for(self._held, timeout=timeout)
+
+    def heartbeat_field(self):
+        with self.cond:
+            return {"name": self.name, "standby": True} if self._held() else None
+
+    def apply_reply(self, reply):
+        lease = reply.get("lease") if isinstance(reply, dict) else None
+        with self.cond:
+            if not lease or lease.get("name") != self.name:
+                return
+            if lease.get("held"):
+                self.renewed_at = time.monotonic()
+            else:
+                print(f"[{self.tag}][LEASE] Lease {self.name} revoked: primaries are back")
+                self.name = None
+                self.cond.notify_all()
@@ -0,0 +1,174 @@
+import hashlib
+import re
+import threading
+from collections import Counter, defaultdict
+
+from common import metrics
+from common.config import NEARDUP_ENABLED, SIMHASH_MAX_DISTANCE, SIMHASH_MIN_TOKENS
+from common.dedup import url_hash
+
+BITS = 64
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+# === SimHash ===
+def _feature_hash(feature):
+    return int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+
+def simhash(tokens):
+    """64-bit SimHash over word bigrams, each weighted by how often it occurs."""
+    features = Counter(f"{a} {b}" for a, b in zip(tokens, tokens[1:])) or Counter(tokens)
+    weights = [0] * BITS
+    for feature, count in features.items():
+        h = _feature_hash(feature)
+        for bit in range(BITS):
+            weights[bit] += count if h >> bit & 1 else -count
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+def hamming(a, b):
+    return bin(a ^ b).count("1")
+
+def bands(fingerprint, num_bands):
+    # Pigeonhole: fingerprints within num_bands - 1 bits agree exactly on at least one band
+    width = BITS // num_bands
+    mask = (1 << width) - 1
+    return [(band, fingerprint >> (band * width) & mask) for band in range(num_bands)]
+
+# === Banded Index (MySQL) ===
+class NearDupIndex:
+    """SimHash fingerprints of indexed pages, banded so a lookup touches a few buckets
+    instead of every row. Pages within `max_distance` bits of an indexed page are
+    collapsed onto that page's URL."""
+
+    def __init__(self, max_distance=SIMHASH_MAX_DISTANCE, min_tokens=SIMHASH_MIN_TOKENS):
+        self.max_distance = max_distance
+        self.num_bands = max_distance + 1
+        self.min_tokens = min_tokens
+        self.lock = threading.Lock()
+        self.schema_ready = False
+        self.stats = Counter()
+
+    def _record(self, key):
+        with self.lock:
+            self.stats[key] += 1
+
+    def ensure_schema(self, cursor):
+        if self.schema_ready:
+            return
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS simhash_bands (
+                band TINYINT UNSIGNED NOT NULL,
+                bucket BIGINT UNSIGNED NOT NULL,
+                url_hash BINARY(16) NOT NULL,
+                url TEXT NOT NULL,
+                simhash BIGINT UNSIGNED NOT NULL,
+                PRIMARY KEY (band, bucket, url_hash),
+                KEY url_hash_key (url_hash)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS near_duplicates (
+                url_hash BINARY(16) PRIMARY KEY,
+                url TEXT NOT NULL,
+                canonical_url TEXT NOT NULL,
+                distance TINYINT UNSIGNED NOT NULL,
+                detected_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        self.schema_ready = True
+
+    def fingerprint(self, text):
+        tokens = TOKEN_RE.findall(text.lower())
+        if len(tokens) < self.min_tokens:
+            self._record("too_short")
+            return None
+        return simhash(tokens)
+
+    def find(self, cursor, url, fingerprint):
+        """(canonical_url, distance) of the closest indexed near-duplicate, or None."""
+        return self.find_many(cursor, [(url, fingerprint)]).get(url)
+
+    def find_many(self, cursor, items):
+        """{url: (canonical_url, distance)} for the (url, fingerprint) items that are near-duplicates
+        of an indexed page or of an earlier item in the same batch; one query for the whole batch."""
+        if not items:
+            return {}
+        self.ensure_schema(cursor)
+        buckets = defaultdict(list)  # (band, bucket) -> [(url_hash, url, simhash)]
+        pairs = sorted({pair for _, fingerprint in items for pair in bands(fingerprint, self.num_bands)})
+        for i in range(0, len(pairs), 500):
+            chunk = pairs[i:i + 500]
+            where = " OR ".join(["(band = %s AND bucket = %s)"] * len(chunk))
+            cursor.execute(f"SELECT band, bucket, url_hash, url, simhash FROM simhash_bands WHERE {where}",
+                           [v for pair in chunk for v in pair])
+            for band, bucket, candidate_hash, candidate_url, candidate_fp in cursor.fetchall():
+                buckets[(band, bucket)].append((bytes(candidate_hash), candidate_url, int(candidate_fp)))
+
+        duplicates = {}
+        for url, fingerprint in items:
+            own = url_hash(url)
+            pairs = bands(fingerprint, self.num_bands)
+            best = None
+            for pair in pairs:
+                for candidate_hash, candidate_url, candidate_fp in buckets.get(pair, ()):
+                    if candidate_hash == own:
+                        continue
+                    distance = hamming(fingerprint, candidate_fp)
+                    if distance <= self.max_distance and (best is None or distance < best[1]):
+                        best = (candidate_url, distance)
+            self._record("duplicates" if best else "unique")
+            if best:
+                duplicates[url] = best
+            else:
+                # Not written yet, but later pages of the batch must still collapse onto it
+                for pair in pairs:
+                    buckets[pair].append((own, url, fingerprint))
+        return duplicates
+
+    def add(self, cursor, url, fingerprint):
+        self.add_many(cursor, [(url, fingerprint)])
+
+    def add_many(self, cursor, items):
+        if not items:
+            return
+        self.ensure_schema(cursor)
+        hashes = [url_hash(url) for url, _ in items]
+        placeholders = ", ".join(["%s"] * len(hashes))
+        cursor.execute(f"DELETE FROM simhash_bands WHERE url_hash IN ({placeholders})", hashes)
+        cursor.executemany(
+            "INSERT INTO simhash_bands (band, bucket, url_hash, url, simhash) VALUES (%s, %s, %s, %s, %s)",
+            [(band, bucket, own, url, fingerprint)
+             for own, (url, fingerprint) in zip(hashes, items)
+             for band, bucket in bands(fingerprint, self.num_bands)]
+        )
+        cursor.execute(f"DELETE FROM near_duplicates WHERE url_hash IN ({placeholders})", hashes)
+
+    def collapse(self, cursor, url, canonical_url, distance):
+        # The duplicate's own row (from an earlier, different version) leaves the index too
+        self.ensure_schema(cursor)
+        own = url_hash(url)
+        cursor.execute("DELETE FROM simhash_bands WHERE url_hash = %s", (own,))
+        cursor.execute("DELETE FROM indexed_pages WHERE url = %s", (url,))
+        cursor.execute("""
+            INSERT INTO near_duplicates (url_hash, url, canonical_url, distance) VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE canonical_url = VALUES(canonical_url), distance = VALUES(distance)
+        """, (own, url, canonical_url, distance))
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats)
+
+_index = None
+_index_lock = threading.Lock()
+
+def get_neardup_index():
+    """The node's NearDupIndex, or None when near-duplicate detection is disabled."""
+    global _index
+    with _index_lock:
+        if _index is None and NEARDUP_ENABLED:
+            _index = NearDupIndex()
+            metrics.register("neardup", _index.snapshot)
+        return _index
@@ -0,0 +1,107 @@
+import multiprocessing
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+from common import metrics
+from common.config import PARSE_PROCESSES, PARSE_QUEUE_SIZE
+from common.download import decode_body
+from common.extract import extract_page
+
+def parse_body(url, body, encoding):
+    """(page, canonical links) for a fetched body; runs inside a parse process."""
+    return extract_page(url, decode_body(body, encoding))
+
+class ParsePool:
+    """Parsing tier of a crawler node: pages go from the fetch workers to a process pool.
+
+    At most `max_pending` pages are queued for or inside the pool; past that `parse()`
+    blocks, so a node whose cores are saturated fetches more slowly instead of piling up
+    bodies in memory. The raw bytes cross the process boundary once; they are never
+    decoded on the fetch side.
+    """
+
+    def __init__(self, processes, max_pending):
+        self.processes = processes
+        self.max_pending = max(1, max_pending)
+        self.slots = threading.BoundedSemaphore(self.max_pending)
+        self.lock = threading.Lock()
+        self.stats = Counter()
+        self.executor = self._start()
+
+    def _start(self):
+        # Never fork the node itself: a restart happens while the fetch, flusher and heartbeat
+        # threads run, and a forked child can inherit a lock some thread was holding. The fork
+        # server is a fresh single-threaded process that imports the node script (which starts
+        # no threads at import) and the parser once; workers fork from it. spawn elsewhere.
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context("forkserver")
+            context.set_forkserver_preload(["__main__", __name__])
+        else:
+            context = multiprocessing.get_context("spawn")
+        executor = ProcessPoolExecutor(max_workers=self.processes, mp_context=context)
+        executor.submit(int).result()  # starts the fork server now rather than mid-crawl
+        return executor
+
+    def _record(self, **counts):
+        with self.lock:
+            self.stats.update(counts)
+
+    def parse(self, url, body, encoding):
+        if not self.slots.acquire(blocking=False):
+            waited = time.monotonic()
+            self.slots.acquire()
+            self._record(backpressure_waits=1, backpressure_ms=int((time.monotonic() - waited) * 1000))
+        executor = self.executor
+        started = time.monotonic()
+        try:
+            page, links = executor.submit(parse_body, url, body, encoding).result()
+        except BrokenProcessPool:
+            # A worker died (OOM kill, parser crash): this page fails, the next one gets a fresh pool
+            self._record(pool_restarts=1)
+            self._restart(executor)
+            raise
+        finally:
+            self.slots.release()
+        self._record(parsed=1, bytes=len(body), parse_ms=int((time.monotonic() - started) * 1000))
+        return page, links
+
+    def _restart(self, broken):
+        with self.lock:
+            if self.executor is not broken:
+                return  # another worker already replaced it
+            broken.shutdown(wait=False)
+            self.executor = self._start()
+
+    def snapshot(self):
+        with self.lock:
+            stats = dict(self.stats)
+        stats["processes"] = self.processes
+        stats["max_pending"] = self.max_pending
+        return stats
+
+class InlineParser:
+    """PARSE_PROCESSES=0: parse in the calling fetch worker."""
+
+    def parse(self, url, body, encoding):
+        return parse_body(url, body, encoding)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def init_parse_pool(processes=PARSE_PROCESSES, max_pending=PARSE_QUEUE_SIZE):
+    """Start the node's parse tier; call at start-up, before the worker threads exist."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            if processes > 0:
+                _pool = ParsePool(processes, max_pending)
+                metrics.register("parse", _pool.snapshot)
+            else:
+                _pool = InlineParser()
+        return _pool
+
+def get_parse_pool():
+    return _pool or init_parse_pool()
@@ -0,0 +1,160 @@
+import math
+import re
+from bisect import bisect_left
+from collections import defaultdict
+
+# Tokenizer shared by auto_index_monitor (documents) and /api/search (queries)
+TERM_RE = re.compile(r'\b[a-zA-Z]{3,}\b')
+MAX_TERM_LENGTH = 255  # terms.term is VARCHAR(255)
+
+# BM25 parameters
+K1 = 1.2
+B = 0.75
+
+# === Tokenizing ===
+def tokenize(text):
+    return [term for term in TERM_RE.findall((text or "").lower()) if len(term) <= MAX_TERM_LENGTH]
+
+def term_positions(text):
+    """({term: [positions]}, length) of a document; positions count every term, in order."""
+    positions = defaultdict(list)
+    terms = tokenize(text)
+    for position, term in enumerate(terms):
+        positions[term].append(position)
+    return positions, len(terms)
+
+# === Positions (delta + varint, stored in postings.positions) ===
+def encode_positions(positions):
+    out, last = bytearray(), 0
+    for position in positions:
+        delta, last = position - last, position
+        while delta >= 0x80:
+            out.append(delta & 0x7F | 0x80)
+            delta >>= 7
+        out.append(delta)
+    return bytes(out)
+
+def decode_positions(data):
+    positions, value, shift, last = [], 0, 0, 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            last += value
+            positions.append(last)
+            value = shift = 0
+    return positions
+
+# === Query Side ===
+def parse_query(query, stop_words=()):
+    """(terms, phrase): a query in double quotes is a phrase and keeps its stop words and order."""
+    phrase = len(query) > 1 and query[0] == query[-1] == '"'
+    terms = tokenize(query)
+    if not phrase:
+        terms = [term for term in dict.fromkeys(terms) if term not in stop_words]
+    return terms, phrase
+
+def idf(docs, doc_freq):
+    return math.log(1 + (docs - doc_freq + 0.5) / (doc_freq + 0.5))
+
+def bm25(weight, tf, length, avg_length):
+    return weight * tf * (K1 + 1) / (tf + K1 * (1 - B + B * length / avg_length))
+
+def has_phrase(positions):
+    """True if some position of the first term is followed by each next term in turn.
+    positions: one set of positions per query term, in query order."""
+    return any(all(start + offset in later for offset, later in enumerate(positions[1:], 1))
+               for start in positions[0])
+
+def intersect(lists):
+    """Doc IDs present in every sorted list; walks the shortest list and skips ahead in the others."""
+    if not lists:
+        return []
+    lists = sorted(lists, key=len)
+    result = lists[0]
+    for other in lists[1:]:
+        matched, lo = [], 0
+        for doc_id in result:
+            lo = bisect_left(other, doc_id, lo)
+            if lo == len(other):
+                break
+            if other[lo] == doc_id:
+                matched.append(doc_id)
+        result = matched
+        if not result:
+            break
+    return result
+
+def _placeholders(values):
+    return ", ".join(["%s"] * len(values))
+
+def phrase_matches(cursor, term_ids, doc_ids):
+    """The doc IDs in which the terms occur next to each other, in order."""
+    matches = []
+    unique = list(dict.fromkeys(term_ids))
+    for i in range(0, len(doc_ids), 1000):
+        chunk = doc_ids[i:i + 1000]
+        cursor.execute(f"""
+            SELECT term_id, doc_id, positions FROM postings
+            WHERE term_id IN ({_placeholders(unique)}) AND doc_id IN ({_placeholders(chunk)})
+        """, unique + chunk)
+        positions = defaultdict(dict)
+        for term_id, doc_id, data in cursor.fetchall():
+            positions[doc_id][term_id] = set(decode_positions(data))
+        for doc_id in chunk:
+            by_term = positions[doc_id]
+            if has_phrase([by_term.get(term_id, ()) for term_id in term_ids]):
+                matches.append(doc_id)
+    return matches
+
+def search(cursor, query, stop_words=(), limit=20):
+    """URLs of the best BM25 matches for `query`, read from the postings tables.
+
+    Pages containing every term rank ahead of pages containing some of them. A query in
+    double quotes is a phrase: only pages with the terms next to each other match.
+    """
+    terms, phrase = parse_query(query, stop_words)
+    if not terms:
+        return []
+
+    cursor.execute("SELECT docs, total_length FROM index_stats WHERE id = 1")
+    stats = cursor.fetchone()
+    if not stats or not stats[0]:
+        return []
+    docs, total_length = stats
+    avg_length = total_length / docs or 1.0
+
+    unique = list(dict.fromkeys(terms))
+    cursor.execute(f"SELECT term, term_id, doc_freq FROM terms WHERE term IN ({_placeholders(unique)})", unique)
+    found = {term: (term_id, doc_freq) for term, term_id, doc_freq in cursor.fetchall()}
+    if not found or (phrase and len(found) < len(unique)):
+        return []
+    weights = {term_id: idf(docs, doc_freq) for term_id, doc_freq in found.values()}
+
+    # Clustered on (term_id, doc_id): each term's postings come back sorted by doc ID
+    term_ids = list(weights)
+    cursor.execute(f"""
+        SELECT p.term_id, p.doc_id, p.tf, d.length FROM postings p
+        JOIN index_docs d ON d.doc_id = p.doc_id
+        WHERE p.term_id IN ({_placeholders(term_ids)})
+        ORDER BY p.term_id, p.doc_id
+    """, term_ids)
+    postings, scores = defaultdict(list), defaultdict(float)
+    for term_id, doc_id, tf, length in cursor.fetchall():
+        postings[term_id].append(doc_id)
+        scores[doc_id] += bm25(weights[term_id], tf, length, avg_length)
+
+    everywhere = intersect([postings[term_id] for term_id in term_ids])
+    if phrase:
+        ranked = sorted(phrase_matches(cursor, [found[term][0] for term in terms], everywhere),
+                        key=lambda doc_id: -scores[doc_id])
+    else:
+        everywhere = set(everywhere)
+        ranked = sorted(scores, key=lambda doc_id: (doc_id not in everywhere, -scores[doc_id]))
+    top = ranked[:limit]
+    if not top:
+        return []
+    cursor.execute(f"SELECT doc_id, url FROM index_docs WHERE doc_id IN ({_placeholders(top)})", top)
+    urls = dict(cursor.fetchall())
+    return [urls[doc_id] for doc_id in top if doc_id in urls]
@@ -0,0 +1,110 @@
+import threading
+from collections import OrderedDict
+
+from common import metrics
+from common.config import PRIORITY_LANES, PRIORITY_LANE_QUEUES, OPIC_LEDGER_SIZE
+
+JOB_PRIORITY_SHIFT = {"high": -1, "normal": 0, "low": 1}
+SEED_CASH = 1.0
+
+# === Lanes ===
+def task_lane(task):
+    shift = JOB_PRIORITY_SHIFT.get(task.get("priority"), 0)
+    return max(0, min(PRIORITY_LANES - 1, task["depth"] + shift))
+
+def lane_queue_urls(crawler_queue_url):
+    return PRIORITY_LANE_QUEUES or [crawler_queue_url]
+
+def queue_for_task(crawler_queue_url, task):
+    urls = lane_queue_urls(crawler_queue_url)
+    return urls[min(task_lane(task), len(urls) - 1)]
+
+class LaneScheduler:
+    """Stride scheduling over lanes: lane i is served in proportion to 2^(lanes-1-i).
+
+    `order()` lists lanes most-due first; callers try them in that order and `charge()`
+    the lane they served, so an empty lane never blocks the others (work-conserving).
+    """
+
+    def __init__(self, lanes=PRIORITY_LANES):
+        self.strides = [1.0 / (2 ** (lanes - 1 - lane)) for lane in range(lanes)]
+        self.passes = [0.0] * lanes
+        self.virtual = 0.0
+        self.served = [0] * lanes
+        self.lock = threading.Lock()
+
+    def order(self):
+        with self.lock:
+            return sorted(range(len(self.passes)), key=lambda lane: (max(self.passes[lane], self.virtual), lane))
+
+    def charge(self, lane):
+        with self.lock:
+            # A lane that sat idle restarts at the current virtual time instead of its old pass
+            start = max(self.passes[lane], self.virtual)
+            self.virtual = start
+            self.passes[lane] = start + self.strides[lane]
+            self.served[lane] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return list(self.served)
+
+# === OPIC ===
+class OpicLedger:
+    """Online Page Importance Computation, node-local part.
+
+    A crawled page splits its cash evenly over its out-links. The share rides along in the
+    child's task message; shares for links that were already queued (and so deduped away)
+    accumulate here and are added when that URL reaches this node's frontier.
+    """
+
+    def __init__(self, max_urls=OPIC_LEDGER_SIZE):
+        self.max_urls = max_urls
+        self.lock = threading.Lock()
+        self.cash = OrderedDict()  # url -> cash received from in-links seen on this node
+
+    def distribute(self, cash, links):
+        """{link: share} for a crawled page's out-links; every share is recorded."""
+        if not links:
+            return {}
+        share = cash / len(links)
+        with self.lock:
+            for link in links:
+                self.cash[link] = self.cash.get(link, 0.0) + share
+                self.cash.move_to_end(link)
+            while len(self.cash) > self.max_urls:
+                self.cash.popitem(last=False)
+        return {link: share for link in links}
+
+    def score(self, url, carried):
+        with self.lock:
+            return max(carried, self.cash.get(url, 0.0))
+
+    def settle(self, url, carried):
+        # Cash a page holds when it is crawled; it is then passed on, so the entry goes
+        with self.lock:
+            return max(carried, self.cash.pop(url, 0.0))
+
+    def snapshot(self):
+        with self.lock:
+            return {"tracked_urls": len(self.cash)}
+
+_opic = None
+_receive_lanes = None
+_priority_lock = threading.Lock()
+
+def get_opic():
+    global _opic
+    with _priority_lock:
+        if _opic is None:
+            _opic = OpicLedger()
+            metrics.register("opic", _opic.snapshot)
+        return _opic
+
+def get_receive_lanes():
+    # Which lane queue the feeder polls next (only matters with PRIORITY_LANE_QUEUES)
+    global _receive_lanes
+    with _priority_lock:
+        if _receive_lanes is None:
+            _receive_lanes = LaneScheduler(len(PRIORITY_LANE_QUEUES) or 1)
+        return _receive_lanes
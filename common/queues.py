@@ -0,0 +1,255 @@
+import sqlite3
+import threading
+import time
+import uuid
+from collections import Counter, deque
+
+from common.config import QUEUE_BACKEND, QUEUE_SQLITE_PATH, QUEUE_VISIBILITY_TIMEOUT, SQS_REGION
+from common.sqs_batch import MAX_BATCH
+
+# Every backend speaks the subset of the boto3 SQS client API the nodes use (receive_message,
+# send_message[_batch], delete_message[_batch], change_message_visibility_batch), so
+# BatchingSQS, the master and the indexers work unchanged on any of them. Queue URLs are plain
+# keys for the local backends.
+
+class InMemorySQS:
+    """In-process queues behind the boto3 SQS client interface (only the calls the nodes use).
+
+    `latency` is slept on every API call so batching gains can be measured offline.
+    """
+
+    def __init__(self, latency=0.0, visibility_timeout=30):
+        self.latency = latency
+        self.visibility_timeout = visibility_timeout
+        self.lock = threading.Condition()
+        self.queues = {}     # queue_url -> deque[(message_id, body)]
+        self.in_flight = {}  # receipt_handle -> (queue_url, message_id, body, visible_at)
+        self.calls = Counter()
+
+    def _api(self, name):
+        # Called from several shipper threads at once; Counter increments are not atomic
+        with self.lock:
+            self.calls[name] += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+    def _requeue_expired(self):
+        now = time.time()
+        for handle, (queue_url, message_id, body, visible_at) in list(self.in_flight.items()):
+            if visible_at <= now:
+                del self.in_flight[handle]
+                self.queues.setdefault(queue_url, deque()).append((message_id, body))
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        self._api("send_message")
+        message_id = str(uuid.uuid4())
+        with self.lock:
+            self.queues.setdefault(QueueUrl, deque()).append((message_id, MessageBody))
+            self.lock.notify_all()
+        return {"MessageId": message_id}
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self._api("send_message_batch")
+        successful = []
+        with self.lock:
+            queue = self.queues.setdefault(QueueUrl, deque())
+            for entry in Entries[:MAX_BATCH]:
+                message_id = str(uuid.uuid4())
+                queue.append((message_id, entry["MessageBody"]))
+                successful.append({"Id": entry["Id"], "MessageId": message_id})
+            self.lock.notify_all()
+        return {"Successful": successful, "Failed": []}
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, WaitTimeSeconds=0, **kwargs):
+        self._api("receive_message")
+        deadline = time.time() + WaitTimeSeconds
+        with self.lock:
+            while True:
+                self._requeue_expired()
+                queue = self.queues.setdefault(QueueUrl, deque())
+                if queue or time.time() >= deadline:
+                    break
+                self.lock.wait(timeout=min(0.1, max(0.0, deadline - time.time())))
+
+            messages = []
+            visible_at = time.time() + kwargs.get("VisibilityTimeout", self.visibility_timeout)
+            while queue and len(messages) < min(MaxNumberOfMessages, MAX_BATCH):
+                message_id, body = queue.popleft()
+                handle = str(uuid.uuid4())
+                self.in_flight[handle] = (QueueUrl, message_id, body, visible_at)
+                messages.append({"MessageId": message_id, "ReceiptHandle": handle, "Body": body})
+
+        return {"Messages": messages} if messages else {}
+
+    def delete_message(self, QueueUrl, ReceiptHandle):
+        self._api("delete_message")
+        with self.lock:
+            self.in_flight.pop(ReceiptHandle, None)
+        return {}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        self._api("delete_message_batch")
+        with self.lock:
+            for entry in Entries:
+                self.in_flight.pop(entry["ReceiptHandle"], None)
+        return {"Successful": [{"Id": e["Id"]} for e in Entries], "Failed": []}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        self._api("change_message_visibility_batch")
+        with self.lock:
+            for entry in Entries:
+                record = self.in_flight.get(entry["ReceiptHandle"])
+                if record is not None:
+                    self.in_flight[entry["ReceiptHandle"]] = record[:3] + (time.time() + entry["VisibilityTimeout"],)
+            self.lock.notify_all()
+        return {"Successful": [{"Id": e["Id"]} for e in Entries], "Failed": []}
+
+    def depth(self, queue_url):
+        with self.lock:
+            return len(self.queues.get(queue_url, ()))
+
+class SQLiteSQS:
+    """Durable queues in one SQLite file, for running the whole pipeline on a single box.
+
+    Any number of local processes can share the file. A received message stays in the table
+    with a fresh receipt handle and a `visible_at` in the future; it is redelivered once that
+    passes, so a crashed worker loses nothing. Deleting with a stale handle is a no-op.
+    """
+
+    def __init__(self, path=QUEUE_SQLITE_PATH, visibility_timeout=QUEUE_VISIBILITY_TIMEOUT, poll_interval=0.05):
+        self.visibility_timeout = visibility_timeout
+        self.poll_interval = poll_interval
+        self.lock = threading.Condition()
+        # Autocommit mode so receives can take the write lock up front with BEGIN IMMEDIATE
+        self.db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS messages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                queue TEXT NOT NULL,
+                body TEXT NOT NULL,
+                visible_at REAL NOT NULL,
+                receipt TEXT,
+                receives INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        self.db.execute("CREATE INDEX IF NOT EXISTS messages_ready ON messages (queue, visible_at, id)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS messages_receipt ON messages (receipt)")
+        self.calls = Counter()
+
+    def _write(self, statement, rows):
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                cursor = self.db.executemany(statement, rows)
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+            self.lock.notify_all()
+        return cursor.rowcount
+
+    def _count(self, name):
+        with self.lock:
+            self.calls[name] += 1
+
+    def send_message(self, QueueUrl, MessageBody, **kwargs):
+        self._count("send_message")
+        self._write("INSERT INTO messages (queue, body, visible_at) VALUES (?, ?, ?)",
+                    [(QueueUrl, MessageBody, time.time())])
+        return {"MessageId": str(uuid.uuid4())}
+
+    def send_message_batch(self, QueueUrl, Entries):
+        self._count("send_message_batch")
+        now = time.time()
+        self._write("INSERT INTO messages (queue, body, visible_at) VALUES (?, ?, ?)",
+                    [(QueueUrl, entry["MessageBody"], now) for entry in Entries[:MAX_BATCH]])
+        return {"Successful": [{"Id": e["Id"], "MessageId": str(uuid.uuid4())} for e in Entries[:MAX_BATCH]],
+                "Failed": []}
+
+    def _claim(self, queue_url, limit, visibility_timeout):
+        now = time.time()
+        with self.lock:
+            self.db.execute("BEGIN IMMEDIATE")
+            try:
+                rows = self.db.execute(
+                    "SELECT id, body FROM messages WHERE queue = ? AND visible_at <= ? ORDER BY id LIMIT ?",
+                    (queue_url, now, limit)
+                ).fetchall()
+                messages = []
+                for message_id, body in rows:
+                    handle = str(uuid.uuid4())
+                    self.db.execute(
+                        "UPDATE messages SET receipt = ?, visible_at = ?, receives = receives + 1 WHERE id = ?",
+                        (handle, now + visibility_timeout, message_id)
+                    )
+                    messages.append({"MessageId": str(message_id), "ReceiptHandle": handle, "Body": body})
+                self.db.execute("COMMIT")
+            except Exception:
+                self.db.execute("ROLLBACK")
+                raise
+        return messages
+
+    def receive_message(self, QueueUrl, MaxNumberOfMessages=1, WaitTimeSeconds=0, **kwargs):
+        self._count("receive_message")
+        deadline = time.time() + WaitTimeSeconds
+        limit = min(MaxNumberOfMessages, MAX_BATCH)
+        visibility_timeout = kwargs.get("VisibilityTimeout", self.visibility_timeout)
+        while True:
+            messages = self._claim(QueueUrl, limit, visibility_timeout)
+            if messages or time.time() >= deadline:
+                return {"Messages": messages} if messages else {}
+            # Local sends wake us at once; other processes' sends are picked up by polling
+            with self.lock:
+                self.lock.wait(timeout=min(self.poll_interval, max(0.0, deadline - time.time())))
+
+    def delete_message(self, QueueUrl, ReceiptHandle):
+        self._count("delete_message")
+        self._write("DELETE FROM messages WHERE receipt = ?", [(ReceiptHandle,)])
+        return {}
+
+    def delete_message_batch(self, QueueUrl, Entries):
+        self._count("delete_message_batch")
+        self._write("DELETE FROM messages WHERE receipt = ?", [(e["ReceiptHandle"],) for e in Entries])
+        return {"Successful": [{"Id": e["Id"]} for e in Entries], "Failed": []}
+
+    def change_message_visibility_batch(self, QueueUrl, Entries):
+        self._count("change_message_visibility_batch")
+        now = time.time()
+        self._write("UPDATE messages SET visible_at = ? WHERE receipt = ?",
+                    [(now + e["VisibilityTimeout"], e["ReceiptHandle"]) for e in Entries])
+        return {"Successful": [{"Id": e["Id"]} for e in Entries], "Failed": []}
+
+    def depth(self, queue_url):
+        with self.lock:
+            return self.db.execute(
+                "SELECT COUNT(*) FROM messages WHERE queue = ? AND visible_at <= ?", (queue_url, time.time())
+            ).fetchone()[0]
+
+def approximate_depth(client, queue_url):
+    """Messages waiting in a queue (SQS: ApproximateNumberOfMessages, not counting in-flight ones)."""
+    if hasattr(client, "depth"):
+        return client.depth(queue_url)
+    reply = client.get_queue_attributes(QueueUrl=queue_url, AttributeNames=["ApproximateNumberOfMessages"])
+    return int(reply["Attributes"]["ApproximateNumberOfMessages"])
+
+_client = None
+_client_lock = threading.Lock()
+
+def get_queue_client(backend=None):
+    """The node's queue client for QUEUE_BACKEND; one shared instance per process."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            backend = backend or QUEUE_BACKEND
+            if backend == "memory":
+                _client = InMemorySQS(visibility_timeout=QUEUE_VISIBILITY_TIMEOUT)
+            elif backend == "sqlite":
+                _client = SQLiteSQS()
+            elif backend == "sqs":
+                import boto3
+                _client = boto3.client('sqs', region_name=SQS_REGION)
+            else:
+                raise ValueError(f"Unknown QUEUE_BACKEND: {backend}")
+        return _client
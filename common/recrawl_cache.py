@@ -0,0 +1,109 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from collections import Counter
+
+from common import metrics
+from common.config import RECRAWL_CACHE_PATH, RECRAWL_ENABLED
+
+def content_hasher():
+    # Incremental form of content_hash() for streamed bodies
+    return hashlib.sha1()
+
+def content_hash(body):
+    hasher = content_hasher()
+    hasher.update(body)
+    return hasher.hexdigest()
+
+def conditional_headers(validators):
+    headers = {}
+    if validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+    return headers
+
+class RecrawlCache:
+    """Per-URL validators (ETag, Last-Modified, body hash) plus the page's outlinks,
+    kept in a node-local SQLite file so recrawls can be conditional GETs."""
+
+    def __init__(self, path=RECRAWL_CACHE_PATH):
+        self.lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS validators (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                links TEXT,
+                fetched_at REAL
+            )
+        """)
+        self.db.commit()
+        self.stats = Counter()
+
+    def lookup(self, url):
+        with self.lock:
+            row = self.db.execute(
+                "SELECT etag, last_modified, content_hash, links FROM validators WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, digest, links = row
+        return {"etag": etag, "last_modified": last_modified, "content_hash": digest,
+                "links": json.loads(links) if links else []}
+
+    def store(self, url, etag, last_modified, digest, links):
+        with self.lock:
+            self.db.execute(
+                "INSERT OR REPLACE INTO validators (url, etag, last_modified, content_hash, links, fetched_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, etag, last_modified, digest, json.dumps(links), time.time())
+            )
+            self.db.commit()
+
+    def touch(self, url):
+        with self.lock:
+            self.db.execute("UPDATE validators SET fetched_at = ? WHERE url = ?", (time.time(), url))
+            self.db.commit()
+
+    def record(self, outcome):
+        with self.lock:
+            self.stats[outcome] += 1
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats)
+
+class NullRecrawlCache:
+    def lookup(self, url):
+        return None
+
+    def store(self, url, etag, last_modified, digest, links):
+        pass
+
+    def touch(self, url):
+        pass
+
+    def record(self, outcome):
+        pass
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_recrawl_cache():
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            if RECRAWL_ENABLED:
+                _cache = RecrawlCache()
+                metrics.register("recrawl", _cache.snapshot)
+            else:
+                _cache = NullRecrawlCache()
+        return _cache
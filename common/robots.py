@@ -0,0 +1,228 @@
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlsplit
+
+from common import metrics
+from common.config import (
+    ROBOTS_AGENT, ROBOTS_TTL, ROBOTS_NEGATIVE_TTL, ROBOTS_CACHE_SIZE, ROBOTS_CACHE_PATH,
+    ROBOTS_MAX_CRAWL_DELAY, FETCH_TIMEOUT
+)
+from common.http_client import get_http_client
+
+MAX_ROBOTS_BYTES = 500 * 1024  # RFC 9309 lets crawlers ignore anything past 500 KiB
+
+# === Parsing ===
+def _compile(pattern):
+    anchored = pattern.endswith("$")
+    if anchored:
+        pattern = pattern[:-1]
+    regex = ".*".join(re.escape(part) for part in pattern.split("*"))
+    return re.compile(regex + ("$" if anchored else ""))
+
+class RobotsRules:
+    """Compiled rules of the group that applies to us; longest matching pattern wins, Allow on ties."""
+
+    def __init__(self, rules=(), crawl_delay=None, allow_all=False, disallow_all=False):
+        # (pattern length, allow, compiled) sorted so the first match is the decisive one
+        self.rules = sorted(
+            ((len(pattern), allow, _compile(pattern)) for allow, pattern in rules),
+            key=lambda r: (-r[0], not r[1])
+        )
+        self.crawl_delay = crawl_delay
+        self.allow_all = allow_all
+        self.disallow_all = disallow_all
+
+    def allowed(self, path):
+        if self.allow_all or path == "/robots.txt":
+            return True
+        if self.disallow_all:
+            return False
+        for _, allow, regex in self.rules:
+            if regex.match(path):
+                return allow
+        return True
+
+def parse_robots(text, agent=ROBOTS_AGENT):
+    agent = agent.lower()
+    groups = []          # [(agents, rules, crawl_delay)]
+    agents, rules, delay = [], [], None
+    in_rules = False
+
+    for line in text.splitlines():
+        line = line.split("#", 1)[0].strip()
+        if ":" not in line:
+            continue
+        key, value = (part.strip() for part in line.split(":", 1))
+        key = key.lower()
+
+        if key == "user-agent":
+            if in_rules:
+                groups.append((agents, rules, delay))
+                agents, rules, delay = [], [], None
+                in_rules = False
+            agents.append(value.lower())
+        elif key in ("allow", "disallow"):
+            in_rules = True
+            if value:
+                rules.append((key == "allow", value))
+        elif key == "crawl-delay":
+            in_rules = True
+            try:
+                delay = float(value)
+            except ValueError:
+                pass
+    if agents:
+        groups.append((agents, rules, delay))
+
+    # Groups naming our product token win over "*"; several matching groups are merged
+    best = [(r, d) for a, r, d in groups if agent in a]
+    if not best:
+        best = [(r, d) for a, r, d in groups if "*" in a]
+
+    merged = [rule for group_rules, _ in best for rule in group_rules]
+    delays = [d for _, d in best if d is not None]
+    crawl_delay = min(max(delays), ROBOTS_MAX_CRAWL_DELAY) if delays else None
+    return RobotsRules(merged, crawl_delay)
+
+# === Cache ===
+class RobotsCache:
+    """Per-origin robots.txt rules shared by all workers of a node.
+
+    One fetch per origin (concurrent callers wait for it), LRU-bounded, positive entries
+    live `ttl` seconds and failed fetches `negative_ttl`. With `persist_path` set the raw
+    robots bodies survive restarts.
+    """
+
+    def __init__(self, ttl=ROBOTS_TTL, negative_ttl=ROBOTS_NEGATIVE_TTL, max_entries=ROBOTS_CACHE_SIZE,
+                 persist_path=ROBOTS_CACHE_PATH or None, fetch=None):
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.persist_path = persist_path
+        self.fetch = fetch or self._fetch
+
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()  # origin -> (expires_at, RobotsRules, raw record)
+        self.pending = {}             # origin -> threading.Event while a fetch is in flight
+        self.stats = {"hits": 0, "fetches": 0, "errors": 0}
+        self.dirty = 0
+        self.last_save = time.time()
+
+        if self.persist_path:
+            self._load()
+
+    def _fetch(self, origin):
+        r = get_http_client().get(f"{origin}/robots.txt", headers={'User-Agent': f'Mozilla/5.0 ({ROBOTS_AGENT})'},
+                         timeout=FETCH_TIMEOUT, stream=True)
+        body = r.raw.read(MAX_ROBOTS_BYTES, decode_content=True) if r.status_code == 200 else b""
+        r.close()
+        return r.status_code, body.decode(r.encoding or "utf-8", errors="replace")
+
+    def _resolve(self, status, text):
+        # RFC 9309: 4xx means no restrictions; 5xx / unreachable means assume full disallow
+        if status == 200:
+            return parse_robots(text), self.ttl
+        if status is not None and 400 <= status < 500:
+            return RobotsRules(allow_all=True), self.ttl
+        return RobotsRules(disallow_all=True), self.negative_ttl
+
+    def rules_for(self, origin):
+        while True:
+            with self.lock:
+                entry = self.entries.get(origin)
+                if entry is not None and entry[0] > time.time():
+                    self.entries.move_to_end(origin)
+                    self.stats["hits"] += 1
+                    return entry[1]
+                waiter = self.pending.get(origin)
+                if waiter is None:
+                    waiter = self.pending[origin] = threading.Event()
+                    break
+            waiter.wait(timeout=FETCH_TIMEOUT * 2)
+
+        try:
+            try:
+                status, text = self.fetch(origin)
+            except Exception as e:
+                print(f"[ROBOTS] Fetch failed for {origin}: {e}")
+                status, text = None, ""
+            rules, ttl = self._resolve(status, text)
+            with self.lock:
+                self.stats["fetches"] += 1
+                if status is None or status >= 500:
+                    self.stats["errors"] += 1
+                self.entries[origin] = (time.time() + ttl, rules, {"status": status, "text": text})
+                self.entries.move_to_end(origin)
+                while len(self.entries) > self.max_entries:
+                    self.entries.popitem(last=False)
+                self.dirty += 1
+            self._maybe_save()
+            return rules
+        finally:
+            with self.lock:
+                self.pending.pop(origin).set()
+
+    def check(self, url):
+        """(allowed, crawl_delay) for a URL; a dict lookup once the origin is cached."""
+        parts = urlsplit(url)
+        rules = self.rules_for(f"{parts.scheme}://{parts.netloc}")
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        return rules.allowed(path), rules.crawl_delay
+
+    def snapshot(self):
+        with self.lock:
+            return dict(self.stats, origins=len(self.entries))
+
+    # === Persistence ===
+    def _load(self):
+        try:
+            with open(self.persist_path) as f:
+                saved = json.load(f)
+        except (OSError, ValueError):
+            return
+        now = time.time()
+        for origin, record in saved.items():
+            if record["expires_at"] > now:
+                rules, _ = self._resolve(record["status"], record["text"])
+                self.entries[origin] = (record["expires_at"], rules, record)
+        print(f"[ROBOTS] Loaded {len(self.entries)} cached origins from {self.persist_path}")
+
+    def _maybe_save(self, every=50, interval=60):
+        if not self.persist_path:
+            return
+        with self.lock:
+            if not self.dirty or (self.dirty < every and time.time() - self.last_save < interval):
+                return
+            snapshot = {origin: dict(raw, expires_at=expires_at)
+                        for origin, (expires_at, _, raw) in self.entries.items()}
+            self.dirty = 0
+            self.last_save = time.time()
+        self.save(snapshot)
+
+    def save(self, snapshot=None):
+        if snapshot is None:
+            with self.lock:
+                snapshot = {origin: dict(raw, expires_at=expires_at)
+                            for origin, (expires_at, _, raw) in self.entries.items()}
+        tmp = f"{self.persist_path}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                json.dump(snapshot, f)
+            os.replace(tmp, self.persist_path)
+        except OSError as e:
+            print(f"[ROBOTS] Could not persist cache: {e}")
+
+_robots = None
+_robots_lock = threading.Lock()
+
+def get_robots_cache():
+    global _robots
+    with _robots_lock:
+        if _robots is None:
+            _robots = RobotsCache()
+            metrics.register("robots", _robots.snapshot)
+        return _robots
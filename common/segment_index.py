@@ -0,0 +1,475 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta
+from heapq import merge, nlargest
+
+from common import metrics
+from common.config import (
+    KEYWORD_SWEEP_INTERVAL, SEGMENT_DIR, SEGMENT_FLUSH_DOCS, SEGMENT_MERGE_FACTOR, SEGMENT_MIN_MERGE_DOCS,
+    SEGMENT_SYNC_INTERVAL, SEGMENT_SYNC_OVERLAP
+)
+from common.postings import B, K1, bm25, decode_positions, has_phrase, idf, parse_query
+from common.segments import Segment, SegmentWriter, merge_segments
+
+MANIFEST = "MANIFEST"
+EPOCH = datetime(1970, 1, 1)
+NO_SUCH_TABLE = 1146  # auto_index_monitor has not created the postings tables yet
+
+def version_of(updated_at):
+    return (updated_at - EPOCH) // timedelta(milliseconds=1)
+
+class SegmentIndex:
+    """Inverted index made of immutable segment files, searched in place through mmap.
+
+    The manifest lists the live segments, oldest first, and the sync high-water mark. It is
+    replaced atomically, so a crash leaves either the old or the new set of segments. A
+    newer segment masks the older copies of the docs it holds or deletes (tombstones), so
+    updates and deletes are appends. A background thread merges runs of adjacent segments
+    of the same size tier, dropping masked docs and bounding how many segments a query visits.
+    """
+
+    def __init__(self, directory=SEGMENT_DIR, merge_factor=SEGMENT_MERGE_FACTOR,
+                 min_merge_docs=SEGMENT_MIN_MERGE_DOCS):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.merge_factor = max(2, merge_factor)
+        self.min_merge_docs = max(1, min_merge_docs)
+        self.lock = threading.Lock()        # segment list and manifest
+        self.merge_lock = threading.Lock()  # one merge at a time
+        self.merge_wanted = threading.Event()
+        self.stats = Counter()
+        self.ready = False  # set by SegmentSync once caught up; until then search goes to MySQL
+
+        manifest = self._read_manifest()
+        self.generation = manifest["generation"]
+        self.watermark = manifest["watermark"]
+        self.segments = tuple(Segment(self._path(name)) for name in manifest["segments"])
+        self._remove_orphans()
+        newer = set()
+        for i in range(len(self.segments) - 1, -1, -1):
+            segment = self.segments[i]
+            self._mask(segment, newer)
+            if i:
+                newer.update(segment.doc_ids)
+                newer.update(segment.tombstones)
+
+    def _record(self, **counts):
+        with self.lock:
+            self.stats.update(counts)
+
+    # === Manifest ===
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _read_manifest(self):
+        try:
+            with open(self._path(MANIFEST)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {"generation": 0, "watermark": None, "segments": []}
+
+    def _write_manifest(self):
+        manifest = {"generation": self.generation, "watermark": self.watermark,
+                    "segments": [segment.name for segment in self.segments]}
+        temporary = self._path(MANIFEST + ".tmp")
+        with open(temporary, "w") as f:
+            json.dump(manifest, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self._path(MANIFEST))
+
+    def _remove_orphans(self):
+        # Segments written or merged away around a crash, half-written files
+        live = {segment.name for segment in self.segments}
+        for name in os.listdir(self.directory):
+            if name.startswith("seg-") and name not in live or name == MANIFEST + ".tmp":
+                os.remove(self._path(name))
+
+    def _new_name(self):
+        self.generation += 1
+        return f"seg-{self.generation:08d}.seg"
+
+    def _mask(self, segment, doc_ids):
+        for doc_id in doc_ids:
+            ordinal = segment.ordinal(doc_id)
+            if ordinal >= 0 and ordinal not in segment.dead:
+                segment.dead.add(ordinal)
+                segment.dead_length += segment.lengths[ordinal]
+
+    # === Writing ===
+    def flush(self, docs, deleted=(), watermark=None):
+        """Append one segment holding `docs` ({doc_id: (url, length, version, {term: positions})})
+        and tombstones for the `deleted` doc IDs; then move the high-water mark to `watermark`."""
+        deleted = set(deleted) - set(docs)
+        if not docs and not deleted:
+            if watermark is not None and watermark != self.watermark:
+                with self.lock:
+                    self.watermark = watermark
+                    self._write_manifest()
+            return None
+
+        with self.lock:
+            name = self._new_name()
+        writer = SegmentWriter(self._path(name))
+        postings = defaultdict(list)
+        for doc_id in sorted(docs):
+            url, length, version, positions = docs[doc_id]
+            ordinal = writer.add_doc(doc_id, url, length, version)
+            for term, offsets in positions.items():
+                postings[term].append((ordinal, offsets))
+        for term in sorted(postings):
+            writer.add_term(term, postings[term])
+        segment = Segment(writer.finish(deleted))
+
+        with self.lock:
+            masked = list(docs) + list(deleted)
+            for older in self.segments:
+                self._mask(older, masked)
+            self.segments += (segment,)
+            if watermark is not None:
+                self.watermark = watermark
+            self._write_manifest()
+            self.stats.update(flushes=1, flushed_docs=len(docs), flushed_deletes=len(deleted))
+        self.merge_wanted.set()
+        return segment
+
+    def version(self, doc_id):
+        """Version of the live copy of a doc, or None if it is not indexed."""
+        for segment in reversed(self.segments):
+            ordinal = segment.ordinal(doc_id)
+            if ordinal >= 0:
+                return segment.versions[ordinal]
+            if segment.deletes(doc_id):
+                return None
+        return None
+
+    def live_docs(self):
+        return sum(segment.live_docs for segment in self.segments)
+
+    def live_doc_ids(self):
+        """Every live doc ID, in order."""
+        return merge(*[segment.live_doc_ids() for segment in self.segments])
+
+    # === Merging ===
+    def _tier(self, segment):
+        return int(math.log(max(segment.live_docs, self.min_merge_docs) / self.min_merge_docs, self.merge_factor))
+
+    def _pick_merge(self):
+        # Only adjacent segments are merged, so "newer masks older" still holds afterwards
+        run = []
+        for segment in self.segments:
+            if run and self._tier(run[-1]) != self._tier(segment):
+                run = []
+            run.append(segment)
+            if len(run) == self.merge_factor:
+                return run
+        # A segment that is mostly masked is rewritten on its own
+        for segment in self.segments:
+            if segment.doc_count >= self.min_merge_docs and len(segment.dead) > segment.doc_count // 2:
+                return [segment]
+        return None
+
+    def merge_once(self):
+        """Run one merge the policy asks for; False when there is none."""
+        with self.merge_lock:
+            with self.lock:
+                run = self._pick_merge()
+                if run is None:
+                    return False
+                keep_tombstones = run[0] is not self.segments[0]
+                name = self._new_name()
+            started = time.monotonic()
+            merged = Segment(merge_segments(run, self._path(name), keep_tombstones))
+
+            with self.lock:
+                start = self.segments.index(run[0])
+                newer = self.segments[start + len(run):]
+                for segment in newer:  # including segments flushed while this merge ran
+                    self._mask(merged, segment.doc_ids)
+                    self._mask(merged, segment.tombstones)
+                self.segments = self.segments[:start] + (merged,) + newer
+                self._write_manifest()
+                elapsed = time.monotonic() - started
+                self.stats.update(merges=1, merged_segments=len(run), merge_ms=int(elapsed * 1000))
+            # Queries still holding the old segments keep their mappings until they finish
+            for segment in run:
+                os.remove(segment.path)
+            print(f"[SEGMENTS] Merged {len(run)} segments into {merged.name} "
+                  f"({merged.doc_count} docs) in {elapsed:.2f}s")
+            return True
+
+    def merge_pending(self):
+        while self.merge_once():
+            pass
+
+    def start_merging(self):
+        threading.Thread(target=self._merge_loop, name="segment-merges", daemon=True).start()
+        return self
+
+    def _merge_loop(self):
+        while True:
+            self.merge_wanted.wait()
+            self.merge_wanted.clear()
+            try:
+                self.merge_pending()
+            except Exception as e:
+                print(f"[SEGMENTS] Merge failed: {e}")
+
+    # === Searching ===
+    def search(self, query, stop_words=(), limit=20):
+        """The ranking of postings.search, over the mapped segments.
+
+        Document frequencies are summed over segments and still count masked copies until
+        a merge drops them.
+        """
+        terms, phrase = parse_query(query, stop_words)
+        segments = self.segments
+        docs = sum(segment.live_docs for segment in segments)
+        if not terms or not docs:
+            return []
+        avg_length = sum(segment.live_length for segment in segments) / docs or 1.0
+
+        unique = list(dict.fromkeys(terms))
+        found = []
+        doc_freq = Counter()
+        for segment in segments:
+            indexes = {}
+            for term in unique:
+                index = segment.find(term)
+                if index >= 0:
+                    indexes[term] = index
+                    doc_freq[term] += segment.term_df[index]
+            found.append(indexes)
+        if not doc_freq or (phrase and len(doc_freq) < len(unique)):
+            return []
+        weights = {term: idf(docs, count) for term, count in doc_freq.items()}
+        self._record(queries=1)
+
+        if len(weights) == 1 and not (phrase and len(terms) > 1):
+            top = nlargest(limit, self._union(segments, found, weights, avg_length))
+        else:
+            # Pages with every term first: intersect each segment's postings, skipping whole blocks
+            matches = []
+            for s, (segment, indexes) in enumerate(zip(segments, found)):
+                if len(indexes) == len(weights):
+                    matches.extend(self._intersect(s, segment, indexes, weights, avg_length,
+                                                   terms if phrase else None))
+            if phrase or len(matches) >= limit:
+                top = nlargest(limit, matches)
+            else:
+                # Not enough of them: rank every page with any of the terms, all-term pages still first
+                top = nlargest(limit, self._union(segments, found, weights, avg_length))
+        return [segments[s].url(ordinal) for *_, s, ordinal in top]
+
+    def _intersect(self, s, segment, indexes, weights, avg_length, phrase_terms):
+        cursors = {term: segment.posting_list(index) for term, index in indexes.items()}
+        lists = sorted(cursors.items(), key=lambda item: item[1].df)
+        lead, rest = lists[0][1], [plist for _, plist in lists[1:]]
+        lengths, dead = segment.lengths, segment.dead
+        matches, target = [], 0
+        while True:
+            ordinal = lead.advance(target)
+            if ordinal is None:
+                return matches
+            for plist in rest:
+                found = plist.advance(ordinal)
+                if found is None:
+                    return matches
+                if found != ordinal:
+                    target = found
+                    break
+            else:
+                target = ordinal + 1
+                if ordinal in dead:
+                    continue
+                if phrase_terms and not has_phrase([set(cursors[term].positions()) for term in phrase_terms]):
+                    continue
+                length = lengths[ordinal]
+                score = sum(bm25(weights[term], plist.tf(), length, avg_length) for term, plist in lists)
+                matches.append((score, s, ordinal))
+
+    def _union(self, segments, found, weights, avg_length):
+        every = len(weights)
+        k, kb = K1 * (1 - B), K1 * B / avg_length
+        for s, (segment, indexes) in enumerate(zip(segments, found)):
+            lengths, dead = segment.lengths, segment.dead
+            scores, matched = defaultdict(float), Counter()
+            for term, index in indexes.items():
+                weight = weights[term] * (K1 + 1)
+                for ordinals, tfs in segment.posting_list(index).blocks():
+                    for ordinal, tf in zip(ordinals, tfs):
+                        if ordinal not in dead:
+                            scores[ordinal] += weight * tf / (tf + k + kb * lengths[ordinal])
+                            if every > 1:
+                                matched[ordinal] += 1
+            for ordinal, score in scores.items():
+                yield every == 1 or matched[ordinal] == every, score, s, ordinal
+
+    def snapshot(self):
+        segments = self.segments
+        with self.lock:
+            stats = dict(self.stats)
+        stats.update(
+            ready=self.ready,
+            watermark=self.watermark,
+            docs=sum(segment.live_docs for segment in segments),
+            bytes=sum(segment.bytes for segment in segments),
+            segments=[{"name": segment.name, "docs": segment.doc_count, "live": segment.live_docs,
+                       "tombstones": len(segment.tombstones), "terms": segment.term_count}
+                      for segment in segments],
+        )
+        return stats
+
+# === Sync from MySQL ===
+class SegmentSync:
+    """Keeps a SegmentIndex in step with the postings tables written by auto_index_monitor.
+
+    Like the monitor, it follows a high-water mark, here on index_docs.updated_at, kept in
+    the segment manifest. Each batch of changed docs is read together with its postings in
+    one snapshot and written as one segment. Docs whose version the segments already hold
+    are skipped, so re-reading the overlap window costs little. Deleted docs are found every
+    `sweep_interval` seconds: when the doc counts differ, by a sorted diff of the doc IDs.
+    """
+
+    def __init__(self, index, connect, interval=SEGMENT_SYNC_INTERVAL, flush_docs=SEGMENT_FLUSH_DOCS,
+                 overlap=SEGMENT_SYNC_OVERLAP, sweep_interval=KEYWORD_SWEEP_INTERVAL):
+        self.index = index
+        self.connect = connect
+        self.interval = interval
+        self.flush_docs = max(1, flush_docs)
+        self.overlap = overlap
+        self.sweep_interval = sweep_interval
+        self.lock = threading.Lock()
+        self.db = None
+        self.last_sweep = 0.0
+
+    def start(self):
+        threading.Thread(target=self._loop, name="segment-sync", daemon=True).start()
+        return self
+
+    def _loop(self):
+        while True:
+            self.sync_once()
+            time.sleep(self.interval)
+
+    def sync_once(self):
+        with self.lock:
+            try:
+                if self.db is None:
+                    self.db = self.connect()
+                self.db.ping(reconnect=True, attempts=1, delay=0)
+                cursor = self.db.cursor()
+                try:
+                    applied = self._apply_changes(cursor)
+                    removed = self._sweep(cursor)
+                finally:
+                    cursor.close()
+                self.index.ready = True
+                if applied or removed:
+                    print(f"[SEGMENTS] Synced {applied} changed and {removed} removed pages")
+                return applied + removed
+            except Exception as e:
+                if getattr(e, "errno", None) != NO_SUCH_TABLE:
+                    print(f"[SEGMENTS] Sync failed: {e}")
+                try:
+                    self.db.close()
+                except Exception:
+                    pass
+                self.db = None
+                return 0
+
+    def _apply_changes(self, cursor):
+        mark = self.index.watermark
+        if mark is None:
+            position = (datetime(1970, 1, 2), 0)
+        else:
+            mark = (datetime.fromisoformat(mark[0]), mark[1])
+            position = (mark[0] - timedelta(seconds=self.overlap), 0)
+
+        applied = 0
+        while True:
+            cursor.execute("""
+                SELECT doc_id, url, updated_at, length FROM index_docs
+                WHERE (updated_at, doc_id) > (%s, %s)
+                ORDER BY updated_at, doc_id
+                LIMIT %s
+            """, (*position, self.flush_docs))
+            rows = cursor.fetchall()
+            if not rows:
+                self.db.rollback()
+                return applied
+            position = (rows[-1][2], rows[-1][0])
+            changed = {doc_id: (url, length, version_of(updated_at)) for doc_id, url, updated_at, length in rows
+                       if self.index.version(doc_id) != version_of(updated_at)}
+            docs = self._read_postings(cursor, changed)
+            self.db.rollback()  # ends the snapshot the docs and their postings were read from
+
+            if mark is None or position > mark:
+                mark = position
+            self.index.flush(docs, watermark=[mark[0].isoformat(), mark[1]])
+            applied += len(docs)
+
+    def _read_postings(self, cursor, changed):
+        docs = {doc_id: (url, length, version, {}) for doc_id, (url, length, version) in changed.items()}
+        ids = list(changed)
+        for i in range(0, len(ids), 1000):
+            chunk = ids[i:i + 1000]
+            cursor.execute(f"""
+                SELECT p.doc_id, t.term, p.positions FROM postings p
+                JOIN terms t ON t.term_id = p.term_id
+                WHERE p.doc_id IN ({", ".join(["%s"] * len(chunk))})
+            """, chunk)
+            for doc_id, term, data in cursor.fetchall():
+                docs[doc_id][3][term] = decode_positions(data)
+        return docs
+
+    def _sweep(self, cursor):
+        if time.monotonic() - self.last_sweep < self.sweep_interval:
+            return 0
+        self.last_sweep = time.monotonic()
+        cursor.execute("SELECT COUNT(*) FROM index_docs")
+        if cursor.fetchone()[0] == self.index.live_docs():
+            self.db.rollback()
+            return 0
+
+        cursor.execute("SELECT doc_id FROM index_docs ORDER BY doc_id")
+
+        def present():
+            while True:
+                rows = cursor.fetchmany(10000)
+                if not rows:
+                    return
+                for row in rows:
+                    yield row[0]
+
+        gone, rows = [], present()
+        current = next(rows, None)
+        for doc_id in self.index.live_doc_ids():
+            while current is not None and current < doc_id:
+                current = next(rows, None)
+            if current != doc_id:
+                gone.append(doc_id)
+        for _ in rows:
+            pass
+        self.db.rollback()
+        self.index.flush({}, gone)
+        return len(gone)
+
+_index = None
+_index_lock = threading.Lock()
+
+def init_segment_index(directory=SEGMENT_DIR):
+    """Open the node's segment index and start its merge thread; call once at start-up."""
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = SegmentIndex(directory).start_merging()
+            metrics.register("segments", _index.snapshot)
+        return _index
+
+def get_segment_index():
+    return _index or init_segment_index()
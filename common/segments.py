@@ -0,0 +1,316 @@
+import heapq
+import mmap
+import os
+import shutil
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_left
+from itertools import accumulate, groupby
+
+# Immutable segment file: a header, then the sections below, each starting 8-byte aligned.
+# Arrays are in the writing host's byte order, which the header records.
+#   doc table, sorted by doc ID (a doc's ordinal is its position in it):
+#     doc_ids u32, versions u64 (index_docs.updated_at in ms), lengths u32, url_offsets u64[n + 1], urls
+#   tombstones u32: doc IDs deleted as of this segment; like the doc IDs, they mask older segments
+#   term dictionary, sorted: term_offsets u64[t + 1], terms, term_df u32
+#   per term, postings in blocks of BLOCK_SIZE:
+#     skips u32, 4 per block: last ordinal, end of the ordinal deltas, end of the tfs, end of the positions
+#     postings: varint ordinal deltas, then varint tfs; positions: varint deltas, restarting per posting
+MAGIC = b"CSEG"
+VERSION = 1
+BLOCK_SIZE = 128
+SECTIONS = (("doc_ids", "I"), ("versions", "Q"), ("lengths", "I"), ("url_offsets", "Q"), ("urls", "B"),
+            ("tombstones", "I"), ("term_offsets", "Q"), ("terms", "B"), ("term_df", "I"),
+            ("post_offsets", "Q"), ("pos_offsets", "Q"), ("skip_offsets", "Q"), ("skips", "I"),
+            ("postings", "B"), ("positions", "B"))
+HEADER = struct.Struct(f"<4sHH{2 * len(SECTIONS)}Q")  # magic, version, byte order, (start, length) per section
+BYTE_ORDER = 0 if sys.byteorder == "little" else 1
+
+# === Varints ===
+def _put_varint(out, value):
+    while value >= 0x80:
+        out.append(value & 0x7F | 0x80)
+        value >>= 7
+    out.append(value)
+
+def _varints(data):
+    data = bytes(data)
+    if data.isascii():
+        return list(data)  # every value below 128: one byte each, decoded in C
+    values, value, shift = [], 0, 0
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+        else:
+            values.append(value)
+            value = shift = 0
+    return values
+
+# === Writing ===
+class SegmentWriter:
+    """Streams one segment to `path`: add_doc() in doc ID order, add_term() in term order, then finish().
+
+    Postings, positions and URLs go to temporary files next to the segment, so a merge of
+    large segments holds only the term dictionary and the doc table in memory. finish()
+    writes `path` under a temporary name and renames it once it is on disk.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        directory = os.path.dirname(path) or "."
+        self.doc_ids, self.versions, self.lengths = array("I"), array("Q"), array("I")
+        self.url_offsets = array("Q", [0])
+        self.term_offsets, self.terms, self.term_df = array("Q", [0]), bytearray(), array("I")
+        self.post_offsets, self.pos_offsets, self.skip_offsets = array("Q", [0]), array("Q", [0]), array("Q", [0])
+        self.skips = array("I")
+        self.urls = tempfile.TemporaryFile(dir=directory)
+        self.postings = tempfile.TemporaryFile(dir=directory)
+        self.positions = tempfile.TemporaryFile(dir=directory)
+        self.last_term = None
+
+    def add_doc(self, doc_id, url, length, version):
+        if self.doc_ids and doc_id <= self.doc_ids[-1]:
+            raise ValueError("docs must be added in increasing doc ID order")
+        encoded = url.encode("utf-8")
+        self.urls.write(encoded)
+        self.url_offsets.append(self.url_offsets[-1] + len(encoded))
+        self.doc_ids.append(doc_id)
+        self.versions.append(version)
+        self.lengths.append(length)
+        return len(self.doc_ids) - 1
+
+    def add_term(self, term, postings):
+        """postings: [(ordinal, positions)] in ordinal order."""
+        encoded = term.encode("utf-8")
+        if self.last_term is not None and encoded <= self.last_term:
+            raise ValueError("terms must be added in sorted order")
+        self.last_term = encoded
+        post, pos, base = bytearray(), bytearray(), 0
+        for start in range(0, len(postings), BLOCK_SIZE):
+            block = postings[start:start + BLOCK_SIZE]
+            previous = base
+            for ordinal, _ in block:
+                _put_varint(post, ordinal - previous)
+                previous = ordinal
+            doc_end = len(post)
+            for _, offsets in block:
+                _put_varint(post, len(offsets))
+            for _, offsets in block:
+                last = 0
+                for offset in offsets:
+                    _put_varint(pos, offset - last)
+                    last = offset
+            self.skips.extend((previous, doc_end, len(post), len(pos)))
+            base = previous
+        self.postings.write(post)
+        self.positions.write(pos)
+        self.terms += encoded
+        self.term_offsets.append(len(self.terms))
+        self.term_df.append(len(postings))
+        self.post_offsets.append(self.post_offsets[-1] + len(post))
+        self.pos_offsets.append(self.pos_offsets[-1] + len(pos))
+        self.skip_offsets.append(len(self.skips))
+
+    def finish(self, tombstones=()):
+        sections = {name: array("I", sorted(tombstones)) if name == "tombstones" else getattr(self, name)
+                    for name, _ in SECTIONS}
+        temporary = self.path + ".tmp"
+        try:
+            with open(temporary, "wb") as out:
+                out.write(bytes(HEADER.size))
+                layout = []
+                for name, _ in SECTIONS:
+                    out.write(bytes(-out.tell() % 8))
+                    start = out.tell()
+                    section = sections[name]
+                    if hasattr(section, "seek"):
+                        section.seek(0)
+                        shutil.copyfileobj(section, out)
+                    else:
+                        out.write(section)
+                    layout += [start, out.tell() - start]
+                out.seek(0)
+                out.write(HEADER.pack(MAGIC, VERSION, BYTE_ORDER, *layout))
+                out.flush()
+                os.fsync(out.fileno())
+            os.replace(temporary, self.path)
+        finally:
+            for spool in (self.urls, self.postings, self.positions):
+                spool.close()
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        return self.path
+
+# === Reading ===
+class Segment:
+    """A segment file mapped read-only. Lookups binary-search the sorted sections in place.
+
+    `dead` holds the ordinals masked by newer segments; SegmentIndex maintains it.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+        with open(path, "rb") as f:
+            self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, byte_order, *layout = HEADER.unpack_from(self.map, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a version {VERSION} segment")
+        if byte_order != BYTE_ORDER:
+            raise ValueError(f"{path}: written on a host with the other byte order")
+        view = memoryview(self.map)
+        for (name, code), start, length in zip(SECTIONS, layout[0::2], layout[1::2]):
+            section = view[start:start + length]
+            setattr(self, name, section if code == "B" else section.cast(code))
+        self.doc_count = len(self.doc_ids)
+        self.term_count = len(self.term_df)
+        self.total_length = sum(self.lengths)
+        self.last_ordinals = self.skips[0::4]
+        self.bytes = len(self.map)
+        self.dead = set()
+        self.dead_length = 0
+
+    @property
+    def live_docs(self):
+        return self.doc_count - len(self.dead)
+
+    @property
+    def live_length(self):
+        return self.total_length - self.dead_length
+
+    def term(self, index):
+        return bytes(self.terms[self.term_offsets[index]:self.term_offsets[index + 1]])
+
+    def find(self, term):
+        """Index of `term` in the dictionary, or -1."""
+        key = term.encode("utf-8")
+        lo, hi = 0, self.term_count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self.term(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo if lo < self.term_count and self.term(lo) == key else -1
+
+    def ordinal(self, doc_id):
+        index = bisect_left(self.doc_ids, doc_id)
+        return index if index < self.doc_count and self.doc_ids[index] == doc_id else -1
+
+    def deletes(self, doc_id):
+        index = bisect_left(self.tombstones, doc_id)
+        return index < len(self.tombstones) and self.tombstones[index] == doc_id
+
+    def url(self, ordinal):
+        return bytes(self.urls[self.url_offsets[ordinal]:self.url_offsets[ordinal + 1]]).decode("utf-8")
+
+    def posting_list(self, term_index):
+        return PostingList(self, term_index)
+
+    def live_doc_ids(self):
+        dead = self.dead
+        return (doc_id for ordinal, doc_id in enumerate(self.doc_ids) if ordinal not in dead)
+
+class PostingList:
+    """Cursor over one term's postings in a segment. Blocks are decoded only when reached,
+    and advance() skips whole blocks by their last ordinal."""
+
+    def __init__(self, segment, term_index):
+        self.segment = segment
+        self.df = segment.term_df[term_index]
+        self.post_base = segment.post_offsets[term_index]
+        self.pos_base = segment.pos_offsets[term_index]
+        self.first_block = segment.skip_offsets[term_index] // 4
+        self.block_count = segment.skip_offsets[term_index + 1] // 4 - self.first_block
+        self.block = -1
+        self.index = 0
+        self.ordinals = self.tfs = ()
+        self.block_positions = None
+
+    def _skip(self, block, field):
+        return self.segment.skips[4 * (self.first_block + block) + field]
+
+    def load(self, block):
+        base = self._skip(block - 1, 0) if block else 0
+        start = self._skip(block - 1, 2) if block else 0
+        doc_end, tf_end = self._skip(block, 1), self._skip(block, 2)
+        data = self.segment.postings
+        self.ordinals = list(accumulate(_varints(data[self.post_base + start:self.post_base + doc_end]),
+                                        initial=base))[1:]
+        self.tfs = _varints(data[self.post_base + doc_end:self.post_base + tf_end])
+        self.block, self.index, self.block_positions = block, 0, None
+
+    def blocks(self):
+        for block in range(self.block_count):
+            self.load(block)
+            yield self.ordinals, self.tfs
+
+    def advance(self, target):
+        """Move to the first posting at or after ordinal `target`; returns its ordinal, or None at the end."""
+        if self.block < 0 or self.ordinals[-1] < target:
+            lasts = self.segment.last_ordinals
+            block = bisect_left(lasts, target, self.first_block + max(self.block, 0),
+                                self.first_block + self.block_count) - self.first_block
+            if block == self.block_count:
+                return None
+            self.load(block)
+        self.index = bisect_left(self.ordinals, target, self.index)
+        return self.ordinals[self.index]
+
+    def tf(self):
+        return self.tfs[self.index]
+
+    def positions(self):
+        if self.block_positions is None:
+            start = self._skip(self.block - 1, 3) if self.block else 0
+            deltas = _varints(self.segment.positions[self.pos_base + start:self.pos_base + self._skip(self.block, 3)])
+            self.block_positions, offset = [], 0
+            for tf in self.tfs:
+                self.block_positions.append(list(accumulate(deltas[offset:offset + tf])))
+                offset += tf
+        return self.block_positions[self.index]
+
+# === Merging ===
+def merge_segments(segments, path, keep_tombstones):
+    """Write the live docs of adjacent `segments` (oldest first) as one segment at `path`.
+
+    Docs masked by newer segments are dropped. The tombstones are kept, since they still mask
+    segments older than the run, unless `keep_tombstones` is false (the run starts at the oldest).
+    """
+    def live(i, segment):
+        for ordinal, doc_id in enumerate(segment.doc_ids):
+            if ordinal not in segment.dead:
+                yield doc_id, i, ordinal
+
+    def dictionary(i, segment):
+        for index in range(segment.term_count):
+            yield segment.term(index), i, index
+
+    writer = SegmentWriter(path)
+    remap = [{} for _ in segments]
+    for doc_id, i, ordinal in heapq.merge(*[live(i, segment) for i, segment in enumerate(segments)]):
+        segment = segments[i]
+        remap[i][ordinal] = writer.add_doc(doc_id, segment.url(ordinal), segment.lengths[ordinal],
+                                           segment.versions[ordinal])
+
+    terms = heapq.merge(*[dictionary(i, segment) for i, segment in enumerate(segments)])
+    for term, group in groupby(terms, key=lambda item: item[0]):
+        postings = []
+        for _, i, index in group:
+            plist, ordinals = segments[i].posting_list(index), remap[i]
+            for block_ordinals, _ in plist.blocks():
+                for position, ordinal in enumerate(block_ordinals):
+                    if ordinal in ordinals:
+                        plist.index = position
+                        postings.append((ordinals[ordinal], plist.positions()))
+        if postings:
+            postings.sort(key=lambda posting: posting[0])
+            writer.add_term(term.decode("utf-8"), postings)
+
+    tombstones = set()
+    if keep_tombstones:
+        tombstones = {doc_id for segment in segments for doc_id in segment.tombstones} - set(writer.doc_ids)
+    return writer.finish(tombstones)
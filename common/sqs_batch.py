@@ -0,0 +1,202 @@
+import threading
+import time
+from collections import Counter, deque
+from concurrent.futures import ThreadPoolExecutor, wait
+
+from common import metrics
+from common.config import SQS_FLUSH_INTERVAL, SQS_MAX_ATTEMPTS, SQS_RETRY_BASE, SQS_RETRY_MAX
+
+MAX_BATCH = 10                  # SQS limit for receive / send / delete batches
+MAX_BATCH_BYTES = 256 * 1024    # SQS limit for the summed payload of one send batch
+
+
+class BatchingSQS:
+    """Coalesces sends and deletes into *_batch calls and receives 10 messages at a time.
+
+    Sends and deletes only append to a buffer; a background flusher ships a batch as soon
+    as it is full or its oldest entry is older than `flush_interval`. Entries of a failed
+    call go back to the front of their buffer, which then waits out an exponential backoff;
+    an entry is dropped after `max_attempts` calls.
+    """
+
+    def __init__(self, client, flush_interval=SQS_FLUSH_INTERVAL, tag="SQS", senders=4,
+                 max_attempts=SQS_MAX_ATTEMPTS, retry_base=SQS_RETRY_BASE, retry_max=SQS_RETRY_MAX):
+        self.client = client
+        self.flush_interval = flush_interval
+        self.tag = tag
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+
+        self.cond = threading.Condition()
+        # queue_url -> deque[(enqueued_at, payload, attempts)]; a retried entry's enqueued_at
+        # is the time of its last failure
+        self.sends = {}     # payload: message body
+        self.deletes = {}   # payload: receipt handle
+        self.stats = Counter()
+
+        self.shippers = ThreadPoolExecutor(max_workers=senders, thread_name_prefix=f"{tag}-batch")
+        self.closed = False
+        self.flusher = threading.Thread(target=self._flush_loop, name=f"{tag}-flusher", daemon=True)
+        self.flusher.start()
+        metrics.register("sqs", self.snapshot)
+
+    # === Receive ===
+    def receive(self, queue_url, wait=3, max_messages=MAX_BATCH):
+        response = self.client.receive_message(
+            QueueUrl=queue_url,
+            MaxNumberOfMessages=max_messages,
+            WaitTimeSeconds=wait
+        )
+        messages = response.get('Messages', [])
+        with self.cond:
+            self.stats["receive_calls"] += 1
+            self.stats["received"] += len(messages)
+        return messages
+
+    def change_visibility(self, queue_url, receipt_handles, seconds):
+        # Used to keep locally buffered messages invisible, or to hand one back early
+        for i in range(0, len(receipt_handles), MAX_BATCH):
+            entries = [
+                {"Id": str(j), "ReceiptHandle": handle, "VisibilityTimeout": seconds}
+                for j, handle in enumerate(receipt_handles[i:i + MAX_BATCH])
+            ]
+            try:
+                self.client.change_message_visibility_batch(QueueUrl=queue_url, Entries=entries)
+            except Exception as e:
+                print(f"[{self.tag}][VISIBILITY ERROR] {e}")
+            with self.cond:
+                self.stats["visibility_calls"] += 1
+
+    # === Send / Delete ===
+    def send(self, queue_url, body):
+        with self.cond:
+            self.sends.setdefault(queue_url, deque()).append((time.time(), body, 0))
+            if len(self.sends[queue_url]) >= MAX_BATCH:
+                self.cond.notify()
+
+    def delete(self, queue_url, receipt_handle):
+        with self.cond:
+            self.deletes.setdefault(queue_url, deque()).append((time.time(), receipt_handle, 0))
+            if len(self.deletes[queue_url]) >= MAX_BATCH:
+                self.cond.notify()
+
+    def flush(self):
+        self._flush(force=True)
+
+    def close(self):
+        self.closed = True
+        with self.cond:
+            self.cond.notify()
+        self.flusher.join(timeout=5)
+        self.flush()
+        self.shippers.shutdown(wait=True)
+
+    def snapshot(self):
+        with self.cond:
+            stats = dict(self.stats)
+            stats["pending_sends"] = sum(len(q) for q in self.sends.values())
+            stats["pending_deletes"] = sum(len(q) for q in self.deletes.values())
+        return stats
+
+    # === Flushing ===
+    def _flush_loop(self):
+        while not self.closed:
+            with self.cond:
+                self.cond.wait(timeout=self.flush_interval / 2)
+            try:
+                self._flush(force=False)
+            except Exception as e:
+                print(f"[{self.tag}][FLUSH ERROR] {e}")
+
+    def _backoff(self, attempts):
+        return min(self.retry_max, self.retry_base * 2 ** (attempts - 1))
+
+    def _ready(self, buf, now):
+        enqueued_at, _, attempts = buf[0]
+        if attempts:
+            # The last call for the head failed: hold the whole buffer until its backoff ends
+            return now - enqueued_at >= self._backoff(attempts)
+        return len(buf) >= MAX_BATCH or now - enqueued_at >= self.flush_interval
+
+    def _take(self, buffers, force, size_of=None):
+        # Pull ready batches out of the buffers while holding the lock; ship them outside it
+        batches = []
+        now = time.time()
+        with self.cond:
+            for queue_url, buf in buffers.items():
+                while buf and (force or self._ready(buf, now)):
+                    batch, total = [], 0
+                    while buf and len(batch) < MAX_BATCH:
+                        item = buf[0][1]
+                        size = size_of(item) if size_of else 0
+                        if batch and total + size > MAX_BATCH_BYTES:
+                            break
+                        batch.append(buf.popleft())
+                        total += size
+                    batches.append((queue_url, batch))
+        return batches
+
+    def _flush(self, force):
+        futures = [
+            self.shippers.submit(self._send_batch, queue_url, batch)
+            for queue_url, batch in self._take(self.sends, force, size_of=lambda b: len(b.encode('utf-8')))
+        ]
+        futures += [
+            self.shippers.submit(self._delete_batch, queue_url, batch)
+            for queue_url, batch in self._take(self.deletes, force)
+        ]
+        wait(futures)
+
+    def _send_batch(self, queue_url, batch):
+        entries = [{"Id": str(i), "MessageBody": body} for i, (_, body, _) in enumerate(batch)]
+        try:
+            response = self.client.send_message_batch(QueueUrl=queue_url, Entries=entries)
+        except Exception as e:
+            print(f"[{self.tag}][SEND BATCH ERROR] {e}")
+            self._requeue(self.sends, "send", queue_url, batch)
+            return
+
+        failed = response.get('Failed', [])
+        retry = [batch[int(f['Id'])] for f in failed if not f.get('SenderFault')]
+        for f in failed:
+            if f.get('SenderFault'):
+                print(f"[{self.tag}] Dropping rejected message: {f.get('Message')}")
+        self._requeue(self.sends, "send", queue_url, retry)
+
+        with self.cond:
+            self.stats["send_calls"] += 1
+            self.stats["sent"] += len(batch) - len(failed)
+
+    def _delete_batch(self, queue_url, batch):
+        entries = [{"Id": str(i), "ReceiptHandle": handle} for i, (_, handle, _) in enumerate(batch)]
+        try:
+            response = self.client.delete_message_batch(QueueUrl=queue_url, Entries=entries)
+        except Exception as e:
+            print(f"[{self.tag}][DELETE BATCH ERROR] {e}")
+            self._requeue(self.deletes, "delete", queue_url, batch)
+            return
+
+        failed = response.get('Failed', [])
+        for f in failed:
+            # An expired receipt handle cannot be retried; the message will be redelivered
+            print(f"[{self.tag}] Delete failed: {f.get('Message')}")
+
+        with self.cond:
+            self.stats["delete_calls"] += 1
+            self.stats["deleted"] += len(batch) - len(failed)
+
+    def _requeue(self, buffers, kind, queue_url, items):
+        if not items:
+            return
+        now = time.time()
+        retry = [(now, payload, attempts + 1) for _, payload, attempts in items if attempts + 1 < self.max_attempts]
+        dropped = len(items) - len(retry)
+        if dropped:
+            # A deleted message that is dropped is redelivered after its visibility timeout
+            print(f"[{self.tag}] Dropping {dropped} {kind}(s) to {queue_url} after {self.max_attempts} attempts")
+        with self.cond:
+            self.stats[f"{kind}_retries"] += len(retry)
+            self.stats[f"{kind}_dropped"] += dropped
+            buffers.setdefault(queue_url, deque()).extendleft(reversed(retry))
+
@@ -0,0 +1,124 @@
+import re
+from functools import lru_cache
+from urllib.parse import urlsplit, urlunsplit, urljoin
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+# Query parameters that only identify a campaign/click and never change page content
+TRACKING_PARAMS = frozenset([
+    "utm_source", "utm_medium", "utm_campaign", "utm_term", "utm_content", "utm_id",
+    "gclid", "dclid", "fbclid", "msclkid", "yclid", "mc_cid", "mc_eid", "_ga", "_gl",
+    "igshid", "ref_src", "spm",
+])
+TRACKING_PREFIXES = ("utm_",)
+
+_UNRESERVED = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+_PCT = re.compile(r"%([0-9A-Fa-f]{2})")
+_SCHEME = re.compile(r"^[A-Za-z][A-Za-z0-9+.-]*:")
+
+
+def _normalize_pct(match):
+    char = chr(int(match.group(1), 16))
+    return char if char in _UNRESERVED else "%" + match.group(1).upper()
+
+
+def _remove_dot_segments(path):
+    # RFC 3986 section 5.2.4, on whole segments
+    output = []
+    for segment in path.split("/")[1:]:
+        if segment == "..":
+            if output:
+                output.pop()
+        elif segment != ".":
+            output.append(segment)
+    if path.endswith(("/.", "/..")):
+        output.append("")
+    return "/" + "/".join(output)
+
+
+@lru_cache(maxsize=65536)
+def _canonical_host(host):
+    host = host.rstrip(".").lower()
+    if host.isascii():
+        return host
+    try:
+        return host.encode("idna").decode("ascii")
+    except UnicodeError:
+        return None
+
+
+def _canonical_query(query):
+    params = []
+    for pair in query.split("&"):
+        if not pair:
+            continue
+        name = pair.split("=", 1)[0]
+        if name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES):
+            continue
+        params.append(pair)
+    # Sort by name only: the order of a repeated key's values ("a=2&a=1") can matter to the server
+    params.sort(key=lambda p: p.split("=", 1)[0])
+    return "&".join(params)
+
+
+def canonicalize(url, base=None):
+    """Canonical form of an http(s) URL, or None if it is not crawlable.
+
+    `base` resolves relative links (as found in a page) before canonicalizing.
+    """
+    url = url.strip()
+    if not url or url[0] == "#":
+        return None
+    if base is not None:
+        url = urljoin(base, url)
+    elif url.startswith("//"):
+        url = "https:" + url
+    elif not _SCHEME.match(url) or url[:url.index(":")].isdigit() or "." in url[:url.index(":")]:
+        # Bare "example.com/path" (or "example.com:8080/path") as typed by users
+        url = "https://" + url
+
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return None
+
+    scheme = parts.scheme.lower()
+    if scheme not in DEFAULT_PORTS or not parts.hostname:
+        return None
+
+    host = _canonical_host(parts.hostname)
+    if not host:
+        return None
+    if ":" in host:
+        host = f"[{host}]"
+    if port is not None and port != DEFAULT_PORTS[scheme]:
+        host = f"{host}:{port}"
+
+    path = parts.path or "/"
+    if "%" in path:
+        path = _PCT.sub(_normalize_pct, path)
+    if "/." in path:
+        path = _remove_dot_segments(path)
+    if len(path) > 1 and path.endswith("/"):
+        path = path.rstrip("/") or "/"
+
+    query = parts.query
+    if query:
+        if "%" in query:
+            query = _PCT.sub(_normalize_pct, query)
+        query = _canonical_query(query)
+
+    return urlunsplit((scheme, host, path, query, ""))
+
+
+def canonicalize_links(base, hrefs):
+    # Resolve, canonicalize and de-duplicate the hrefs of one page, keeping page order
+    seen = set()
+    links = []
+    for href in hrefs:
+        link = canonicalize(href, base)
+        if link and link not in seen:
+            seen.add(link)
+            links.append(link)
+    return links
@@ -1,13 +1,24 @@
-import boto3
-import requests
-from bs4 import BeautifulSoup
-import uuid
+import os
+import sys
 import time
-from urllib.parse import urljoin
 import threading
-import json
 import socket
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import metrics
+from common.autoscale import WorkerPool
+from common.concurrency import get_concurrency, host_limit, init_concurrency
+from common.config import (
+    CRAWL_MODE, CRAWL_CONCURRENCY, CRAWL_MIN_THREADS, CRAWL_THREADS, CRAWLER_QUEUE_URL, INDEXER_QUEUE_URL, LEASE_NAME
+)
+from common.crawl_core import crawl_backlog, crawl_next, feed_frontier
+from common.frontier import HostFrontier
+from common.http_client import get_http_client, init_http_client
+from common.jobs import get_job_tracker
+from common.parse_pool import init_parse_pool
+from common.queues import get_queue_client
+from common.sqs_batch import BatchingSQS
+
 # Constants
 MASTER_API = "http://172.31.21.118:5000"
 NODE_ROLE = "crawler"
@@ -31,10 +42,11 @@ thread_status_map = {}  # thread_name -> status
 lock = threading.Lock()
 stop_event = threading.Event()
 
-# AWS SQS
-sqs = boto3.client('sqs', region_name='eu-north-1')
-crawler_queue_url = 'https://sqs.eu-north-1.amazonaws.com/441832714601/TaskQueueStandard'
-indexer_queue_url = 'https://sqs.eu-north-1.amazonaws.com/441832714601/IndexerQueueStandard'
+# Queues (QUEUE_BACKEND)
+queue = None  # BatchingSQS; built at start-up, since the parse processes import this script
+frontier = HostFrontier(host_limit=host_limit)
+crawler_queue_url = CRAWLER_QUEUE_URL
+indexer_queue_url = INDEXER_QUEUE_URL
 
 # HEARTBEAT
 def send_heartbeat():
@@ -42,6 +54,7 @@ def send_heartbeat():
         with lock:
             count = urls_crawled  # snapshot under lock
             threads_info = [{"id": k, "status": v} for k, v in thread_status_map.items()]
+        threads_info += frontier.threads_info()  # per-host queue depth
 
         try:
             payload = {
@@ -50,111 +63,91 @@ def send_heartbeat():
                 "ip": NODE_IP,
                 "url_count": count,
                 "active_threads": active_threads,
-                "threads_info": threads_info
+                "threads_info": threads_info,
+                "metrics": metrics.collect(),
+                **get_job_tracker().heartbeat_fields(),  # per-job deltas, resent until acknowledged
+                "lease": {"name": LEASE_NAME or NODE_ID}  # primary lease; standbys take over when it lapses
             }
-            requests.post(f"{MASTER_API}/api/heartbeat", json=payload, timeout=3)
+            res = get_http_client().post(f"{MASTER_API}/api/heartbeat", json=payload, timeout=3)
+            res.raise_for_status()
+            get_job_tracker().apply_reply(res.json())
         except Exception as e:
             print(f"[HEARTBEAT ERROR] {e}")
 
         time.sleep(2)
 
-# Crawl Logic
+def count_crawled():
+    global urls_crawled
+    with lock:
+        urls_crawled += 1
+
+# Crawl Logic (one task per call; the worker pool calls it in a loop)
 def crawl_url():
-    global urls_crawled, active_threads
+    global active_threads
 
     thread_name = threading.current_thread().name
 
-    while not stop_event.is_set():
+    def set_status(status):
         with lock:
-            active_threads += 1
-            thread_status_map[thread_name] = "Waiting for task..."
+            thread_status_map[thread_name] = status
+
+    with lock:
+        active_threads += 1
+        thread_status_map[thread_name] = "Waiting for task..."
+
+    try:
+        crawled = crawl_next(queue, crawler_queue_url, indexer_queue_url, frontier, set_status)
+        if crawled:
+            count_crawled()
+            print("[DEBUG] Incrementing URL count:", urls_crawled)
+        return crawled
+    finally:
+        with lock:
+            thread_status_map[thread_name] = "Idle"
+            active_threads -= 1
 
-        try:
-            response = sqs.receive_message(
-                QueueUrl=crawler_queue_url,
-                MaxNumberOfMessages=1,
-                WaitTimeSeconds=3
-            )
-
-            if 'Messages' not in response:
-                continue
-
-            for message in response['Messages']:
-                try:
-                    body = json.loads(message['Body'])
-                    url = body.get('url')
-                    depth = body.get('depth', 0)
-                    max_depth = body.get('max_depth', 0)
-                    restrict_domain = body.get('restrict_domain', False)
-                    domain_prefix = body.get('domain_prefix', '')
-
-                    with lock:
-                        thread_status_map[thread_name] = f"Crawling {url} (depth {depth})"
-                    print(f"Crawling {url} (depth {depth})")
-                    if depth > max_depth:
-                        sqs.delete_message(QueueUrl=crawler_queue_url, ReceiptHandle=message['ReceiptHandle'])
-                        continue
-
-                    headers = {'User-Agent': 'Mozilla/5.0'}
-                    if url.startswith("//"):
-                        url = "https:" + url
-                    if url.startswith('#') or url.startswith('javascript:') or url.strip() == '':
-                        sqs.delete_message(QueueUrl=crawler_queue_url, ReceiptHandle=message['ReceiptHandle'])
-                        continue
-
-                    r = requests.get(url, headers=headers, timeout=5)
-                    soup = BeautifulSoup(r.text, 'html.parser')
-                    text = soup.get_text()
-                    base_url = url
-                    links = [urljoin(base_url, a['href']) for a in soup.find_all('a', href=True)]
-
-                    # ✅ Apply domain restriction
-                    if restrict_domain:
-                        links = [link for link in links if link.startswith(domain_prefix)]
-
-                    if text.strip():
-                        result = {'url': url, 'text': text, 'links': links}
-                        dedup_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, f"{url}:{depth}"))  # 👈 depth-aware
-                        sqs.send_message(
-                            QueueUrl=indexer_queue_url,
-                            MessageBody=str(result)
-                        )
-
-                    with lock:
-                        urls_crawled += 1
-
-                    if depth + 1 <= max_depth:
-                        for link in links:
-                            sqs.send_message(
-                                QueueUrl=crawler_queue_url,
-                                MessageBody=json.dumps({"url": link, "depth": depth + 1, "max_depth": max_depth,"restrict_domain": restrict_domain,"domain_prefix": domain_prefix }),
-                            )
-
-                except Exception as e:
-                    print(f"[CRAWLER] Failed to crawl: {e}")
-
-                sqs.delete_message(QueueUrl=crawler_queue_url, ReceiptHandle=message['ReceiptHandle'])
-
-        finally:
-            with lock:
-                thread_status_map[thread_name] = "Idle"
-                active_threads -= 1
-
-        print("[DEBUG] Incrementing URL count:", urls_crawled)
 # Launch Threads
 def start_crawlers(num_threads):
-    threads = []
+    global queue
+    queue = BatchingSQS(get_queue_client(), tag="CRAWLER")
+    max_workers = CRAWL_CONCURRENCY if CRAWL_MODE == "async" else num_threads
+    init_http_client(max_workers)
+    init_concurrency(max_workers)
+    init_parse_pool()  # starts the parse processes before the worker threads
 
     heartbeat_thread = threading.Thread(target=send_heartbeat, daemon=True)
     heartbeat_thread.start()
 
-    for i in range(num_threads):
-        t = threading.Thread(target=crawl_url, name=f"Thread-{i+1}")
-        threads.append(t)
-        t.start()
-
-    for t in threads:
-        t.join()
+    if CRAWL_MODE == "async":
+        from common.async_engine import run_async_crawler
+        run_async_crawler(
+            queue=queue,
+            frontier=frontier,
+            crawler_queue_url=crawler_queue_url,
+            indexer_queue_url=indexer_queue_url,
+            status_map=thread_status_map,
+            lock=lock,
+            on_crawled=count_crawled,
+            stop_event=stop_event,
+            concurrency=CRAWL_CONCURRENCY
+        )
+        return
+
+    feeder = threading.Thread(target=feed_frontier, args=(queue, crawler_queue_url, frontier, stop_event),
+                              name="Feeder", daemon=True)
+    feeder.start()
+
+    # Sized from the backlog between CRAWL_MIN_THREADS and num_threads; threads past the adaptive
+    # fetch limit would only wait for a slot, so that limit caps the pool too
+    workers = WorkerPool(
+        "CRAWLER", crawl_url, lambda: crawl_backlog(queue, crawler_queue_url, frontier),
+        CRAWL_MIN_THREADS, num_threads, stop_event, status_map=thread_status_map, lock=lock,
+        cap_fn=lambda: get_concurrency().limit
+    )
+    workers.start()
+    workers.join()
+
+    queue.close()
 
 if __name__ == "__main__":
-    start_crawlers(num_threads=3)
+    start_crawlers(num_threads=CRAWL_THREADS)
@@ -1,13 +1,26 @@
-import boto3
-import requests
-from bs4 import BeautifulSoup
-import uuid
+import os
+import sys
 import time
-from urllib.parse import urljoin
 import threading
-import json
 import socket
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import metrics
+from common.autoscale import WorkerPool
+from common.concurrency import get_concurrency, host_limit, init_concurrency
+from common.config import (
+    CRAWL_MODE, CRAWL_CONCURRENCY, CRAWL_MIN_THREADS, CRAWL_THREADS, CRAWLER_PRIMARIES, CRAWLER_QUEUE_URL,
+    INDEXER_QUEUE_URL
+)
+from common.crawl_core import crawl_backlog, crawl_next, feed_frontier
+from common.frontier import HostFrontier
+from common.http_client import get_http_client, init_http_client
+from common.jobs import get_job_tracker
+from common.leases import StandbyLease
+from common.parse_pool import init_parse_pool
+from common.queues import get_queue_client
+from common.sqs_batch import BatchingSQS
+
 # === Configuration ===
 MASTER_API = "http://172.31.21.118:5000"  # Master node IP
 NODE_ROLE = "crawler"
@@ -26,155 +39,127 @@ def get_private_ip():
 
 NODE_IP = get_private_ip()
 
-# === AWS SQS Setup ===
-sqs = boto3.client('sqs', region_name='eu-north-1')
-crawler_queue_url = 'https://sqs.eu-north-1.amazonaws.com/441832714601/TaskQueueStandard'
-indexer_queue_url = 'https://sqs.eu-north-1.amazonaws.com/441832714601/IndexerQueueStandard'
+# === Queues (QUEUE_BACKEND) ===
+queue = None  # BatchingSQS; built at start-up, since the parse processes import this script
+frontier = HostFrontier(host_limit=host_limit)
+crawler_queue_url = CRAWLER_QUEUE_URL
+indexer_queue_url = INDEXER_QUEUE_URL
 
 # === Globals ===
 url_count = 0
 thread_status_map = {}
 lock = threading.Lock()
+stop_event = threading.Event()
+
+# === Failover Lease ===
+# Active only while the master has granted a standby lease (fewer than CRAWLER_PRIMARIES crawlers alive)
+standby = StandbyLease(MASTER_API, NODE_ID, NODE_ROLE, CRAWLER_PRIMARIES, tag="CRAWLER3")
 
 # === Helper: Should Crawler3 Run? ===
 def should_run():
-    try:
-        res1 = requests.get(f"{MASTER_API}/api/crawler1-status", timeout=3)
-        res2 = requests.get(f"{MASTER_API}/api/crawler2-status", timeout=3)
-        status1 = res1.json().get("active", True)
-        status2 = res2.json().get("active", True)
-        status = status1 and status2
-        return not status
-    except:
-        return False  # default to idle if unreachable
+    return standby.is_active()
 
 # === Heartbeat Thread ===
 def send_heartbeat():
-    global url_count
     while True:
         try:
-            with lock:
+            with lock:  # only the shared counters; metrics and the frontier have their own locks
+                count = url_count
                 threads_info = [{"id": name, "status": status} for name, status in thread_status_map.items()]
-                payload = {
-                    "node_id": NODE_ID,
-                    "role": NODE_ROLE,
-                    "ip": NODE_IP,
-                    "url_count": url_count,
-                    "threads_info": threads_info
-                }
-            requests.post(f"{MASTER_API}/api/heartbeat", json=payload, timeout=3)
+            threads_info += frontier.threads_info()  # per-host queue depth
+            payload = {
+                "node_id": NODE_ID,
+                "role": NODE_ROLE,
+                "ip": NODE_IP,
+                "url_count": count,
+                "threads_info": threads_info,
+                "metrics": metrics.collect(),
+                **get_job_tracker().heartbeat_fields(),  # per-job deltas, resent until acknowledged
+                "lease": standby.heartbeat_field()
+            }
+            res = get_http_client().post(f"{MASTER_API}/api/heartbeat", json=payload, timeout=3)
+            standby.apply_reply(res.json())  # the lease is renewed even if the master's database is down
+            res.raise_for_status()
+            get_job_tracker().apply_reply(res.json())
         except Exception as e:
-            print(f"[CRAWLER2][HEARTBEAT] Failed to send heartbeat: {e}")
+            print(f"[CRAWLER3][HEARTBEAT] Failed to send heartbeat: {e}")
         time.sleep(2)
 
-# === Main Crawl Function ===
-def crawl_url():
+def count_crawled():
     global url_count
-    thread_name = threading.current_thread().name
+    with lock:
+        url_count += 1
 
-    print("[CRAWLER3] Standby crawler waiting for Crawler1 failure...")
+# === Main Crawl Function (one task per call; the worker pool calls it in a loop) ===
+def crawl_url():
+    thread_name = threading.current_thread().name
 
-    while True:
+    def set_status(status):
         with lock:
-            thread_status_map[thread_name] = "Waiting for master signal..."
-
-        if not should_run():
-            # print("[CRAWLER2] Crawler1 is active — staying idle")
-            # time.sleep(2)
-            continue
-
-        print("[CRAWLER3] Crawler1 or Crawler2 down — taking over crawling")
-
-        response = sqs.receive_message(
-            QueueUrl=crawler_queue_url,
-            MaxNumberOfMessages=1,
-            WaitTimeSeconds=3
-        )
-
-        if 'Messages' not in response:
-            continue
-
-        for message in response['Messages']:
-            raw_body = message['Body']
-            body = json.loads(raw_body)
-            url = body.get('url')
-            depth = body.get('depth', 0)
-            max_depth = body.get('max_depth', 0)
-            restrict_domain = body.get('restrict_domain', False)
-            domain_prefix = body.get('domain_prefix', '')
+            thread_status_map[thread_name] = status
 
-            if depth > max_depth:
-                sqs.delete_message(QueueUrl=crawler_queue_url, ReceiptHandle=message['ReceiptHandle'])
-                continue
+    with lock:
+        thread_status_map[thread_name] = "Waiting for master signal..."
 
-            print(f"[CRAWLER3] Crawling URL: {url}")
+    # The feeder only pulls from SQS while should_run() says Crawler1/Crawler2 are down
+    crawled = crawl_next(queue, crawler_queue_url, indexer_queue_url, frontier, set_status)
+    if crawled is None:
+        return None
+    if crawled:
+        count_crawled()
 
-            with lock:
-                thread_status_map[thread_name] = f"Crawling {url}"
+    with lock:
+        thread_status_map[thread_name] = "Idle"
+    return crawled
 
-            try:
-                headers = {'User-Agent': 'Mozilla/5.0'}
-                if url.startswith("//"):
-                    url = "https:" + url
-
-                if url.startswith('#') or url.startswith('javascript:') or url.strip() == '':
-                    print(f"[CRAWLER2] Skipping: {url}")
-                    sqs.delete_message(QueueUrl=crawler_queue_url, ReceiptHandle=message['ReceiptHandle'])
-                    continue
-
-                r = requests.get(url, headers=headers, timeout=5)
-                soup = BeautifulSoup(r.text, 'html.parser')
-                base_url = url
-
-                text = soup.get_text()
-                links = [urljoin(base_url, a['href']) for a in soup.find_all('a', href=True)]
-
-                # Apply domain restriction
-                if restrict_domain:
-                    links = [link for link in links if link.startswith(domain_prefix)]
-
-                result = {'url': url, 'text': text, 'links': links}
-                dedup_id = str(uuid.uuid5(uuid.NAMESPACE_DNS, url))
-
-                if text.strip():
-                    sqs.send_message(QueueUrl=indexer_queue_url, MessageBody=str(result))
-
-                print(f"[CRAWLER2] Crawled {url} with {len(links)} links")
-
-                with lock:
-                    url_count += 1
-
-                if depth + 1 <= max_depth:
-                    for link in links:
-                        sqs.send_message(
-                            QueueUrl=crawler_queue_url,
-                            MessageBody=json.dumps({"url": link, "depth": depth + 1, "max_depth": max_depth,"restrict_domain": restrict_domain,"domain_prefix": domain_prefix})
-                        )
-            except Exception as e:
-                print(f"[CRAWLER2] Failed to crawl {url}: {e}")
-
-            sqs.delete_message(
-                QueueUrl=crawler_queue_url,
-                ReceiptHandle=message['ReceiptHandle']
-            )
-
-            with lock:
-                thread_status_map[thread_name] = "Idle"
+def backlog():
+    # On standby the shared queue's backlog belongs to the primaries
+    return crawl_backlog(queue, crawler_queue_url, frontier) if should_run() else 0
 
 # === Main Launcher ===
 def start_crawler2(num_threads):
+    global queue
+    queue = BatchingSQS(get_queue_client(), tag="CRAWLER3")
+    max_workers = CRAWL_CONCURRENCY if CRAWL_MODE == "async" else num_threads
+    init_http_client(max_workers)
+    init_concurrency(max_workers)
+    init_parse_pool()  # starts the parse processes before the worker threads
+    standby.start()
+    print("[CRAWLER3] Standby crawler waiting for Crawler1 failure...")
 
-    threads = []
     heartbeat_thread = threading.Thread(target=send_heartbeat, daemon=True)
     heartbeat_thread.start()
 
-    for i in range(num_threads):
-        t = threading.Thread(target=crawl_url, name=f"Thread-{i+1}")
-        threads.append(t)
-        t.start()
+    if CRAWL_MODE == "async":
+        from common.async_engine import run_async_crawler
+        run_async_crawler(
+            queue=queue,
+            frontier=frontier,
+            crawler_queue_url=crawler_queue_url,
+            indexer_queue_url=indexer_queue_url,
+            status_map=thread_status_map,
+            lock=lock,
+            on_crawled=count_crawled,
+            stop_event=stop_event,
+            concurrency=CRAWL_CONCURRENCY,
+            should_run=should_run,
+            tag="CRAWLER3"
+        )
+        return
+
+    feeder = threading.Thread(target=feed_frontier,
+                              args=(queue, crawler_queue_url, frontier, stop_event, should_run),
+                              name="Feeder", daemon=True)
+    feeder.start()
+
+    workers = WorkerPool(
+        "CRAWLER3", crawl_url, backlog, CRAWL_MIN_THREADS, num_threads, stop_event,
+        status_map=thread_status_map, lock=lock, cap_fn=lambda: get_concurrency().limit
+    )
+    workers.start()
+    workers.join()
 
-    for t in threads:
-        t.join()
+    queue.close()
 
 if __name__ == "__main__":
-    start_crawler2(3)
+    start_crawler2(CRAWL_THREADS)
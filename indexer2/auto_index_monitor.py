@@ -1,72 +1,259 @@
+import os
+import sys
 import time
-import re
 import mysql.connector
-from collections import defaultdict
-import json
+from collections import Counter
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.config import DB_CONFIG, KEYWORD_BATCH_DOCS, KEYWORD_OVERLAP_SECONDS, KEYWORD_SWEEP_INTERVAL
+from common.postings import encode_positions, term_positions
+
+MAX_STATEMENT_BYTES = 4 * 1024 * 1024  # stay under max_allowed_packet
+EPOCH = datetime(1970, 1, 2)
 
 # === MySQL Connection (Auto-Retry)
 def connect_db():
-    return mysql.connector.connect(
-        host="172.31.28.123",
-        user="Admin",
-        password="1234",
-        database="INDEXER"
-    )
+    return mysql.connector.connect(**DB_CONFIG)
 
 db = connect_db()
 db_cursor = db.cursor()
+schema_ready = False
+last_sweep = 0.0
 
-# === Keyword Index Construction
-def build_inverted_index():
-    global db, db_cursor
-    try:
-        db.ping(reconnect=True, attempts=1, delay=0)
-        inverted = defaultdict(set)
+# === Schema
+def ensure_schema():
+    global schema_ready
+    if schema_ready:
+        return
+    # High-water mark: MySQL moves updated_at whenever an upsert actually changes a row
+    db_cursor.execute("SHOW COLUMNS FROM indexed_pages LIKE 'updated_at'")
+    if db_cursor.fetchone() is None:
+        print("[MONITOR] Adding indexed_pages.updated_at (one-off)")
+        db_cursor.execute("""
+            ALTER TABLE indexed_pages
+                ADD COLUMN updated_at TIMESTAMP(3) NOT NULL
+                    DEFAULT CURRENT_TIMESTAMP(3) ON UPDATE CURRENT_TIMESTAMP(3),
+                ADD KEY updated_at_key (updated_at, id)
+        """)
+    # Documents are indexed_pages rows, identified by their integer id
+    db_cursor.execute("""
+        CREATE TABLE IF NOT EXISTS index_docs (
+            doc_id INT PRIMARY KEY,
+            url TEXT NOT NULL,
+            updated_at DATETIME(3) NOT NULL,
+            length INT NOT NULL,
+            KEY updated_at_key (updated_at)
+        )
+    """)
+    db_cursor.execute("""
+        CREATE TABLE IF NOT EXISTS terms (
+            term_id INT AUTO_INCREMENT PRIMARY KEY,
+            term VARCHAR(255) NOT NULL,
+            doc_freq INT NOT NULL DEFAULT 0,
+            UNIQUE KEY term_key (term)
+        )
+    """)
+    # Clustered on (term_id, doc_id), so a term's postings are stored sorted by doc ID
+    db_cursor.execute("""
+        CREATE TABLE IF NOT EXISTS postings (
+            term_id INT NOT NULL,
+            doc_id INT NOT NULL,
+            tf INT NOT NULL,
+            positions MEDIUMBLOB NOT NULL,
+            PRIMARY KEY (term_id, doc_id),
+            KEY doc_key (doc_id)
+        )
+    """)
+    # Document count and total length for BM25, kept so search does not scan index_docs
+    db_cursor.execute("""
+        CREATE TABLE IF NOT EXISTS index_stats (
+            id TINYINT PRIMARY KEY,
+            docs INT NOT NULL,
+            total_length BIGINT NOT NULL
+        )
+    """)
+    schema_ready = True
 
-        db_cursor.execute("SELECT url, content FROM indexed_pages")
-        for url, content in db_cursor.fetchall():
-            words = re.findall(r'\b[a-zA-Z]{3,}\b', content.lower())
-            for word in set(words):
-                inverted[word].add(url)
+def in_chunks(rows, size_of):
+    # executemany folds INSERTs into one multi-row statement; keep each under the packet limit
+    chunk, size = [], 0
+    for row in rows:
+        if chunk and size + size_of(row) > MAX_STATEMENT_BYTES:
+            yield chunk
+            chunk, size = [], 0
+        chunk.append(row)
+        size += size_of(row)
+    if chunk:
+        yield chunk
 
-        return dict(inverted)
-    except Exception as e:
-        print(f"[MONITOR] Error in build_inverted_index: {e}")
-        reconnect_db()
-        return {}
+def placeholders(values):
+    return ", ".join(["%s"] * len(values))
 
-def update_keyword_index():
-    global db, db_cursor
-    print("[MONITOR] Rebuilding keyword inverted index...")
+# === Postings Deltas
+def term_ids(terms):
+    """{term: term_id}, adding the terms not in the dictionary yet."""
+    terms = sorted(terms)
+    ids = {}
+    for i in range(0, len(terms), 1000):
+        chunk = terms[i:i + 1000]
+        db_cursor.execute(f"SELECT term, term_id FROM terms WHERE term IN ({placeholders(chunk)})", chunk)
+        ids.update(db_cursor.fetchall())
+    missing = [term for term in terms if term not in ids]
+    # Only one monitor holds the lock, so new terms are not inserted twice (IGNORE covers stray races)
+    for chunk in in_chunks([(term,) for term in missing], lambda row: len(row[0]) + 8):
+        db_cursor.executemany("INSERT IGNORE INTO terms (term, doc_freq) VALUES (%s, 0)", chunk)
+    for i in range(0, len(missing), 1000):
+        chunk = missing[i:i + 1000]
+        db_cursor.execute(f"SELECT term, term_id FROM terms WHERE term IN ({placeholders(chunk)})", chunk)
+        ids.update(db_cursor.fetchall())
+    return ids
 
-    inverted_index = build_inverted_index()
+def retract_docs(doc_ids, doc_freqs):
+    """Delete the postings of these docs; returns (docs, total length) they held in index_stats."""
+    db_cursor.execute(f"""
+        SELECT p.term_id, t.term, COUNT(*) FROM postings p
+        JOIN terms t ON t.term_id = p.term_id
+        WHERE p.doc_id IN ({placeholders(doc_ids)})
+        GROUP BY p.term_id, t.term
+    """, doc_ids)
+    for term_id, term, count in db_cursor.fetchall():
+        doc_freqs[term_id, term] -= count
+    db_cursor.execute(f"SELECT COUNT(*), COALESCE(SUM(length), 0) FROM index_docs WHERE doc_id IN ({placeholders(doc_ids)})",
+                      doc_ids)
+    docs, length = db_cursor.fetchone()
+    db_cursor.execute(f"DELETE FROM postings WHERE doc_id IN ({placeholders(doc_ids)})", doc_ids)
+    return docs, int(length)
 
-    try:
-        db_cursor.execute("DELETE FROM keyword_index")
+def update_doc_freqs(doc_freqs):
+    rows = [(term_id, term, delta) for (term_id, term), delta in doc_freqs.items() if delta]
+    for chunk in in_chunks(rows, lambda row: len(row[1]) + 24):
+        db_cursor.executemany("""
+            INSERT INTO terms (term_id, term, doc_freq) VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE doc_freq = doc_freq + VALUES(doc_freq)
+        """, chunk)
+    # Terms no page uses any more leave the dictionary
+    emptied = [term_id for term_id, _, delta in rows if delta < 0]
+    for i in range(0, len(emptied), 1000):
+        chunk = emptied[i:i + 1000]
+        db_cursor.execute(f"DELETE FROM terms WHERE term_id IN ({placeholders(chunk)}) AND doc_freq <= 0", chunk)
+
+def update_stats(docs, length):
+    if docs or length:
+        db_cursor.execute("""
+            INSERT INTO index_stats (id, docs, total_length) VALUES (1, %s, %s)
+            ON DUPLICATE KEY UPDATE docs = docs + VALUES(docs), total_length = total_length + VALUES(total_length)
+        """, (docs, length))
+
+def apply_batch(rows):
+    # rows: (id, url, content, updated_at) of pages changed since the high-water mark
+    db_cursor.execute(f"SELECT doc_id, updated_at FROM index_docs WHERE doc_id IN ({placeholders(rows)})",
+                      [row[0] for row in rows])
+    known = dict(db_cursor.fetchall())
+
+    docs = []
+    for page_id, url, content, updated_at in rows:
+        if known.get(page_id) == updated_at:
+            continue  # already applied (the overlap window re-reads recent rows)
+        positions, length = term_positions(content)
+        docs.append((page_id, url, updated_at, positions, length))
+    if not docs:
+        return 0
+
+    doc_freqs = Counter()
+    old_docs, old_length = retract_docs([doc[0] for doc in docs], doc_freqs)
+    ids = term_ids({term for doc in docs for term in doc[3]})
+    postings = []
+    for page_id, _, _, positions, _ in docs:
+        for term, offsets in positions.items():
+            postings.append((ids[term], page_id, len(offsets), encode_positions(offsets)))
+            doc_freqs[ids[term], term] += 1
+    postings.sort()
+    for chunk in in_chunks(postings, lambda row: len(row[3]) + 32):
+        db_cursor.executemany("INSERT INTO postings (term_id, doc_id, tf, positions) VALUES (%s, %s, %s, %s)", chunk)
+    update_doc_freqs(doc_freqs)
+    update_stats(len(docs) - old_docs, sum(doc[4] for doc in docs) - old_length)
+
+    for chunk in in_chunks([(doc[0], doc[1], doc[2], doc[4]) for doc in docs], lambda doc: len(doc[1]) + 32):
+        db_cursor.executemany("""
+            INSERT INTO index_docs (doc_id, url, updated_at, length) VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE url = VALUES(url), updated_at = VALUES(updated_at), length = VALUES(length)
+        """, chunk)
+    return len(docs)
+
+def apply_changes():
+    db_cursor.execute("SELECT MAX(updated_at) FROM index_docs")
+    watermark = db_cursor.fetchone()[0]
+    if watermark is None:
+        # First incremental pass: build from scratch instead of merging into an old full rebuild
+        print("[MONITOR] No postings state yet, building the keyword index from scratch...")
+        for table in ("postings", "terms", "index_stats"):
+            db_cursor.execute(f"DELETE FROM {table}")
+        position = (EPOCH, 0)
+    else:
+        position = (watermark - timedelta(seconds=KEYWORD_OVERLAP_SECONDS), 0)
+
+    applied = 0
+    while True:
+        db_cursor.execute("""
+            SELECT id, url, content, updated_at FROM indexed_pages
+            WHERE (updated_at, id) > (%s, %s)
+            ORDER BY updated_at, id
+            LIMIT %s
+        """, (*position, KEYWORD_BATCH_DOCS))
+        rows = db_cursor.fetchall()
+        if not rows:
+            return applied
+        position = (rows[-1][3], rows[-1][0])
+        applied += apply_batch(rows)
         db.commit()
 
-        for keyword, urls in inverted_index.items():
-            urls_json = json.dumps(list(urls))
-            try:
-                db_cursor.execute("INSERT INTO keyword_index (keyword, urls) VALUES (%s, %s)", (keyword, urls_json))
-            except Exception as e:
-                print(f"[MONITOR] Failed inserting {keyword}: {e}")
+def sweep_deleted_pages():
+    # Pages leave indexed_pages without touching updated_at (near-duplicate collapse): retract them
+    global last_sweep
+    if time.monotonic() - last_sweep < KEYWORD_SWEEP_INTERVAL:
+        return 0
+    last_sweep = time.monotonic()
+    db_cursor.execute("""
+        SELECT d.doc_id FROM index_docs d
+        LEFT JOIN indexed_pages p ON p.id = d.doc_id
+        WHERE p.id IS NULL
+    """)
+    gone = [row[0] for row in db_cursor.fetchall()]
+    for i in range(0, len(gone), KEYWORD_BATCH_DOCS):
+        chunk = gone[i:i + KEYWORD_BATCH_DOCS]
+        doc_freqs = Counter()
+        docs, length = retract_docs(chunk, doc_freqs)
+        update_doc_freqs(doc_freqs)
+        update_stats(-docs, -length)
+        db_cursor.execute(f"DELETE FROM index_docs WHERE doc_id IN ({placeholders(chunk)})", chunk)
         db.commit()
-        print("[MONITOR] ✅ Keyword inverted index updated.")
-    except Exception as e:
-        print(f"[MONITOR] Error in update_keyword_index: {e}")
-        reconnect_db()
+    return len(gone)
 
-def get_last_change_signature():
+def update_keyword_index():
+    """Bring the postings tables up to date with indexed_pages; returns the number of pages applied."""
     global db, db_cursor
     try:
         db.ping(reconnect=True, attempts=1, delay=0)
-        db_cursor.execute("SELECT COUNT(*), MAX(id) FROM indexed_pages")
-        return db_cursor.fetchone()
+        # Both indexers start a monitor; only one may merge postings at a time
+        db_cursor.execute("SELECT GET_LOCK('keyword_index', 0)")
+        if not db_cursor.fetchone()[0]:
+            print("[MONITOR] Another monitor is updating the keyword index, skipping this pass.")
+            return 0
+        try:
+            ensure_schema()
+            applied = apply_changes()
+            removed = sweep_deleted_pages()
+        finally:
+            db_cursor.execute("SELECT RELEASE_LOCK('keyword_index')")
+            db_cursor.fetchone()
+        if applied or removed:
+            print(f"[MONITOR] ✅ Keyword inverted index updated: {applied} pages changed, {removed} removed.")
+        return applied + removed
     except Exception as e:
-        print(f"[MONITOR] Error in get_last_change_signature: {e}")
+        print(f"[MONITOR] Error in update_keyword_index: {e}")
         reconnect_db()
-        return (0, 0)
+        return 0
 
 def reconnect_db():
     global db, db_cursor
@@ -81,15 +268,10 @@ def reconnect_db():
 # === Monitor Loop
 def monitor_index(interval=3):
     print(f"[MONITOR] Watching for updates... (every {interval}s)")
-    last_signature = get_last_change_signature()
 
     while True:
         try:
-            current_signature = get_last_change_signature()
-            if current_signature != last_signature:
-                update_keyword_index()
-                last_signature = current_signature
-            else:
+            if not update_keyword_index():
                 print("[MONITOR] No change detected.")
             time.sleep(interval)
         except Exception as e:
@@ -1,12 +1,21 @@
+import os
+import sys
 import subprocess
-import boto3
-import mysql.connector
 import threading
 import time
 import uuid
-import requests
 import socket
-from bs4 import BeautifulSoup
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import codec, metrics
+from common.autoscale import WorkerPool
+from common.config import INDEXER_PRIMARIES, INDEXER_MIN_THREADS, INDEXER_THREADS, INDEXER_QUEUE_URL
+from common.extract import extract
+from common.http_client import get_http_client, init_http_client
+from common.index_writer import get_index_writer, init_index_writer
+from common.leases import StandbyLease
+from common.queues import approximate_depth, get_queue_client
+from common.sqs_batch import BatchingSQS
 
 # === Constants ===
 MASTER_API = "http://172.31.21.118:5000"
@@ -33,24 +42,18 @@ thread_status_map = {}
 lock = threading.Lock()
 stop_event = threading.Event()
 
-# === AWS SQS ===
-sqs = boto3.client('sqs', region_name='eu-north-1')
-indexer_queue_url = 'https://sqs.eu-north-1.amazonaws.com/441832714601/IndexerQueueStandard'
+# === Queues (QUEUE_BACKEND) ===
+queue = BatchingSQS(get_queue_client(), tag="INDEXER2")
+indexer_queue_url = INDEXER_QUEUE_URL
 
 # === Clean HTML ===
 def clean_html(html):
-    soup = BeautifulSoup(html, "html.parser")
-    for tag in soup(["script", "style"]):
-        tag.decompose()
-    return soup.get_text(separator=" ", strip=True)
+    # Only for messages from crawlers that still ship raw HTML
+    return extract(html)
 
 # === Fault Tolerance Activation ===
-def should_run():
-    try:
-        res = requests.get(f"{MASTER_API}/api/indexer1-status", timeout=3)
-        return not res.json().get("active", True)
-    except:
-        return False  # If master not reachable, stay idle for safety
+# Active only while the master has granted a standby lease (fewer than INDEXER_PRIMARIES indexers alive)
+standby = StandbyLease(MASTER_API, NODE_ID, NODE_ROLE, INDEXER_PRIMARIES, tag="INDEXER2")
 
 # === Heartbeat ===
 def send_heartbeat():
@@ -64,35 +67,33 @@ def send_heartbeat():
                     "ip": NODE_IP,
                     "url_count": urls_indexed,
                     "active_threads": active_threads,
-                    "threads_info": threads_info
+                    "threads_info": threads_info,
+                    "metrics": metrics.collect(),
+                    "lease": standby.heartbeat_field()
                 }
-            requests.post(f"{MASTER_API}/api/heartbeat", json=payload, timeout=3)
+            res = get_http_client().post(f"{MASTER_API}/api/heartbeat", json=payload, timeout=3)
+            standby.apply_reply(res.json())
         except Exception as e:
             print(f"[INDEXER2][HEARTBEAT] Failed: {e}")
         time.sleep(2)
 
 # === Message Processor ===
 def process_message(index):
-    global urls_indexed, active_threads
+    global active_threads
     thread_name = threading.current_thread().name
 
     try:
-        response = sqs.receive_message(
-            QueueUrl=indexer_queue_url,
-            MaxNumberOfMessages=1,
-            WaitTimeSeconds=10
-        )
-
-        if 'Messages' not in response:
+        messages = queue.receive(indexer_queue_url, wait=10)
+        if not messages:
             return
 
-        for message in response['Messages']:
+        for message in messages:
             with lock:
                 active_threads += 1
                 thread_status_map[thread_name] = "Processing message..."
 
             try:
-                data = eval(message['Body'])  # Replace with json.loads if safe
+                data = codec.decode(message['Body'])
                 url = data.get('url')
                 raw_html = data.get('text')
 
@@ -100,68 +101,58 @@ def process_message(index):
                     with lock:
                         thread_status_map[thread_name] = f"Indexing {url}"
 
-                    cleaned_text = clean_html(raw_html)
-
-                    # Safe DB Connection
-                    try:
-                        db = mysql.connector.connect(
-                            host="172.31.28.123",
-                            user="Admin",
-                            password="1234",
-                            database="INDEXER"
-                        )
-                        db.ping(reconnect=True)
-                        cursor = db.cursor()
-                        cursor.execute("""
-                            INSERT INTO indexed_pages (url, content, indexed_obj_id)
-                            VALUES (%s, %s, %s)
-                            ON DUPLICATE KEY UPDATE
-                                content = VALUES(content),
-                                indexed_obj_id = VALUES(indexed_obj_id)
-                        """, (url, cleaned_text, "dummy-id"))
-                        db.commit()
-                        cursor.close()
-                        db.close()
-
-                        with lock:
-                            urls_indexed += 1
-                    except Exception as db_err:
-                        print(f"[INDEXER2][DB ERROR] {db_err}")
-
-                sqs.delete_message(
-                    QueueUrl=indexer_queue_url,
-                    ReceiptHandle=message['ReceiptHandle']
-                )
+                    # Crawlers parse once and ship clean text; only legacy messages need parsing here
+                    page = data if data.get('extracted') else clean_html(raw_html)
+                    # Written behind by the batch writer; the message is deleted once its batch commits
+                    get_index_writer().add(url, page, data.get('content_hash'),
+                                           ack=lambda message=message: acknowledge(message, indexed=True))
+                else:
+                    acknowledge(message, indexed=False)
             except Exception as e:
                 print(f"[INDEXER2] Failed to process: {e}")
             finally:
                 with lock:
                     active_threads -= 1
                     thread_status_map[thread_name] = "Idle"
+        return len(messages)
 
     except Exception as outer:
         print(f"[INDEXER2][SQS ERROR] {outer}")
 
+def acknowledge(message, indexed):
+    global urls_indexed
+    queue.delete(indexer_queue_url, message['ReceiptHandle'])
+    codec.release(message['Body'])
+    if indexed:
+        with lock:
+            urls_indexed += 1
+
 # === Worker Thread ===
 def index_worker(index):
-    while not stop_event.is_set():
-        if should_run():
-            process_message(index)
-        else:
-            with lock:
-                thread_status_map[threading.current_thread().name] = "Standby"
-            time.sleep(2)
+    # Blocks on the lease instead of polling; wakes as soon as it is granted
+    if standby.wait_active(timeout=2):
+        return process_message(index)
+    with lock:
+        thread_status_map[threading.current_thread().name] = "Standby"
+
+def backlog():
+    # On standby the queue's backlog belongs to the primary
+    return approximate_depth(queue.client, indexer_queue_url) if standby.is_active() else 0
 
 # === Entry Point ===
 def main():
     print("[INDEXER2] Standby indexer waiting for Indexer1 failure...")
+    init_http_client(INDEXER_THREADS)
+    init_index_writer("INDEXER2")
+    standby.start()
     index = {}
 
-    threads = []
-    for i in range(2):
-        t = threading.Thread(target=index_worker, args=(index,), name=f"Thread-{i+1}")
-        threads.append(t)
-        t.start()
+    # Sized from the indexer queue's backlog between INDEXER_MIN_THREADS and INDEXER_THREADS
+    workers = WorkerPool(
+        "INDEXER2", lambda: index_worker(index), backlog, INDEXER_MIN_THREADS, INDEXER_THREADS, stop_event,
+        status_map=thread_status_map, lock=lock
+    )
+    workers.start()
 
     hb_thread = threading.Thread(target=send_heartbeat, daemon=True)
     hb_thread.start()
@@ -169,12 +160,12 @@ def main():
     subprocess.Popen(["python3", "auto_index_monitor.py"])
 
     try:
-        for t in threads:
-            t.join()
+        workers.join()
     except KeyboardInterrupt:
         stop_event.set()
-        for t in threads:
-            t.join()
+        workers.join()
+    get_index_writer().close()  # flushes buffered pages; their messages are deleted on commit
+    queue.close()
 
     print("[INDEXER2] Clean exit.")
 
@@ -1,38 +1,210 @@
+import os
+import sys
 from flask import Flask, request, jsonify
-import boto3
 import mysql.connector
 import json
 import re
+import threading
+import time
 import uuid
+from collections import deque
 from datetime import datetime
 
-# NLP & TF-IDF
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.config import CRAWLER_QUEUE_URL, DB_CONFIG, LEASE_WAIT_TIMEOUT, SEGMENT_INDEX_ENABLED
+from common.leases import LeaseTable
+from common.postings import search
+from common.priority import JOB_PRIORITY_SHIFT, queue_for_task
+from common.queues import get_queue_client
+from common.segment_index import SegmentSync, init_segment_index
+from common.urlcanon import canonicalize
+
+# Stop words left out of free-text queries
 import nltk
 from nltk.corpus import stopwords
-from nltk.tokenize import word_tokenize
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
 
-nltk.download('punkt')
 nltk.download('stopwords')
 stop_words = set(stopwords.words('english'))
 
 app = Flask(__name__)
 
-# AWS SQS Setup
-sqs = boto3.client('sqs', region_name='eu-north-1')
-task_queue_url = 'https://sqs.eu-north-1.amazonaws.com/441832714601/TaskQueueStandard'
+# Queues (QUEUE_BACKEND)
+sqs = get_queue_client()
+task_queue_url = CRAWLER_QUEUE_URL
 
 # Local heartbeat cache
 last_known_counts = {}
 
 def get_db():
-    return mysql.connector.connect(
-        host="172.31.28.123",
-        user="Admin",
-        password="1234",
-        database="INDEXER"
+    return mysql.connector.connect(**DB_CONFIG)
+
+# ================= JOBS =================
+JOB_COUNTERS = ("fetched", "failed", "enqueued", "dropped")
+JOB_RATE_WINDOW = 60          # seconds of heartbeat deltas behind pages_per_min
+JOB_IDLE_SECONDS = 300        # no progress for this long: "finished" if everything was processed, else "idle"
+JOB_CANCEL_RETENTION_DAYS = 3 # cancelled IDs are sent to crawlers this long (covers SQS redeliveries)
+
+job_rates = {}  # job_id -> deque[(unix time, fetched delta)]
+job_rates_lock = threading.Lock()
+jobs_table_ready = False
+
+def ensure_jobs_table(cursor):
+    global jobs_table_ready
+    if jobs_table_ready:
+        return
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS crawl_jobs (
+            job_id VARCHAR(64) PRIMARY KEY,
+            seed_url TEXT NOT NULL,
+            max_depth INT NOT NULL,
+            priority VARCHAR(16) NOT NULL,
+            status VARCHAR(16) NOT NULL DEFAULT 'running',
+            fetched BIGINT NOT NULL DEFAULT 0,
+            failed BIGINT NOT NULL DEFAULT 0,
+            enqueued BIGINT NOT NULL DEFAULT 0,
+            dropped BIGINT NOT NULL DEFAULT 0,
+            created_at DATETIME NOT NULL,
+            last_activity DATETIME NULL,
+            cancelled_at DATETIME NULL,
+            KEY status_key (status, cancelled_at)
+        )
+    """)
+    # Last batch of job deltas applied per node, so a resent heartbeat is not counted twice
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS job_batches (
+            node_id VARCHAR(255) PRIMARY KEY,
+            session CHAR(32) NOT NULL,
+            seq BIGINT NOT NULL
+        )
+    """)
+    jobs_table_ready = True
+
+def claim_job_batch(cursor, node_id, batch):
+    # True if this (session, seq) batch is new. Runs in the heartbeat's transaction, so the
+    # claim commits together with the counters; the row lock serializes a node's retries.
+    if not isinstance(batch, dict):
+        return True  # nodes that do not number their batches
+    session, seq = str(batch.get("session")), int(batch.get("seq", 0))
+    cursor.execute("SELECT session, seq FROM job_batches WHERE node_id = %s FOR UPDATE", (node_id,))
+    row = cursor.fetchone()
+    if row and row[0] == session and row[1] >= seq:
+        return False
+    cursor.execute("""
+        INSERT INTO job_batches (node_id, session, seq) VALUES (%s, %s, %s)
+        ON DUPLICATE KEY UPDATE session = VALUES(session), seq = VALUES(seq)
+    """, (node_id, session, seq))
+    return True
+
+def record_job_progress(cursor, jobs):
+    # Nodes send per-job deltas since their previous heartbeat
+    rows = []
+    now = time.time()
+    for job_id, counts in jobs.items():
+        deltas = [int(counts.get(name, 0)) for name in JOB_COUNTERS]
+        rows.append((*deltas, job_id))
+        with job_rates_lock:
+            samples = job_rates.setdefault(job_id, deque())
+            samples.append((now, deltas[0]))
+            while samples and samples[0][0] < now - JOB_RATE_WINDOW:
+                samples.popleft()
+    cursor.executemany("""
+        UPDATE crawl_jobs SET fetched = fetched + %s, failed = failed + %s,
+            enqueued = enqueued + %s, dropped = dropped + %s, last_activity = UTC_TIMESTAMP()
+        WHERE job_id = %s
+    """, rows)
+
+def cancelled_job_ids(cursor):
+    cursor.execute(
+        "SELECT job_id FROM crawl_jobs WHERE status = 'cancelled' AND cancelled_at > UTC_TIMESTAMP() - INTERVAL %s DAY",
+        (JOB_CANCEL_RETENTION_DAYS,)
     )
+    return [row[0] for row in cursor.fetchall()]
+
+def describe_job(row):
+    now = datetime.utcnow()
+    with job_rates_lock:
+        samples = [n for ts, n in job_rates.get(row["job_id"], ()) if ts >= time.time() - JOB_RATE_WINDOW]
+    processed = row["fetched"] + row["failed"] + row["dropped"]
+    state = row["status"]
+    last_activity = row["last_activity"] or row["created_at"]
+    if state == "running" and (now - last_activity).total_seconds() > JOB_IDLE_SECONDS:
+        state = "finished" if processed >= row["enqueued"] else "idle"
+    elapsed = max(1.0, ((row["last_activity"] or now) - row["created_at"]).total_seconds())
+    return {
+        "job_id": row["job_id"],
+        "seed_url": row["seed_url"],
+        "max_depth": row["max_depth"],
+        "priority": row["priority"],
+        "status": state,
+        "fetched": row["fetched"],
+        "failed": row["failed"],
+        "enqueued": row["enqueued"],
+        "dropped": row["dropped"],
+        "pending": max(0, row["enqueued"] - processed),
+        "pages_per_min": round(sum(samples) * 60 / JOB_RATE_WINDOW, 1),
+        "avg_pages_per_min": round(row["fetched"] * 60 / elapsed, 1),
+        "created_at": row["created_at"].strftime("%Y-%m-%d %H:%M:%S"),
+        "last_activity": row["last_activity"].strftime("%Y-%m-%d %H:%M:%S") if row["last_activity"] else None,
+        "cancelled_at": row["cancelled_at"].strftime("%Y-%m-%d %H:%M:%S") if row["cancelled_at"] else None
+    }
+
+@app.route('/api/jobs', methods=['GET'])
+def list_jobs():
+    limit = request.args.get("limit", 50, type=int)
+    try:
+        db = get_db()
+        cursor = db.cursor(dictionary=True)
+        ensure_jobs_table(cursor)
+        cursor.execute("SELECT * FROM crawl_jobs ORDER BY created_at DESC LIMIT %s", (max(1, min(limit, 500)),))
+        return jsonify([describe_job(row) for row in cursor.fetchall()]), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        cursor.close()
+        db.close()
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    try:
+        db = get_db()
+        cursor = db.cursor(dictionary=True)
+        ensure_jobs_table(cursor)
+        cursor.execute("SELECT * FROM crawl_jobs WHERE job_id = %s", (job_id,))
+        row = cursor.fetchone()
+        if row is None:
+            return jsonify({"error": "Unknown job"}), 404
+        return jsonify(describe_job(row)), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        cursor.close()
+        db.close()
+
+@app.route('/api/jobs/<job_id>/cancel', methods=['POST'])
+def cancel_job(job_id):
+    try:
+        db = get_db()
+        cursor = db.cursor()
+        ensure_jobs_table(cursor)
+        cursor.execute(
+            "UPDATE crawl_jobs SET status = 'cancelled', cancelled_at = UTC_TIMESTAMP() "
+            "WHERE job_id = %s AND status = 'running'",
+            (job_id,)
+        )
+        db.commit()
+        if cursor.rowcount == 0:
+            cursor.execute("SELECT status FROM crawl_jobs WHERE job_id = %s", (job_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return jsonify({"error": "Unknown job"}), 404
+            return jsonify({"message": f"Job {job_id} is already {row[0]}"}), 200
+        # Crawlers learn about it from their next heartbeat reply and drop the job's tasks
+        return jsonify({"message": f"Job {job_id} cancelled"}), 200
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+    finally:
+        cursor.close()
+        db.close()
 
 # ================= HEARTBEAT =================
 @app.route('/api/heartbeat', methods=['POST'])
@@ -43,10 +215,17 @@ def receive_heartbeat():
     ip = data.get("ip")
     url_count = data.get("url_count", 0)
     threads_info = data.get("threads_info", [])
+    node_metrics = data.get("metrics", {})
+    jobs = data.get("jobs") or {}
+    jobs_batch = data.get("jobs_batch")
 
     if not all([node_id, role, ip]):
         return jsonify({"error": "Missing fields"}), 400
 
+    # Renewed before any database work so failover does not depend on MySQL being healthy
+    lease = renew_lease(node_id, role, data.get("lease"))
+
+    db = cursor = None
     try:
         db = get_db()
         cursor = db.cursor()
@@ -58,20 +237,28 @@ def receive_heartbeat():
                 ip = VALUES(ip),
                 url_count = VALUES(url_count)
         """, (node_id, role, ip, url_count))
+        ensure_jobs_table(cursor)
+        if jobs and claim_job_batch(cursor, node_id, jobs_batch):
+            record_job_progress(cursor, jobs)
         db.commit()
+        cancelled = cancelled_job_ids(cursor)
 
         last_known_counts[node_id] = {
             "url_count": url_count,
             "last_seen": datetime.utcnow(),
-            "threads_info": threads_info
+            "threads_info": threads_info,
+            "metrics": node_metrics
         }
 
-        return jsonify({"message": "Heartbeat received"}), 200
+        return jsonify({"message": "Heartbeat received", "cancelled_jobs": cancelled, "lease": lease,
+                        "jobs_ack": jobs_batch}), 200
     except Exception as e:
-        return jsonify({"error": str(e)}), 500
+        return jsonify({"error": str(e), "lease": lease}), 500
     finally:
-        cursor.close()
-        db.close()
+        if cursor is not None:
+            cursor.close()
+        if db is not None:
+            db.close()
 
 # ================= STATUS =================
 @app.route('/api/status', methods=['GET'])
@@ -110,6 +297,8 @@ def get_status():
                 cached = last_known_counts.get(node_id)
                 if cached and "threads_info" in cached:
                     item["threads_info"] = cached["threads_info"]
+                if cached and cached.get("metrics"):
+                    item["metrics"] = cached["metrics"]
 
             result.append(item)
 
@@ -120,93 +309,82 @@ def get_status():
         cursor.close()
         db.close()
 
-# ================= STATIC FALLBACK ENDPOINTS =================
+# ================= LEASES =================
+# Failover: primaries renew a lease in every heartbeat; standbys long-poll /api/leases/wait
+leases = LeaseTable()
+
+def renew_lease(node_id, role, lease):
+    if not isinstance(lease, dict) or not lease.get("name"):
+        return None
+    held = leases.renew(node_id, role, lease["name"], standby=bool(lease.get("standby")))
+    return {"name": lease["name"], "held": held}
+
+@app.route("/api/leases", methods=["GET"])
+def list_leases():
+    # Lease table plus recent failovers with their latency
+    return jsonify(leases.snapshot()), 200
+
+@app.route("/api/leases/wait", methods=["GET"])
+def wait_for_lease():
+    role = request.args.get("role")
+    node_id = request.args.get("node_id")
+    if not role or not node_id:
+        return jsonify({"error": "role and node_id are required"}), 400
+    min_active = request.args.get("min_active", 1, type=int)
+    timeout = min(request.args.get("timeout", LEASE_WAIT_TIMEOUT, type=float), 60)
+    return jsonify(leases.wait(role, node_id, min_active, timeout)), 200
+
+# ================= SEARCH (BM25 over postings) =================
+NO_SUCH_TABLE = 1146
+
+# Local mmap'd segment copy of the postings; MySQL answers until its first sync completes
+segment_index = segment_sync = None
+
+def start_segment_sync():
+    """Open the segment index and start following the postings; call once at start-up, not on import."""
+    global segment_index, segment_sync
+    if SEGMENT_INDEX_ENABLED and segment_sync is None:
+        segment_index = init_segment_index()
+        segment_sync = SegmentSync(segment_index, get_db).start()
 
-@app.route("/api/crawler1-status", methods=["GET"])
-def crawler1_status():
-    try:
-        for node_id, info in last_known_counts.items():
-            if "ip-172-31-29-60" in node_id.lower():
-                time_diff = (datetime.utcnow() - info["last_seen"]).total_seconds()
-                return jsonify({"active": time_diff <= 4})
-        return jsonify({"active": False})
-    except:
-        return jsonify({"active": False})
-
-@app.route("/api/crawler2-status", methods=["GET"])
-def crawler2_status():
-    try:
-        for node_id, info in last_known_counts.items():
-            if "ip-172-31-10-236" in node_id.lower():
-                time_diff = (datetime.utcnow() - info["last_seen"]).total_seconds()
-                return jsonify({"active": time_diff <= 4})
-        return jsonify({"active": False})
-    except:
-        return jsonify({"active": False})
-
-@app.route("/api/indexer1-status", methods=["GET"])
-def indexer1_status():
-    try:
-        for node_id, info in last_known_counts.items():
-            if "ip-172-31-29-127" in node_id.lower():
-                time_diff = (datetime.utcnow() - info["last_seen"]).total_seconds()
-                return jsonify({"active": time_diff <= 5})
-        return jsonify({"active": False})
-    except:
-        return jsonify({"active": False})
-
-# ================= SEARCH (TF-IDF) =================
 @app.route('/api/search', methods=['GET'])
 def search_keyword():
     query = request.args.get('keyword', '').strip().lower()
     if not query:
         return jsonify({'error': 'Keyword is required'}), 400
 
+    if segment_index is not None and segment_index.ready:
+        try:
+            return jsonify({'keyword': query, 'urls': segment_index.search(query, stop_words, limit=20)})
+        except Exception as e:
+            return jsonify({'error': str(e)}), 500
+
+    db = cursor = None
     try:
         db = get_db()
-        cursor = db.cursor(dictionary=True)
-        cursor.execute("SELECT url, content FROM indexed_pages")
-        pages = cursor.fetchall()
-
-        urls = []
-        docs = []
-        for page in pages:
-            text = page["content"]
-            if text and text.strip():
-                urls.append(page["url"])
-                docs.append(text)
-
-        if not docs:
-            return jsonify({'keyword': query, 'urls': []})
-
-        def tokenize(text):
-            tokens = word_tokenize(text.lower())
-            return ' '.join([w for w in tokens if w.isalnum() and w not in stop_words])
-
-        clean_docs = [tokenize(doc) for doc in docs]
-        clean_query = tokenize(query)
-
-        vectorizer = TfidfVectorizer()
-        doc_vectors = vectorizer.fit_transform(clean_docs + [clean_query])
-        cosine_scores = cosine_similarity(doc_vectors[-1], doc_vectors[:-1]).flatten()
-
-        results = sorted(zip(urls, cosine_scores), key=lambda x: x[1], reverse=True)
-        filtered = [url for url, score in results if score > 0.05][:20]
-        return jsonify({'keyword': query, 'urls': filtered})
+        cursor = db.cursor()
+        return jsonify({'keyword': query, 'urls': search(cursor, query, stop_words, limit=20)})
     except Exception as e:
+        if getattr(e, 'errno', None) == NO_SUCH_TABLE:
+            # auto_index_monitor has not built the postings tables yet
+            return jsonify({'keyword': query, 'urls': []})
         return jsonify({'error': str(e)}), 500
     finally:
-        cursor.close()
-        db.close()
+        if cursor is not None:
+            cursor.close()
+        if db is not None:
+            db.close()
 
-# ================= CRAWL =================
-def adjust_url(url):
-    if not url.startswith('http'):
-        url = 'https://' + url
-    return url
+@app.route('/api/index/segments', methods=['GET'])
+def segment_status():
+    if segment_index is None:
+        return jsonify({'enabled': False})
+    return jsonify(segment_index.snapshot())
 
+# ================= CRAWL =================
 def is_valid_url(string):
-    url_pattern = re.compile(r'^(https?://)?([a-zA-Z0-9-]+\.)+[a-zA-Z]{2,}(/.*)?$')
+    # \w keeps internationalized hostnames; canonicalize() converts them to IDNA
+    url_pattern = re.compile(r'^(https?://)?([\w-]+\.)+[^\W\d_]{2,}(:\d+)?([/?#].*)?$', re.IGNORECASE)
     return bool(url_pattern.match(string))
 
 @app.route('/api/crawl', methods=['POST'])
@@ -215,17 +393,19 @@ def submit_url():
     url = data.get('url', '').strip()
     max_depth = data.get('max_depth', 2)
     restrict_domain = data.get('domain_restricted', False)
+    priority = data.get('priority', 'normal')
+    if priority not in JOB_PRIORITY_SHIFT:
+        return jsonify({'error': f"priority must be one of {', '.join(JOB_PRIORITY_SHIFT)}"}), 400
 
     try:
         max_depth = int(max_depth)
     except ValueError:
         max_depth = 2
 
-    if not url or not is_valid_url(url):
+    url = canonicalize(url) if url and is_valid_url(url) else None
+    if not url:
         return jsonify({'error': 'Invalid URL'}), 400
 
-    url = adjust_url(url)
-
     try:
         domain_prefix = url.split('/')[0] + '//' + url.split('/')[2] if restrict_domain else None
 
@@ -234,15 +414,32 @@ def submit_url():
             "depth": 0,
             "max_depth": max_depth,
             "restrict_domain": restrict_domain,
-            "domain_prefix": domain_prefix
+            "domain_prefix": domain_prefix,
+            "job_id": uuid.uuid4().hex,  # scopes the crawlers' seen-URL set to this submission
+            "priority": priority
         }
 
+        db = get_db()
+        cursor = db.cursor()
+        try:
+            ensure_jobs_table(cursor)
+            # The seed counts as the job's first enqueued URL; crawlers report the rest
+            cursor.execute("""
+                INSERT INTO crawl_jobs (job_id, seed_url, max_depth, priority, status, enqueued, created_at)
+                VALUES (%s, %s, %s, %s, 'running', 1, UTC_TIMESTAMP())
+            """, (payload["job_id"], url, max_depth, priority))
+            db.commit()
+        finally:
+            cursor.close()
+            db.close()
+
         sqs.send_message(
-            QueueUrl=task_queue_url,
+            QueueUrl=queue_for_task(task_queue_url, payload),
             MessageBody=json.dumps(payload)
         )
         return jsonify({
-            'message': f"URL '{url}' submitted for crawling with max depth {max_depth}. Domain restriction: {restrict_domain}"
+            'message': f"URL '{url}' submitted for crawling with max depth {max_depth}. Domain restriction: {restrict_domain}",
+            'job_id': payload["job_id"]
         }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -253,4 +450,5 @@ def ping():
     return "pong", 200
 
 if __name__ == "__main__":
+    start_segment_sync()
     app.run(host='0.0.0.0', port=5000, debug=False)
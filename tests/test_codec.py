@@ -0,0 +1,122 @@
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import codec
+from common.blobstore import LocalBlobStore
+
+
+TASK = {"url": "http://a.example/page", "depth": 1, "max_depth": 3, "job_id": "job-1"}
+PAGE = {"url": "http://a.example/page", "title": "Page", "text": "words " * 2000}
+
+
+class RoundTripTest(unittest.TestCase):
+    def settings(self, serializer, compression):
+        for name, value in (("MESSAGE_SERIALIZER", serializer), ("MESSAGE_COMPRESSION", compression)):
+            patcher = mock.patch.object(codec, name, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_every_serializer_and_compression(self):
+        for serializer in ("json", "msgpack"):
+            for compression in ("none", "zlib", "zstd"):
+                with self.subTest(serializer=serializer, compression=compression):
+                    self.settings(serializer, compression)
+                    for obj in (TASK, PAGE):
+                        body = codec.encode(obj)
+                        self.assertTrue(body.startswith(codec.PREFIX))
+                        self.assertEqual(codec.decode(body), obj)
+
+    def test_large_payloads_are_compressed(self):
+        self.settings("json", "zlib")
+        self.assertLess(len(codec.encode(PAGE)), len(PAGE["text"]) // 4)
+        frame = codec._from_body(codec.encode(TASK))
+        self.assertEqual((frame[0] >> 2) & 3, codec.COMP_NONE)  # below MESSAGE_COMPRESS_MIN
+
+    def test_decodes_legacy_bodies(self):
+        self.assertEqual(codec.decode('{"url": "http://a.example/"}'), {"url": "http://a.example/"})
+        self.assertEqual(codec.decode(str(TASK)), TASK)
+        with self.assertRaises(ValueError):
+            codec.decode("__import__('os').system('true')")
+
+
+class LocalBlobStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.store = LocalBlobStore(os.path.join(self.directory, "blobs"))
+
+    def test_put_get_delete(self):
+        key = self.store.put(b"frame")
+        self.assertEqual(self.store.get(key), b"frame")
+        self.store.delete(key)
+        self.store.delete(key)  # already gone: no error
+        with self.assertRaises(FileNotFoundError):
+            self.store.get(key)
+
+    def test_rejects_keys_outside_the_store(self):
+        victim = os.path.join(self.directory, "victim")
+        with open(victim, "wb") as f:
+            f.write(b"keep me")
+        for key in ("../victim", victim, "../" * 8 + "etc/passwd", "a" * 31, "A" * 32, "", None):
+            with self.assertRaises(ValueError):
+                self.store.get(key)
+            with self.assertRaises(ValueError):
+                self.store.delete(key)
+        self.assertTrue(os.path.exists(victim))
+
+
+class BlobPointerTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, ignore_errors=True)
+        self.store = LocalBlobStore(os.path.join(self.directory, "blobs"))
+        patcher = mock.patch.object(codec, "get_blob_store", return_value=self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def offloaded(self, obj):
+        with mock.patch.object(codec, "MESSAGE_MAX_BYTES", 64):
+            return codec.encode(obj)
+
+    def blobs(self):
+        return os.listdir(self.store.root)
+
+    def test_oversized_message_goes_through_the_blob_store(self):
+        body = self.offloaded(PAGE)
+        self.assertLess(len(body), 64)
+        self.assertEqual(codec._from_body(body)[0], codec.FLAG_BLOB)
+        self.assertEqual(len(self.blobs()), 1)
+        self.assertEqual(codec.decode(body), PAGE)
+        self.assertEqual(codec.decode(body), PAGE)  # redelivered before release: still readable
+
+        codec.release(body)
+        self.assertEqual(self.blobs(), [])
+        codec.release(body)  # a second release (redelivery) is harmless
+        with self.assertRaises(FileNotFoundError):
+            codec.decode(body)
+
+    def test_release_ignores_inline_and_legacy_bodies(self):
+        self.offloaded(PAGE)
+        codec.release(codec.encode(TASK))
+        codec.release(str(TASK))
+        self.assertEqual(len(self.blobs()), 1)
+
+    def test_crafted_pointer_is_rejected(self):
+        victim = os.path.join(self.directory, "victim")
+        with open(victim, "wb") as f:
+            f.write(b"keep me")
+        body = codec._to_body(bytes([codec.FLAG_BLOB]) + b"../victim")
+        with self.assertRaises(ValueError):
+            codec.decode(body)
+        with self.assertRaises(ValueError):
+            codec.release(body)
+        self.assertTrue(os.path.exists(victim))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,80 @@
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import crawl_core
+from common.concurrency import ConcurrencyController
+from common.frontier import HostFrontier
+
+
+def item(url, host="a.example"):
+    task = {"url": url, "job_id": "job", "depth": 0}
+    return {"host": host, "task": task, "queue_url": "crawler-queue", "message": {"ReceiptHandle": url}}
+
+
+class CrawlNextSlotTest(unittest.TestCase):
+    def setUp(self):
+        self.controller = ConcurrencyController(maximum=8, initial=4, minimum=1, adaptive=True)
+        self.frontier = HostFrontier(rate=1000, burst=1000, min_delay=0, max_in_flight=8)
+        self.queue = mock.Mock()
+        for target, value in (("get_concurrency", mock.Mock(return_value=self.controller)),
+                              ("should_crawl", mock.Mock(return_value=True))):
+            patcher = mock.patch.object(crawl_core, target, value)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def crawl_next(self, timeout=0.2):
+        return crawl_core.crawl_next(self.queue, "crawler-queue", "indexer-queue", self.frontier,
+                                     lambda status: None, timeout=timeout)
+
+    def test_idle_workers_hold_no_slot(self):
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(self.crawl_next())) for _ in range(6)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=5)
+        self.assertEqual(results, [None] * 6)
+        self.assertEqual(self.controller.in_flight, 0)
+        self.assertEqual(self.controller.window_peak, 0)
+
+    def test_slot_is_held_only_while_crawling(self):
+        seen = []
+
+        def crawl_task(*args):
+            seen.append(self.controller.in_flight)
+
+        self.frontier.put(item("http://a.example/1"))
+        with mock.patch.object(crawl_core, "crawl_task", crawl_task):
+            self.assertTrue(self.crawl_next())
+        self.assertEqual(seen, [1])
+        self.assertEqual(self.controller.in_flight, 0)
+        self.queue.delete.assert_called_once_with("crawler-queue", "http://a.example/1")
+
+    def test_full_node_leaves_items_in_the_frontier(self):
+        for _ in range(int(self.controller.limit)):
+            self.assertTrue(self.controller.acquire(timeout=0))
+        self.frontier.put(item("http://a.example/1"))
+        self.assertIsNone(self.crawl_next(timeout=0.05))
+        self.assertEqual(self.frontier.size, 1)
+        self.queue.delete.assert_not_called()
+
+
+class FrontierRequeueTest(unittest.TestCase):
+    def test_requeued_item_keeps_its_place(self):
+        frontier = HostFrontier(rate=1000, burst=1000, min_delay=0, max_in_flight=1)
+        frontier.put(dict(item("http://a.example/1"), score=2.0))
+        frontier.put(dict(item("http://a.example/2"), score=1.0))
+        first = frontier.get(timeout=0)
+        self.assertEqual(first["task"]["url"], "http://a.example/1")
+        self.assertIsNone(frontier.get(timeout=0))  # the host's one in-flight slot is taken
+        frontier.requeue(first)
+        self.assertEqual(frontier.size, 2)
+        self.assertEqual(frontier.get(timeout=0)["task"]["url"], "http://a.example/1")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,134 @@
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.dedup import MemorySeenStore, MySQLSeenStore, UrlDeduper, url_hash
+
+
+class SqliteCursor:
+    """The few MySQL statements MySQLSeenStore.add_new runs, translated for sqlite3."""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.cursor = connection.db.cursor()
+
+    def execute(self, statement, params=()):
+        self.connection.statements += 1
+        statement = statement.replace("INSERT IGNORE", "INSERT OR IGNORE").replace("%s", "?")
+        self.cursor.execute(statement, tuple(params))
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+    def close(self):
+        self.cursor.close()
+
+
+class SqliteConnection:
+    def __init__(self, path):
+        self.db = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self.db.execute("""
+            CREATE TABLE IF NOT EXISTS seen_urls (
+                job_id TEXT NOT NULL, url_hash BLOB NOT NULL, claim BLOB NULL,
+                PRIMARY KEY (job_id, url_hash)
+            )
+        """)
+        self.db.commit()
+        self.statements = 0
+
+    def cursor(self):
+        return SqliteCursor(self)
+
+    def commit(self):
+        self.db.commit()
+
+
+def digests(*urls):
+    return [url_hash(url) for url in urls]
+
+
+class MySQLSeenStoreTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        self.path = os.path.join(directory, "seen.sqlite3")
+
+    def store(self):
+        connection = SqliteConnection(self.path)
+        store = MySQLSeenStore()
+        patcher = mock.patch.object(store, "_conn", return_value=connection)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        return store, connection
+
+    def test_claims_a_batch_in_two_statements(self):
+        store, connection = self.store()
+        batch = digests(*(f"http://a.example/{i}" for i in range(50)))
+        self.assertEqual(store.add_new("job", batch), batch)
+        self.assertEqual(connection.statements, 2)
+        self.assertEqual(store.add_new("job", batch), [])
+        self.assertEqual(store.add_new("other-job", batch[:3]), batch[:3])
+
+    def test_overlapping_claims_from_two_nodes(self):
+        (first, _), (second, _) = self.store(), self.store()
+        a, b, c, d = digests("http://x/a", "http://x/b", "http://x/c", "http://x/d")
+        self.assertEqual(first.add_new("job", [a, b, c]), [a, b, c])
+        self.assertEqual(second.add_new("job", [b, c, d]), [d])
+        self.assertEqual(first.add_new("job", [a, d]), [])
+
+    def test_concurrent_claims_partition_the_links(self):
+        stores = [self.store()[0] for _ in range(4)]
+        batch = digests(*(f"http://race.example/{i}" for i in range(200)))
+        claimed = []
+        lock = threading.Lock()
+
+        def claim(store):
+            fresh = store.add_new("job", batch)
+            with lock:
+                claimed.extend(fresh)
+
+        threads = [threading.Thread(target=claim, args=(store,)) for store in stores]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=10)
+        self.assertEqual(sorted(claimed), sorted(batch))
+
+
+class UrlDeduperTest(unittest.TestCase):
+    def test_drops_links_seen_before(self):
+        deduper = UrlDeduper(MemorySeenStore(), initial_capacity=100, error_rate=0.001)
+        self.assertEqual(deduper.filter_new("job", ["http://a/1", "http://a/2", "http://a/1"]),
+                         ["http://a/1", "http://a/2"])
+        self.assertEqual(deduper.filter_new("job", ["http://a/2", "http://a/3"]), ["http://a/3"])
+        self.assertEqual(deduper.filter_new("other", ["http://a/2"]), ["http://a/2"])
+        stats = deduper.snapshot()
+        self.assertEqual(stats["new"], 4)
+        self.assertEqual(stats["bloom_hits"], 1)
+        self.assertEqual(stats["jobs"], 2)
+
+    def test_shared_store_catches_links_another_node_saw(self):
+        store = MemorySeenStore()
+        node_a, node_b = UrlDeduper(store), UrlDeduper(store)
+        self.assertEqual(node_a.filter_new("job", ["http://a/1"]), ["http://a/1"])
+        self.assertEqual(node_b.filter_new("job", ["http://a/1", "http://a/2"]), ["http://a/2"])
+        self.assertEqual(node_b.snapshot()["store_hits"], 1)
+
+    def test_store_error_falls_back_to_local_dedup(self):
+        store = mock.Mock()
+        store.add_new.side_effect = OSError("database down")
+        deduper = UrlDeduper(store)
+        with mock.patch("builtins.print"):
+            self.assertEqual(deduper.filter_new("job", ["http://a/1"]), ["http://a/1"])
+        self.assertEqual(deduper.filter_new("job", ["http://a/1"]), [])
+        self.assertEqual(deduper.snapshot()["store_errors"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
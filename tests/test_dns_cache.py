@@ -0,0 +1,123 @@
+import os
+import socket
+import sys
+import threading
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import dns_cache
+from common.dns_cache import DnsCache
+
+
+class StubResolver:
+    """Answers from a dict and counts calls; a missing name fails like getaddrinfo."""
+
+    def __init__(self, answers, gate=None):
+        self.answers = answers
+        self.gate = gate
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def __call__(self, host):
+        with self.lock:
+            self.calls.append(host)
+        if self.gate is not None:
+            self.gate.wait(timeout=5)
+        if host not in self.answers:
+            raise socket.gaierror(socket.EAI_NONAME, f"unknown host {host}")
+        return self.answers[host]
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class DnsCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.clock = Clock()
+        patcher = mock.patch.object(dns_cache.time, "time", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_answer_reused_until_ttl_expires(self):
+        resolver = StubResolver({"example.com": [(socket.AF_INET, "192.0.2.1")]})
+        cache = DnsCache(resolver, ttl=60, negative_ttl=5)
+
+        self.assertEqual(cache.address("example.com"), "192.0.2.1")
+        self.clock.now += 59
+        self.assertEqual(cache.address("Example.COM."), "192.0.2.1")
+        self.assertEqual(resolver.calls, ["example.com"])
+
+        self.clock.now += 1
+        cache.address("example.com")
+        self.assertEqual(resolver.calls, ["example.com", "example.com"])
+
+    def test_failure_cached_for_negative_ttl(self):
+        resolver = StubResolver({})
+        cache = DnsCache(resolver, ttl=60, negative_ttl=5)
+
+        for _ in range(2):
+            with self.assertRaises(socket.gaierror):
+                cache.lookup("missing.example")
+        self.assertEqual(len(resolver.calls), 1)
+
+        self.clock.now += 5
+        with self.assertRaises(socket.gaierror):
+            cache.lookup("missing.example")
+        self.assertEqual(len(resolver.calls), 2)
+
+    def test_concurrent_lookups_resolve_once(self):
+        gate = threading.Event()
+        resolver = StubResolver({"example.com": [(socket.AF_INET, "192.0.2.1")]}, gate=gate)
+        cache = DnsCache(resolver)
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(cache.address("example.com")))
+                   for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        # Hold the first lookup until every other thread is waiting on it
+        deadline = time.monotonic() + 5
+        while cache.snapshot()["coalesced"] < len(threads) - 1 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        gate.set()
+        for thread in threads:
+            thread.join(timeout=5)
+
+        self.assertEqual(resolver.calls, ["example.com"])
+        self.assertEqual(results, ["192.0.2.1"] * len(threads))
+        stats = cache.snapshot()
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["coalesced"], len(threads) - 1)
+
+    def test_heartbeat_counters(self):
+        resolver = StubResolver({"a.example": [(socket.AF_INET, "192.0.2.1")],
+                                 "b.example": [(socket.AF_INET6, "2001:db8::1")]})
+        cache = DnsCache(resolver)
+        cache.address("a.example")
+        cache.address("a.example")
+        cache.address("a.example")
+        cache.address("b.example")
+        for _ in range(2):
+            with self.assertRaises(socket.gaierror):
+                cache.lookup("missing.example")
+        # IP literals never reach the cache
+        self.assertEqual(cache.address("192.0.2.7"), "192.0.2.7")
+
+        stats = cache.snapshot()
+        self.assertEqual(stats["hits"], 2)
+        self.assertEqual(stats["misses"], 3)
+        self.assertEqual(stats["negative_hits"], 1)
+        self.assertEqual(stats["errors"], 1)
+        self.assertEqual(stats["coalesced"], 0)
+        self.assertEqual(stats["hosts"], 3)
+        self.assertEqual(stats["hit_ratio"], round(3 / 6, 3))
+
+
+if __name__ == "__main__":
+    unittest.main()
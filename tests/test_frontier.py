@@ -0,0 +1,111 @@
+import os
+import sys
+import time
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.frontier import HostFrontier
+
+
+def item(host, path, **fields):
+    return dict(host=host, task={"url": f"http://{host}/{path}"}, **fields)
+
+
+def urls(items):
+    return [entry["task"]["url"] for entry in items]
+
+
+class HostFrontierTest(unittest.TestCase):
+    def frontier(self, rate=1000, burst=1000, min_delay=0, max_in_flight=8, **options):
+        return HostFrontier(rate=rate, burst=burst, min_delay=min_delay, max_in_flight=max_in_flight, **options)
+
+    def drain(self, frontier):
+        taken = []
+        while True:
+            entry = frontier.get(timeout=0)
+            if entry is None:
+                return taken
+            taken.append(entry)
+
+    def test_hosts_take_turns(self):
+        frontier = self.frontier()
+        for path in ("1", "2", "3"):
+            frontier.put(item("a.example", path))
+        frontier.put(item("b.example", "1"))
+        frontier.put(item("c.example", "1"))
+        self.assertEqual(urls(self.drain(frontier)), [
+            "http://a.example/1", "http://b.example/1", "http://c.example/1",
+            "http://a.example/2", "http://a.example/3",
+        ])
+
+    def test_min_delay_between_fetches_of_one_host(self):
+        frontier = self.frontier(min_delay=0.2)
+        frontier.put(item("a.example", "1"))
+        frontier.put(item("a.example", "2"))
+        frontier.put(item("b.example", "1"))
+        self.assertEqual(urls(self.drain(frontier)), ["http://a.example/1", "http://b.example/1"])
+
+        entry, wait = frontier.poll()
+        self.assertIsNone(entry)
+        self.assertGreater(wait, 0.1)
+        self.assertLessEqual(wait, 0.2)
+
+        started = time.monotonic()
+        self.assertEqual(frontier.get(timeout=1)["task"]["url"], "http://a.example/2")
+        self.assertGreaterEqual(time.monotonic() - started, wait - 0.01)
+
+    def test_crawl_delay_override_never_lowers_the_default(self):
+        frontier = self.frontier(min_delay=0.1)
+        frontier.set_min_delay("a.example", 5)
+        frontier.set_min_delay("b.example", 0)
+        self.assertEqual(frontier.hosts["a.example"].min_delay, 5)
+        self.assertEqual(frontier.hosts["b.example"].min_delay, 0.1)
+
+    def test_token_bucket_limits_the_rate(self):
+        frontier = self.frontier(rate=10, burst=2)
+        for path in "1234":
+            frontier.put(item("a.example", path))
+        self.assertEqual(len(self.drain(frontier)), 2)  # the burst
+        _, wait = frontier.poll()
+        self.assertAlmostEqual(wait, 0.1, delta=0.02)
+
+    def test_in_flight_cap_per_host(self):
+        frontier = self.frontier(max_in_flight=2)
+        for path in "123":
+            frontier.put(item("a.example", path))
+        self.assertEqual(len(self.drain(frontier)), 2)
+        self.assertEqual(frontier.poll(), (None, None))  # nothing will free up on its own
+        frontier.done("a.example")
+        self.assertEqual(frontier.get(timeout=0)["task"]["url"], "http://a.example/3")
+        self.assertEqual(frontier.hosts["a.example"].fetched, 1)
+
+    def test_host_limit_below_one_stretches_the_delay(self):
+        frontier = self.frontier(min_delay=0.1, host_limit=lambda host: 0.25 if host == "slow.example" else 8)
+        for host in ("slow.example", "fast.example"):
+            frontier.put(item(host, "1"))
+            frontier.put(item(host, "2"))
+            frontier.get(timeout=0)
+            frontier.done(host)
+        now = time.monotonic()
+        self.assertAlmostEqual(frontier.hosts["slow.example"].next_allowed - now, 0.4, delta=0.05)
+        self.assertAlmostEqual(frontier.hosts["fast.example"].next_allowed - now, 0.1, delta=0.05)
+
+    def test_best_score_first_within_a_host(self):
+        frontier = self.frontier()
+        frontier.put(item("a.example", "low", score=0.1))
+        frontier.put(item("a.example", "high", score=0.9))
+        frontier.put(item("a.example", "mid", score=0.5))
+        self.assertEqual(urls(self.drain(frontier)),
+                         ["http://a.example/high", "http://a.example/mid", "http://a.example/low"])
+
+    def test_per_host_queue_is_bounded(self):
+        frontier = self.frontier(max_per_host=2)
+        self.assertTrue(frontier.put(item("a.example", "1")))
+        self.assertTrue(frontier.put(item("a.example", "2")))
+        self.assertFalse(frontier.put(item("a.example", "3")))
+        self.assertTrue(frontier.put(item("b.example", "1")))
+        self.assertEqual(frontier.size, 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
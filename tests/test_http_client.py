@@ -0,0 +1,108 @@
+import os
+import shutil
+import socket
+import ssl
+import subprocess
+import sys
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import http_client
+from common.dns_cache import DnsCache
+from common.http_client import HttpClient
+
+HOSTNAME = "pinned.test"  # resolvable only through the stub resolver
+
+
+class HostRecorder(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, so connection reuse shows in the stats
+
+    def do_GET(self):
+        self.server.hosts.append(self.headers.get("Host"))
+        body = b"ok"
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class HttpClientDnsTest(unittest.TestCase):
+    """Requests through HttpClient dial the cached address but keep the hostname for the
+    Host header, SNI and certificate checks."""
+
+    def setUp(self):
+        self.resolver_calls = []
+
+        def resolver(host):
+            self.resolver_calls.append(host)
+            if host != HOSTNAME:
+                raise socket.gaierror(socket.EAI_NONAME, host)
+            return [(socket.AF_INET, "127.0.0.1")]
+
+        patcher = mock.patch.object(http_client, "get_dns_cache", return_value=DnsCache(resolver))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client = HttpClient(concurrency=2)
+        self.addCleanup(self.client.session.close)
+
+    def serve(self, context=None):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), HostRecorder)
+        server.block_on_close = False  # kept-alive handler threads end with the client session
+        server.hosts = []
+        if context is not None:
+            server.socket = context.wrap_socket(server.socket, server_side=True)
+        thread = threading.Thread(target=server.serve_forever, daemon=True)
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def test_http_keeps_host_header(self):
+        server = self.serve()
+        port = server.server_address[1]
+        for _ in range(2):
+            response = self.client.get(f"http://{HOSTNAME}:{port}/", timeout=5)
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(server.hosts, [f"{HOSTNAME}:{port}"] * 2)
+        self.assertEqual(self.resolver_calls, [HOSTNAME])
+        self.assertEqual(self.client.stats.snapshot()["connections"], 1)
+
+    @unittest.skipUnless(shutil.which("openssl"), "needs the openssl CLI to make a test certificate")
+    def test_https_verifies_hostname(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        cert, key = os.path.join(directory, "cert.pem"), os.path.join(directory, "key.pem")
+        subprocess.run(
+            ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+             "-keyout", key, "-out", cert, "-subj", f"/CN={HOSTNAME}",
+             "-addext", f"subjectAltName=DNS:{HOSTNAME}"],
+            check=True, capture_output=True
+        )
+        server_names = []
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert, key)
+        context.sni_callback = lambda sock, name, ctx: server_names.append(name)
+        server = self.serve(context)
+        port = server.server_address[1]
+
+        response = self.client.get(f"https://{HOSTNAME}:{port}/", timeout=5, verify=cert)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(server_names, [HOSTNAME])
+        self.assertEqual(server.hosts, [f"{HOSTNAME}:{port}"])
+        self.assertEqual(self.resolver_calls, [HOSTNAME])
+
+    def test_failed_lookup_raises_connection_error(self):
+        import requests
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            self.client.get("http://unknown.test/", timeout=5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,139 @@
+import os
+import sys
+import threading
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import index_writer
+from common.index_writer import IndexWriter
+
+
+class FakeDatabase:
+    """Stands in for a pooled MySQL connection: indexed_pages as {url: content_hash}."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stored = {}
+        self.pending = None     # rows of the open transaction's upsert
+        self.upserts = []       # rows of each committed upsert
+        self.fail_commits = 0
+        self.events = []
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def ping(self, reconnect=True):
+        pass
+
+    def commit(self):
+        with self.lock:
+            if self.fail_commits:
+                self.fail_commits -= 1
+                self.pending = None
+                raise ConnectionError("lost connection")
+            if self.pending:
+                rows = self.pending
+                self.upserts.append(rows)
+                self.stored.update((row[0], row[5]) for row in rows)
+            self.pending = None
+            self.events.append("commit")
+
+    def rollback(self):
+        self.pending = None
+
+    def close(self):
+        pass
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+
+    def execute(self, statement, params):
+        if statement.startswith("SELECT url, content_hash"):
+            with self.db.lock:
+                self.rows = [(url, self.db.stored[url]) for url in params if url in self.db.stored]
+        else:
+            self.db.pending = [tuple(params[i:i + 6]) for i in range(0, len(params), 6)]
+
+    def fetchall(self):
+        return self.rows
+
+    def close(self):
+        pass
+
+
+def page(text):
+    return {"title": "Title", "description": "", "text": text}
+
+
+class IndexWriterTest(unittest.TestCase):
+    def setUp(self):
+        self.db = FakeDatabase()
+        for patcher in (mock.patch.object(index_writer, "get_neardup_index", return_value=None),
+                        mock.patch("builtins.print")):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def writer(self, **options):
+        options.setdefault("flush_interval", 60)
+        writer = IndexWriter(writers=1, **options)
+        writer._connection = lambda: self.db
+        self.addCleanup(writer.close)
+        return writer
+
+    def ack(self, name):
+        return lambda: self.db.events.append(f"ack {name}")
+
+    def test_full_batch_is_written_in_one_upsert_then_acked(self):
+        writer = self.writer(batch_rows=3)
+        acked = threading.Event()
+        for i in range(3):
+            writer.add(f"http://a.example/{i}", page(f"text {i}"), f"hash-{i}", self.ack(i))
+        writer.add("http://a.example/last", page("text"), "hash", acked.set)
+        writer.close()
+        self.assertTrue(acked.is_set())
+        self.assertEqual([len(rows) for rows in self.db.upserts], [3, 1])
+        self.assertEqual(self.db.events[:4], ["commit", "ack 0", "ack 1", "ack 2"])
+        self.assertEqual(writer.snapshot()["pages"], 4)
+
+    def test_flushes_after_the_interval(self):
+        writer = self.writer(batch_rows=100, flush_interval=0.05)
+        acked = threading.Event()
+        writer.add("http://a.example/", page("text"), "hash", acked.set)
+        self.assertTrue(acked.wait(timeout=2))
+        self.assertEqual(self.db.stored, {"http://a.example/": "hash"})
+
+    def test_resent_url_is_written_once_and_acked_twice(self):
+        writer = self.writer(batch_rows=100)
+        writer.add("http://a.example/", page("old"), "old-hash", self.ack("first"))
+        writer.add("http://a.example/", page("new"), "new-hash", self.ack("second"))
+        writer.close()
+        self.assertEqual(self.db.upserts, [[("http://a.example/", "Title", "", "new", "dummy-id", "new-hash")]])
+        self.assertEqual(self.db.events, ["commit", "ack first", "ack second"])
+
+    def test_unchanged_pages_are_acked_without_a_write(self):
+        self.db.stored["http://a.example/same"] = "hash"
+        writer = self.writer(batch_rows=100)
+        writer.add("http://a.example/same", page("text"), "hash", self.ack("same"))
+        writer.add("http://a.example/new", page("text"), "hash", self.ack("new"))
+        writer.close()
+        self.assertEqual([[row[0] for row in rows] for rows in self.db.upserts], [["http://a.example/new"]])
+        self.assertEqual(sorted(self.db.events[1:]), ["ack new", "ack same"])
+        self.assertEqual(writer.snapshot()["unchanged"], 1)
+
+    def test_failed_batch_is_not_acked(self):
+        self.db.fail_commits = 1
+        writer = self.writer(batch_rows=100)
+        writer.add("http://a.example/", page("text"), "hash", self.ack("page"))
+        writer.close()
+        self.assertEqual(self.db.events, [])
+        self.assertEqual(self.db.stored, {})
+        stats = writer.snapshot()
+        self.assertEqual((stats["failed_batches"], stats["failed_pages"], stats["buffered"]), (1, 1, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,78 @@
+import json
+import os
+import sys
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import crawl_core
+from common.frontier import HostFrontier
+from common.jobs import JobTracker
+
+
+def message(handle, **body):
+    return {"ReceiptHandle": handle, "Body": json.dumps(body)}
+
+
+class AdmitMessagesTest(unittest.TestCase):
+    def setUp(self):
+        self.tracker = JobTracker()
+        patcher = mock.patch.object(crawl_core, "get_job_tracker", return_value=self.tracker)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.queue = mock.Mock()
+        self.frontier = HostFrontier()
+
+    def admit(self, *messages):
+        with mock.patch("builtins.print"):
+            crawl_core.admit_messages(self.queue, "crawler-queue", self.frontier, list(messages))
+
+    def test_rejected_tasks_count_as_dropped(self):
+        self.admit(
+            message("deep", url="http://a.example/x", depth=3, max_depth=2, job_id="job-1"),
+            message("bad-url", url="mailto:someone@example.com", depth=0, max_depth=2, job_id="job-1"),
+            message("no-job", url="http://a.example/y", depth=5, max_depth=1),
+            {"ReceiptHandle": "garbage", "Body": "not json"},
+        )
+        self.assertEqual(self.tracker.drain(), {"job-1": {"dropped": 2}, "default": {"dropped": 1}})
+        self.assertEqual([c.args[1] for c in self.queue.delete.call_args_list],
+                         ["deep", "bad-url", "no-job", "garbage"])
+        self.assertEqual(self.frontier.size, 0)
+
+    def test_cancelled_job_tasks_count_as_dropped(self):
+        self.tracker.set_cancelled(["job-1"])
+        self.admit(message("m1", url="http://a.example/x", depth=0, max_depth=2, job_id="job-1"),
+                   message("m2", url="http://a.example/y", depth=0, max_depth=2, job_id="job-2"))
+        self.assertEqual(self.tracker.drain(), {"job-1": {"dropped": 1}})
+        self.assertEqual(self.frontier.size, 1)
+
+
+class HeartbeatBatchTest(unittest.TestCase):
+    def test_batch_resent_until_acknowledged(self):
+        tracker = JobTracker()
+        tracker.record("job", "fetched", 5)
+        first = tracker.heartbeat_fields()
+        self.assertEqual(first["jobs"], {"job": {"fetched": 5}})
+
+        # The reply was lost: the same batch goes again, and newer counts wait for the next one
+        tracker.record("job", "fetched", 2)
+        self.assertEqual(tracker.heartbeat_fields(), first)
+
+        tracker.apply_reply({"cancelled_jobs": [], "jobs_ack": first["jobs_batch"]})
+        second = tracker.heartbeat_fields()
+        self.assertEqual(second["jobs"], {"job": {"fetched": 2}})
+        self.assertEqual(second["jobs_batch"]["seq"], first["jobs_batch"]["seq"] + 1)
+
+        tracker.apply_reply({"jobs_ack": second["jobs_batch"]})
+        self.assertEqual(tracker.heartbeat_fields(), {"jobs": {}})
+
+    def test_ack_for_another_session_is_ignored(self):
+        tracker = JobTracker()
+        tracker.record("job", "failed")
+        fields = tracker.heartbeat_fields()
+        tracker.apply_reply({"jobs_ack": dict(fields["jobs_batch"], session="someone-else")})
+        self.assertEqual(tracker.heartbeat_fields(), fields)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,52 @@
+import os
+import signal
+import sys
+import threading
+import time
+import unittest
+from concurrent.futures.process import BrokenProcessPool
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.parse_pool import ParsePool
+
+BODY = b"<html><head><title>Page</title></head><body><a href='/next'>next</a></body></html>"
+
+
+class ParsePoolTest(unittest.TestCase):
+    def setUp(self):
+        self.pool = ParsePool(processes=2, max_pending=4)
+        self.addCleanup(lambda: self.pool.executor.shutdown(wait=True))
+
+    def test_parses_in_worker_processes(self):
+        page, links = self.pool.parse("http://example.com/a", BODY, "utf-8")
+        self.assertEqual(links, ["http://example.com/next"])
+        self.assertEqual(self.pool.snapshot()["parsed"], 1)
+
+    def test_restarts_after_a_worker_dies_while_threads_hold_locks(self):
+        # Threads that keep taking a lock, like the fetch, flusher and heartbeat threads do
+        stop = threading.Event()
+        lock = threading.Lock()
+
+        def busy():
+            while not stop.is_set():
+                with lock:
+                    time.sleep(0.001)
+
+        threads = [threading.Thread(target=busy, daemon=True) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        self.addCleanup(stop.set)
+
+        self.pool.parse("http://example.com/a", BODY, "utf-8")
+        for pid in list(self.pool.executor._processes):
+            os.kill(pid, signal.SIGKILL)
+        with self.assertRaises(BrokenProcessPool):
+            self.pool.parse("http://example.com/a", BODY, "utf-8")
+        for _ in range(10):
+            _, links = self.pool.parse("http://example.com/a", BODY, "utf-8")
+            self.assertEqual(links, ["http://example.com/next"])
+        self.assertEqual(self.pool.snapshot()["pool_restarts"], 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+import os
+import sqlite3
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import postings
+
+DOCS = {
+    1: ("http://a.example/cats", "cats cats cats purr and nap all day"),
+    2: ("http://a.example/dogs", "dogs bark while cats watch from the fence"),
+    3: ("http://a.example/long", "cats " + "filler " * 60 + "dogs"),
+    4: ("http://a.example/fish", "fish swim"),
+}
+
+
+class SqliteCursor:
+    """The postings queries, which only need %s placeholders translated for sqlite3."""
+
+    def __init__(self, db):
+        self.cursor = db.cursor()
+
+    def execute(self, statement, params=()):
+        self.cursor.execute(statement.replace("%s", "?"), tuple(params))
+
+    def fetchone(self):
+        return self.cursor.fetchone()
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+
+def build_index(docs):
+    # The tables auto_index_monitor fills, built the same way from term_positions
+    db = sqlite3.connect(":memory:")
+    db.executescript("""
+        CREATE TABLE index_stats (id INTEGER PRIMARY KEY, docs INTEGER, total_length INTEGER);
+        CREATE TABLE terms (term_id INTEGER PRIMARY KEY, term TEXT UNIQUE, doc_freq INTEGER);
+        CREATE TABLE index_docs (doc_id INTEGER PRIMARY KEY, url TEXT, length INTEGER);
+        CREATE TABLE postings (term_id INTEGER, doc_id INTEGER, tf INTEGER, positions BLOB,
+                               PRIMARY KEY (term_id, doc_id));
+    """)
+    term_ids, total = {}, 0
+    for doc_id, (url, text) in docs.items():
+        positions, length = postings.term_positions(text)
+        total += length
+        db.execute("INSERT INTO index_docs VALUES (?, ?, ?)", (doc_id, url, length))
+        for term, where in positions.items():
+            if term not in term_ids:
+                term_ids[term] = len(term_ids) + 1
+                db.execute("INSERT INTO terms VALUES (?, ?, 0)", (term_ids[term], term))
+            db.execute("UPDATE terms SET doc_freq = doc_freq + 1 WHERE term_id = ?", (term_ids[term],))
+            db.execute("INSERT INTO postings VALUES (?, ?, ?, ?)",
+                       (term_ids[term], doc_id, len(where), postings.encode_positions(where)))
+    db.execute("INSERT INTO index_stats VALUES (1, ?, ?)", (len(docs), total))
+    return db
+
+
+class TokenizeTest(unittest.TestCase):
+    def test_terms_and_positions(self):
+        self.assertEqual(postings.tokenize("The CAT sat, on a mat! x2 cat"), ["the", "cat", "sat", "mat", "cat"])
+        positions, length = postings.term_positions("cat sat cat")
+        self.assertEqual((dict(positions), length), ({"cat": [0, 2], "sat": [1]}, 3))
+
+    def test_positions_round_trip(self):
+        for positions in ([], [0], [1, 2, 3], [5, 200, 70000, 70001, 10 ** 9]):
+            self.assertEqual(postings.decode_positions(postings.encode_positions(positions)), positions)
+        self.assertEqual(len(postings.encode_positions([1, 2, 3])), 3)  # small gaps take one byte each
+
+    def test_parse_query(self):
+        self.assertEqual(postings.parse_query("the cats and the dogs", {"the", "and"}), (["cats", "dogs"], False))
+        self.assertEqual(postings.parse_query('"the cats"', {"the"}), (["the", "cats"], True))
+
+
+class ScoringTest(unittest.TestCase):
+    def test_idf_favours_rare_terms(self):
+        self.assertGreater(postings.idf(100, 1), postings.idf(100, 50))
+        self.assertGreater(postings.idf(100, 100), 0)
+
+    def test_bm25_saturates_and_normalizes_length(self):
+        self.assertAlmostEqual(postings.bm25(1.0, 1, 10, 10), 1.0)
+        self.assertLess(postings.bm25(1.0, 20, 10, 10), postings.K1 + 1)
+        self.assertGreater(postings.bm25(1.0, 2, 10, 10), postings.bm25(1.0, 1, 10, 10))
+        self.assertGreater(postings.bm25(1.0, 1, 5, 10), postings.bm25(1.0, 1, 50, 10))
+
+    def test_intersect_and_has_phrase(self):
+        self.assertEqual(postings.intersect([[1, 3, 5, 7, 9], [3, 4, 5, 9], [0, 5, 9, 12]]), [5, 9])
+        self.assertEqual(postings.intersect([[1, 2], []]), [])
+        self.assertEqual(postings.intersect([]), [])
+        self.assertTrue(postings.has_phrase([{4, 10}, {11}, {12}]))
+        self.assertFalse(postings.has_phrase([{4, 10}, {5}, {12}]))
+
+
+class SearchTest(unittest.TestCase):
+    def setUp(self):
+        self.db = build_index(DOCS)
+        self.addCleanup(self.db.close)
+
+    def search(self, query, stop_words=()):
+        return postings.search(SqliteCursor(self.db), query, stop_words)
+
+    def test_ranks_by_bm25(self):
+        # Term frequency, then the shorter of two pages with one occurrence each
+        self.assertEqual(self.search("cats"),
+                         ["http://a.example/cats", "http://a.example/dogs", "http://a.example/long"])
+
+    def test_pages_with_every_term_rank_first(self):
+        self.assertEqual(self.search("cats dogs"),
+                         ["http://a.example/dogs", "http://a.example/long", "http://a.example/cats"])
+
+    def test_phrase_needs_adjacent_terms(self):
+        self.assertEqual(self.search('"cats watch"'), ["http://a.example/dogs"])
+        self.assertEqual(self.search('"watch cats"'), [])
+        self.assertEqual(self.search('"cats unicorns"'), [])
+
+    def test_unknown_and_stop_words(self):
+        self.assertEqual(self.search("unicorns"), [])
+        self.assertEqual(self.search("the", {"the"}), [])
+        self.assertEqual(postings.search(SqliteCursor(build_index({})), "cats"), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,101 @@
+import os
+import sys
+import time
+import unittest
+from unittest import mock
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.sqs_batch import BatchingSQS
+
+QUEUE = "crawler-queue"
+
+
+class BatchingSQSTest(unittest.TestCase):
+    def setUp(self):
+        self.client = mock.Mock()
+        self.client.send_message_batch.return_value = {"Failed": []}
+        self.client.delete_message_batch.return_value = {"Failed": []}
+        patcher = mock.patch("builtins.print")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def sqs(self, **options):
+        # A long flush interval: the tests flush by hand
+        options.setdefault("flush_interval", 60)
+        sqs = BatchingSQS(self.client, **options)
+        self.addCleanup(sqs.close)
+        return sqs
+
+    def sent_bodies(self):
+        return [[entry["MessageBody"] for entry in c.kwargs["Entries"]]
+                for c in self.client.send_message_batch.call_args_list]
+
+    def test_sends_and_deletes_are_batched(self):
+        sqs = self.sqs()
+        for i in range(12):
+            sqs.send(QUEUE, f"m{i}")
+        sqs.delete(QUEUE, "h1")
+        sqs.delete(QUEUE, "h2")
+        sqs.flush()
+        self.assertEqual(self.sent_bodies(), [[f"m{i}" for i in range(10)], ["m10", "m11"]])
+        self.client.delete_message_batch.assert_called_once_with(
+            QueueUrl=QUEUE, Entries=[{"Id": "0", "ReceiptHandle": "h1"}, {"Id": "1", "ReceiptHandle": "h2"}])
+        stats = sqs.snapshot()
+        self.assertEqual((stats["sent"], stats["deleted"], stats["pending_sends"]), (12, 2, 0))
+
+    def test_failed_batch_waits_out_its_backoff(self):
+        sqs = self.sqs(retry_base=0.2, retry_max=1)
+        self.client.send_message_batch.side_effect = [ConnectionError("throttled"), {"Failed": []}]
+        sqs.send(QUEUE, "m1")
+        sqs.send(QUEUE, "m2")
+        sqs.flush()
+        self.assertEqual(sqs.snapshot()["send_retries"], 2)
+
+        sqs._flush(force=False)  # still backing off
+        self.assertEqual(self.client.send_message_batch.call_count, 1)
+        time.sleep(0.25)
+        sqs._flush(force=False)
+        self.assertEqual(self.sent_bodies(), [["m1", "m2"], ["m1", "m2"]])
+        self.assertEqual(sqs.snapshot()["pending_sends"], 0)
+
+    def test_backoff_doubles_up_to_the_cap(self):
+        sqs = self.sqs(retry_base=0.5, retry_max=3)
+        self.assertEqual([sqs._backoff(attempts) for attempts in range(1, 6)], [0.5, 1, 2, 3, 3])
+
+    def test_entry_is_dropped_after_max_attempts(self):
+        sqs = self.sqs(max_attempts=3)
+        self.client.send_message_batch.side_effect = ConnectionError("down")
+        sqs.send(QUEUE, "m1")
+        for _ in range(5):
+            sqs.flush()
+        self.assertEqual(self.client.send_message_batch.call_count, 3)
+        stats = sqs.snapshot()
+        self.assertEqual((stats["send_retries"], stats["send_dropped"], stats["pending_sends"]), (2, 1, 0))
+
+    def test_only_retryable_entries_are_resent(self):
+        sqs = self.sqs()
+        self.client.send_message_batch.side_effect = [
+            {"Failed": [{"Id": "0", "SenderFault": True, "Message": "too big"},
+                        {"Id": "2", "SenderFault": False, "Message": "internal error"}]},
+            {"Failed": []},
+        ]
+        for body in ("bad", "ok", "retry"):
+            sqs.send(QUEUE, body)
+        sqs.flush()
+        sqs.flush()
+        self.assertEqual(self.sent_bodies(), [["bad", "ok", "retry"], ["retry"]])
+        self.assertEqual(sqs.snapshot()["sent"], 2)
+
+    def test_failed_delete_is_retried(self):
+        sqs = self.sqs()
+        self.client.delete_message_batch.side_effect = [ConnectionError("reset"), {"Failed": []}]
+        sqs.delete(QUEUE, "h1")
+        sqs.flush()
+        sqs.flush()
+        self.assertEqual(self.client.delete_message_batch.call_count, 2)
+        stats = sqs.snapshot()
+        self.assertEqual((stats["delete_retries"], stats["deleted"], stats["pending_deletes"]), (1, 1, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,41 @@
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.urlcanon import canonicalize, canonicalize_links
+
+
+class CanonicalizeTest(unittest.TestCase):
+    def test_normalizes_scheme_host_port_and_fragment(self):
+        self.assertEqual(canonicalize("HTTP://Example.COM.:80/a#top"), "http://example.com/a")
+        self.assertEqual(canonicalize("https://example.com:8443"), "https://example.com:8443/")
+        self.assertEqual(canonicalize("example.com/path/"), "https://example.com/path")
+        self.assertEqual(canonicalize("//example.com/x"), "https://example.com/x")
+
+    def test_normalizes_path(self):
+        self.assertEqual(canonicalize("http://a.example/b/./c/../d"), "http://a.example/b/d")
+        self.assertEqual(canonicalize("http://a.example/%7euser/%2f"), "http://a.example/~user/%2F")
+
+    def test_sorts_query_and_drops_tracking_params(self):
+        self.assertEqual(canonicalize("http://a.example/?b=2&utm_source=x&a=1&gclid=y&"),
+                         "http://a.example/?a=1&b=2")
+        self.assertEqual(canonicalize("http://a.example/?utm_medium=x"), "http://a.example/")
+
+    def test_keeps_the_order_of_a_repeated_key(self):
+        self.assertEqual(canonicalize("http://a.example/?z=0&a=2&a=1&a=3"),
+                         "http://a.example/?a=2&a=1&a=3&z=0")
+        self.assertNotEqual(canonicalize("http://a.example/?a=2&a=1"),
+                            canonicalize("http://a.example/?a=1&a=2"))
+
+    def test_rejects_uncrawlable_urls(self):
+        for url in ("", "#top", "mailto:someone@example.com", "ftp://a.example/", "http://", "http://a.example:99999/"):
+            self.assertIsNone(canonicalize(url), url)
+
+    def test_resolves_links_against_the_page(self):
+        self.assertEqual(canonicalize_links("http://a.example/dir/page", ["next", "/top", "#x", "next", "../up"]),
+                         ["http://a.example/dir/next", "http://a.example/top", "http://a.example/up"])
+
+
+if __name__ == "__main__":
+    unittest.main()